@@ -0,0 +1,314 @@
+# src/analytics.py
+# Auslastungs-Auswertungen: Tabellen spaltenweise als Arrow-Tabellen bzw. DataFrames,
+# Aggregationen vektorisiert mit pandas/numpy (keine Python-Schleife pro Reservierung).
+# Alle Zeitspalten sind timestamp[us, UTC]; naive Zeitpunkte gelten als UTC.
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from devices import Device
+from recurring_reservations import FREQUENCIES, RecurringReservation
+from reservations import Reservation
+from users import User
+
+_TS = pa.timestamp("us", tz="UTC")
+
+USER_SCHEMA = pa.schema([
+    ("id", pa.string()),
+    ("name", pa.string()),
+    ("creation_date", _TS),
+    ("last_update", _TS),
+])
+
+DEVICE_SCHEMA = pa.schema([
+    ("id", pa.int64()),
+    ("name", pa.string()),
+    ("responsible_user_id", pa.string()),
+    ("is_active", pa.bool_()),
+    ("end_of_life", _TS),
+    ("creation_date", _TS),
+    ("last_update", _TS),
+])
+
+RESERVATION_SCHEMA = pa.schema([
+    ("id", pa.string()),
+    ("user_id", pa.string()),
+    ("device_id", pa.int64()),
+    ("start_date", _TS),
+    ("end_date", _TS),
+    ("creation_date", _TS),
+    ("last_update", _TS),
+])
+
+SERIES_SCHEMA = pa.schema([
+    ("id", pa.string()),
+    ("user_id", pa.string()),
+    ("device_id", pa.int64()),
+    ("start_date", _TS),
+    ("end_date", _TS),
+    ("frequency", pa.string()),
+    ("interval", pa.int64()),
+    ("until", _TS),
+    ("count", pa.int64()),
+    ("creation_date", _TS),
+    ("last_update", _TS),
+])
+
+# Wochen beginnen Montag 00:00 UTC (1970-01-05 war ein Montag)
+_MONDAY = np.datetime64("1970-01-05T00:00:00", "us")
+_WEEK = np.timedelta64(7, "D")
+_HOUR = np.timedelta64(1, "h")
+
+
+def _to_arrow(rows: list[tuple], fields: tuple[str, ...], schema: pa.Schema) -> pa.Table:
+    # Zeilen-Tupel (Model.Row) -> Spalten; Reihenfolge von `fields` und `schema` ist gleich
+    columns = list(zip(*rows)) if rows else [()] * len(fields)
+    arrays = [pa.array(col, type=schema.field(name).type) for name, col in zip(fields, columns)]
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def users_table(user_repo) -> pa.Table:
+    return _to_arrow(user_repo.list_all(as_rows=True), User.fields, USER_SCHEMA)
+
+
+def devices_table(device_repo) -> pa.Table:
+    # ältere Datensätze können die Inventarnummer als Text enthalten
+    rows = [row._replace(id=int(row.id)) for row in device_repo.list_all(as_rows=True)]
+    return _to_arrow(rows, Device.fields, DEVICE_SCHEMA)
+
+
+def reservations_table(res_repo) -> pa.Table:
+    # inkl. Archiv: Auswertungen reichen in die Vergangenheit
+    return _to_arrow(res_repo.list_all(as_rows=True, include_archive=True), Reservation.fields, RESERVATION_SCHEMA)
+
+
+def series_table(res_repo) -> pa.Table:
+    # Serien als ein Datensatz pro Serie, Termine erzeugt expand_series() nur für das Fenster
+    return _to_arrow(res_repo.list_series(as_rows=True), RecurringReservation.fields, SERIES_SCHEMA)
+
+
+def _utc(values: pd.Series) -> np.ndarray:
+    # tz-aware Spalte -> naive UTC-Werte als datetime64[us] für numpy-Arithmetik
+    return values.dt.tz_convert(None).to_numpy("datetime64[us]")
+
+
+def _hours(res: pd.DataFrame) -> pd.Series:
+    return (res["end_date"] - res["start_date"]) / pd.Timedelta(hours=1)
+
+
+def _timestamp(value: datetime) -> pd.Timestamp:
+    value = pd.Timestamp(value)
+    return value.tz_localize("UTC") if value.tzinfo is None else value.tz_convert("UTC")
+
+
+def clip_to_window(res: pd.DataFrame, start: datetime, end: datetime) -> pd.DataFrame:
+    """Nur Reservierungen, die [start, end) überschneiden; Start/Ende auf das Fenster gekürzt."""
+    start, end = _timestamp(start), _timestamp(end)
+    res = res[(res["start_date"] < end) & (res["end_date"] > start)].copy()
+    res["start_date"] = res["start_date"].clip(lower=start)
+    res["end_date"] = res["end_date"].clip(upper=end)
+    return res
+
+
+def _instant(value: datetime) -> np.datetime64:
+    return np.datetime64(_timestamp(value).tz_convert(None).to_datetime64(), "us")
+
+
+def expand_series(series: pd.DataFrame, start: datetime, end: datetime) -> pd.DataFrame:
+    """
+    Termine der Serien, die [start, end) schneiden, als Reservierungszeilen (id "<Serie>#<k>" wie
+    RecurringReservation.occurrence). Termine liegen im festen Abstand: erster und letzter Termin im Fenster
+    per Ganzzahldivision pro Serie, dann eine Zeile pro Termin über np.repeat.
+    """
+    columns = RESERVATION_SCHEMA.names
+    if series.empty:
+        return RESERVATION_SCHEMA.empty_table().to_pandas()
+
+    first, last = _instant(start), _instant(end)
+    begin, finish = _utc(series["start_date"]), _utc(series["end_date"])
+    step = (
+        series["frequency"].map({name: np.timedelta64(delta) for name, delta in FREQUENCIES.items()})
+        .to_numpy("timedelta64[us]") * series["interval"].to_numpy()
+    )
+    # letzter Termin laut count bzw. until (RecurringReservation.last_index)
+    count = series["count"].to_numpy("float64")
+    until = _utc(series["until"])
+    until = np.where(np.isnat(until), begin, until)
+    last_index = np.where(np.isnan(count), (until - begin) // step, np.nan_to_num(count) - 1).astype(np.int64)
+
+    # Termin k schneidet das Fenster ⇔ begin + k·step < end und finish + k·step > start
+    k0 = np.maximum((first - finish) // step + 1, 0)
+    k1 = np.minimum((last - begin - np.timedelta64(1, "us")) // step, last_index)
+    counts = np.maximum(k1 - k0 + 1, 0)
+
+    row = np.repeat(np.arange(len(series)), counts)
+    k = k0[row] + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    starts = begin[row] + k * step[row]
+    taken = series.iloc[row].reset_index(drop=True)
+    return pd.DataFrame({
+        "id": taken["id"].str.cat(pd.Series(k).astype(str), sep="#"),
+        "user_id": taken["user_id"],
+        "device_id": taken["device_id"].astype("int64"),
+        "start_date": pd.DatetimeIndex(starts).tz_localize("UTC"),
+        "end_date": pd.DatetimeIndex(starts + (finish - begin)[row]).tz_localize("UTC"),
+        "creation_date": taken["creation_date"],
+        "last_update": taken["last_update"],
+    }, columns=columns)
+
+
+def bookings_in_window(res: pd.DataFrame, series: pd.DataFrame, start: datetime, end: datetime) -> pd.DataFrame:
+    """Einzelbuchungen und Serientermine, die [start, end) schneiden, auf das Fenster gekürzt."""
+    occurrences = expand_series(series, start, end)
+    if not occurrences.empty:
+        res = pd.concat([res, occurrences], ignore_index=True) if not res.empty else occurrences
+    return clip_to_window(res, start, end)
+
+
+def booked_hours_per_device(res: pd.DataFrame) -> pd.DataFrame:
+    """Gebuchte Stunden und Anzahl Reservierungen pro Gerät."""
+    return (
+        res.assign(hours=_hours(res))
+        .groupby("device_id", as_index=False)
+        .agg(hours=("hours", "sum"), bookings=("id", "count"))
+    )
+
+
+def booked_hours_per_week(res: pd.DataFrame) -> pd.DataFrame:
+    """
+    Gebuchte Stunden pro Gerät und Kalenderwoche (Spalte `week` = Montag 00:00 UTC).
+    Reservierungen über Wochengrenzen werden anteilig auf die Wochen verteilt.
+    """
+    if res.empty:
+        return pd.DataFrame({
+            "device_id": pd.Series(dtype="int64"),
+            "week": pd.Series(dtype=pd.DatetimeTZDtype("us", "UTC")),
+            "hours": pd.Series(dtype="float64"),
+        })
+
+    start, end = _utc(res["start_date"]), _utc(res["end_date"])
+    first = (start - _MONDAY) // _WEEK
+    last = np.maximum((end - _MONDAY - np.timedelta64(1, "us")) // _WEEK, first)
+    counts = last - first + 1
+
+    # eine Zeile pro (Reservierung, berührte Woche)
+    row = np.repeat(np.arange(len(res)), counts)
+    step = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    week_start = _MONDAY + (first[row] + step) * _WEEK
+    hours = (np.minimum(end[row], week_start + _WEEK) - np.maximum(start[row], week_start)) / _HOUR
+
+    segments = pd.DataFrame({
+        "device_id": res["device_id"].to_numpy()[row],
+        "week": pd.DatetimeIndex(week_start).tz_localize("UTC"),
+        "hours": hours,
+    })
+    return segments.groupby(["device_id", "week"], as_index=False)["hours"].sum()
+
+
+def peak_concurrency(res: pd.DataFrame) -> pd.Series:
+    """
+    Höchste Anzahl gleichzeitig laufender Reservierungen pro Gerät (Index: device_id).
+    Intervalle sind halboffen: endet eine Buchung, wenn die nächste beginnt, zählt das nicht.
+    """
+    if res.empty:
+        return pd.Series(dtype="int64", name="peak")
+
+    devices = res["device_id"].to_numpy()
+    times = np.concatenate([_utc(res["start_date"]), _utc(res["end_date"])])
+    deltas = np.concatenate([np.ones(len(res), dtype=np.int64), -np.ones(len(res), dtype=np.int64)])
+    devices = np.concatenate([devices, devices])
+
+    # nach Gerät, Zeit, Ende (-1) vor Beginn (+1) sortieren; laufende Summe = gleichzeitige Buchungen
+    order = np.lexsort((deltas, times, devices))
+    events = pd.DataFrame({"device_id": devices[order], "delta": deltas[order]})
+    running = events.groupby("device_id")["delta"].cumsum()
+    return running.groupby(events["device_id"]).max().rename("peak")
+
+
+def top_users(res: pd.DataFrame, users: pd.DataFrame, n: int = 10) -> pd.DataFrame:
+    """Die `n` Nutzer mit den meisten gebuchten Stunden."""
+    totals = (
+        res.assign(hours=_hours(res))
+        .groupby("user_id", as_index=False)
+        .agg(hours=("hours", "sum"), bookings=("id", "count"))
+        .nlargest(n, "hours")
+    )
+    names = users[["id", "name"]].rename(columns={"id": "user_id"})
+    return totals.merge(names, on="user_id", how="left")
+
+
+def device_utilization(res: pd.DataFrame, devices: pd.DataFrame, start: datetime, end: datetime) -> pd.DataFrame:
+    """
+    Auslastung aller Geräte im Zeitraum [start, end): gebuchte Stunden, Anteil am Zeitraum,
+    Anzahl Reservierungen und höchste Gleichzeitigkeit. Geräte ohne Buchung erscheinen mit 0.
+    """
+    window = clip_to_window(res, start, end)
+    window_hours = (pd.Timestamp(end) - pd.Timestamp(start)) / pd.Timedelta(hours=1)
+
+    report = (
+        devices[["id", "name"]]
+        .rename(columns={"id": "device_id"})
+        .merge(booked_hours_per_device(window), on="device_id", how="left")
+        .merge(peak_concurrency(window), left_on="device_id", right_index=True, how="left")
+        .fillna({"hours": 0.0, "bookings": 0, "peak": 0})
+        .astype({"bookings": "int64", "peak": "int64"})
+    )
+    report["utilization"] = report["hours"] / window_hours if window_hours > 0 else 0.0
+    return report.sort_values("device_id", ignore_index=True)
+
+
+def occupancy(
+    res: pd.DataFrame,
+    by: str,
+    start: datetime,
+    end: datetime,
+    bucket: timedelta = timedelta(days=1),
+    series: pd.DataFrame | None = None,
+) -> pd.DataFrame:
+    """
+    Belegungsmatrix für Kalender/Heatmap: gebuchte Stunden pro Zeile (`by`: "device_id" oder "user_id")
+    und Zeitfenster fester Breite `bucket` in [start, end). Index = Gerät/Nutzer, Spalten = Fensterbeginn (UTC).
+    Mit `series` (series_table) zählen deren Termine im Zeitraum mit (expand_series).
+    Differenzen-Array statt Schleife pro Reservierung: die angeschnittenen Randfenster bekommen ihren Anteil
+    direkt, voll belegte Fenster +bucket am ersten und -bucket hinter dem letzten, kumulierte Summe entlang
+    der Zeit – O(Reservierungen + Zeilen × Fenster). Rechnet in ganzen Mikrosekunden (exakt).
+    """
+    width = int(pd.Timedelta(bucket) / pd.Timedelta(microseconds=1))
+    if width <= 0:
+        raise ValueError("bucket muss positiv sein.")
+    window = bookings_in_window(res, series, start, end) if series is not None else clip_to_window(res, start, end)
+    first = _timestamp(start)
+    total = int((_timestamp(end) - first) / pd.Timedelta(microseconds=1))
+    buckets = max(0, -(-total // width))
+    columns = pd.date_range(first, periods=buckets, freq=pd.Timedelta(bucket))
+
+    labels, rows = np.unique(window[by].to_numpy(), return_inverse=True)
+    if not len(labels) or not buckets:
+        return pd.DataFrame(np.zeros((len(labels), buckets)), index=pd.Index(labels, name=by), columns=columns)
+
+    base = np.datetime64(first.tz_convert(None).to_datetime64(), "us")
+    s = (_utc(window["start_date"]) - base).astype(np.int64)
+    e = (_utc(window["end_date"]) - base).astype(np.int64)
+    i0, i1 = s // width, e // width
+    # eine Spalte mehr: Buchungen bis genau `end` enden im (leeren) Fenster hinter dem letzten
+    cols = buckets + 1
+    same = i0 == i1
+
+    def scatter(index: np.ndarray, weights: np.ndarray) -> np.ndarray:
+        return np.bincount(index, weights=weights, minlength=len(labels) * cols)
+
+    edges = scatter(
+        np.concatenate([rows * cols + i0, (rows * cols + i1)[~same]]),
+        np.concatenate([np.where(same, e - s, (i0 + 1) * width - s), (e - i1 * width)[~same]]),
+    )
+    full = ~same & (i1 > i0 + 1)
+    diff = scatter(
+        np.concatenate([rows[full] * cols + i0[full] + 1, rows[full] * cols + i1[full]]),
+        np.concatenate([np.full(full.sum(), width), np.full(full.sum(), -width)]),
+    )
+    micros = edges.reshape(len(labels), cols) + np.cumsum(diff.reshape(len(labels), cols), axis=1)
+    hours = micros[:, :buckets] / 3_600_000_000
+    return pd.DataFrame(hours, index=pd.Index(labels, name=by), columns=columns)
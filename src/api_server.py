@@ -0,0 +1,311 @@
+# src/api_server.py
+# Lokale JSON-API über AsyncReservationService, nur Standardbibliothek (asyncio), z. B. für andere interne Tools:
+#   python src/api_server.py [--host 127.0.0.1] [--port 8765] [--workers 8]
+# Endpunkte:
+#   GET    /users                            GET /users/<id>             POST /users {"id", "name"}
+#   GET    /devices                          GET /devices/<id>
+#   GET    /devices/<id>/reservations?start=&end=
+#   GET    /devices/<id>/free?start=&end=[&min_minutes=]
+#   GET    /available?start=&end=            freie, reservierbare Geräte
+#   POST   /reservations                     {"user_id", "device_id", "start", "end"} -> 201
+#   POST   /reservations/batch               [{...}, ...] -> Ergebnis pro Eintrag (siehe create_many)
+#   DELETE /reservations/<id>
+# Zeitpunkte als ISO 8601 (ohne Zeitzone: UTC), start vor end. Fehler: {"error": "..."} mit 400/404/409/413/431.
+# Eine Verbindung bedient mehrere Anfragen nacheinander (keep-alive), viele Verbindungen laufen parallel;
+# gearbeitet wird im Thread-Pool der Fassade (siehe async_service.py).
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import re
+import traceback
+from dataclasses import fields, is_dataclass
+from datetime import datetime, timedelta, timezone
+from http import HTTPStatus
+from typing import Any, Awaitable, Callable
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from async_service import API_WORKERS, AsyncReservationService
+from reservation_service import ReservationError
+from serializable import Serializable
+from users import User
+
+MAX_BODY = 1 << 20          # Bytes pro Anfrage
+MAX_HEADERS = 100           # Header-Zeilen pro Anfrage
+IDLE_TIMEOUT = 30.0         # Sekunden ohne neue Anfrage, dann wird die Verbindung geschlossen
+
+
+class ApiError(Exception):
+    def __init__(self, status: HTTPStatus, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Serializable):
+        return value.to_dict()
+    if is_dataclass(value):
+        return {f.name: getattr(value, f.name) for f in fields(value)}
+    raise TypeError(f"nicht serialisierbar: {type(value).__name__}")
+
+
+def _time(value: Any, name: str) -> datetime:
+    if not isinstance(value, str):
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"'{name}' fehlt (ISO 8601).")
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"'{name}' ist kein ISO-8601-Zeitpunkt: {value}")
+    return parsed if parsed.tzinfo is not None else parsed.replace(tzinfo=timezone.utc)
+
+
+def _window(start: datetime, end: datetime) -> tuple[datetime, datetime]:
+    # ungültiger Zeitraum ist ein Fehler der Anfrage (400), kein Konflikt mit Buchungen (409)
+    if start >= end:
+        raise ApiError(HTTPStatus.BAD_REQUEST, "Start muss vor Ende liegen.")
+    return start, end
+
+
+def _query_window(query: dict[str, list[str]]) -> tuple[datetime, datetime]:
+    return _window(_time(_param(query, "start"), "start"), _time(_param(query, "end"), "end"))
+
+
+def _param(query: dict[str, list[str]], name: str) -> str | None:
+    values = query.get(name)
+    return values[0] if values else None
+
+
+def _booking(item: Any) -> tuple[str, int, datetime, datetime]:
+    if not isinstance(item, dict):
+        raise ApiError(HTTPStatus.BAD_REQUEST, "Reservierung als JSON-Objekt erwartet.")
+    try:
+        return str(item["user_id"]), int(item["device_id"]), _time(item.get("start"), "start"), _time(item.get("end"), "end")
+    except (KeyError, TypeError, ValueError):
+        raise ApiError(HTTPStatus.BAD_REQUEST, "Felder user_id, device_id, start, end erwartet.")
+
+
+def _found(value: Any, what: str) -> Any:
+    if value is None:
+        raise ApiError(HTTPStatus.NOT_FOUND, f"{what} existiert nicht.")
+    return value
+
+
+# --- Endpunkte: (api, Pfad-Parameter, Query, Body) -> (Status, JSON-Wert) --------------------------------
+
+Handler = Callable[[AsyncReservationService, tuple, dict, Any], Awaitable[tuple[HTTPStatus, Any]]]
+
+
+async def _list_users(api, args, query, body):
+    return HTTPStatus.OK, await api.users.list_all()
+
+
+async def _get_user(api, args, query, body):
+    return HTTPStatus.OK, _found(await api.users.get(args[0]), "User")
+
+
+async def _create_user(api, args, query, body):
+    if not isinstance(body, dict) or not body.get("id") or not isinstance(body.get("name"), str):
+        raise ApiError(HTTPStatus.BAD_REQUEST, "Felder id und name erwartet.")
+    user = User(id=str(body["id"]), name=body["name"])
+    await api.users.upsert(user)
+    return HTTPStatus.OK, user
+
+
+async def _list_devices(api, args, query, body):
+    return HTTPStatus.OK, await api.devices.list_all()
+
+
+async def _get_device(api, args, query, body):
+    return HTTPStatus.OK, _found(await api.devices.get(int(args[0])), "Gerät")
+
+
+async def _device_reservations(api, args, query, body):
+    start, end = _query_window(query)
+    return HTTPStatus.OK, await api.reservations.list_for_device_window(int(args[0]), start, end)
+
+
+async def _device_free(api, args, query, body):
+    start, end = _query_window(query)
+    try:
+        min_duration = timedelta(minutes=float(_param(query, "min_minutes") or 0))
+    except ValueError:
+        raise ApiError(HTTPStatus.BAD_REQUEST, "min_minutes muss eine Zahl sein.")
+    slots = await api.reservations.find_free_slots(int(args[0]), (start, end), min_duration)
+    return HTTPStatus.OK, [{"start": s, "end": e} for s, e in slots]
+
+
+async def _available(api, args, query, body):
+    start, end = _query_window(query)
+    return HTTPStatus.OK, await api.reservations.find_available_devices(start, end)
+
+
+async def _create_reservation(api, args, query, body):
+    user_id, device_id, start, end = _booking(body)
+    return HTTPStatus.CREATED, await api.reservations.create(user_id, device_id, *_window(start, end))
+
+
+async def _create_reservations(api, args, query, body):
+    if not isinstance(body, list):
+        raise ApiError(HTTPStatus.BAD_REQUEST, "Liste von Reservierungen erwartet.")
+    return HTTPStatus.OK, await api.reservations.create_many([_booking(item) for item in body])
+
+
+async def _cancel_reservation(api, args, query, body):
+    # wie ReservationService.cancel, aber mit Anzahl: unbekannte id -> 404
+    if not await api.run(api.service.res_repo.delete_many, [args[0]]):
+        raise ApiError(HTTPStatus.NOT_FOUND, "Reservierung existiert nicht.")
+    return HTTPStatus.OK, {"id": args[0]}
+
+
+ROUTES: list[tuple[str, re.Pattern, Handler]] = [
+    (method, re.compile(pattern), handler)
+    for method, pattern, handler in (
+        ("GET", r"/users", _list_users),
+        ("POST", r"/users", _create_user),
+        ("GET", r"/users/([^/]+)", _get_user),
+        ("GET", r"/devices", _list_devices),
+        ("GET", r"/devices/(\d+)", _get_device),
+        ("GET", r"/devices/(\d+)/reservations", _device_reservations),
+        ("GET", r"/devices/(\d+)/free", _device_free),
+        ("GET", r"/available", _available),
+        ("POST", r"/reservations", _create_reservation),
+        ("POST", r"/reservations/batch", _create_reservations),
+        ("DELETE", r"/reservations/([^/]+)", _cancel_reservation),
+    )
+]
+
+
+async def dispatch(api: AsyncReservationService, method: str, target: str, body: bytes) -> tuple[HTTPStatus, Any]:
+    """Eine Anfrage beantworten: (Status, JSON-Wert); Fehler werden zu {"error": ...}."""
+    url = urlsplit(target)
+    path = unquote(url.path).rstrip("/") or "/"
+    try:
+        matched = [(m, route_method, handler) for route_method, pattern, handler in ROUTES if (m := pattern.fullmatch(path))]
+        if not matched:
+            raise ApiError(HTTPStatus.NOT_FOUND, f"Unbekannter Pfad: {path}")
+        for match, route_method, handler in matched:
+            if route_method == method:
+                break
+        else:
+            raise ApiError(HTTPStatus.METHOD_NOT_ALLOWED, f"{method} ist für {path} nicht erlaubt.")
+        try:
+            payload = json.loads(body) if body else None
+        except ValueError:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "Body ist kein gültiges JSON.")
+        return await handler(api, match.groups(), parse_qs(url.query), payload)
+    except ApiError as e:
+        return e.status, {"error": str(e)}
+    except ReservationError as e:
+        return HTTPStatus.CONFLICT, {"error": str(e)}
+    except ValueError as e:
+        return HTTPStatus.BAD_REQUEST, {"error": str(e)}
+    except Exception:
+        traceback.print_exc()
+        return HTTPStatus.INTERNAL_SERVER_ERROR, {"error": "Interner Fehler."}
+
+
+# --- HTTP/1.1 über asyncio-Streams -----------------------------------------------------------------------
+
+async def _read_request(reader: asyncio.StreamReader) -> tuple[str, str, str, dict[str, str], bytes] | None:
+    try:
+        line = await asyncio.wait_for(reader.readline(), IDLE_TIMEOUT)
+    except ValueError:
+        # Zeile länger als das Limit des StreamReader
+        raise ApiError(HTTPStatus.BAD_REQUEST, "Anfragezeile zu lang.")
+    if not line:
+        return None
+    try:
+        method, target, version = line.decode("latin-1").split()
+    except ValueError:
+        raise ApiError(HTTPStatus.BAD_REQUEST, "Ungültige Anfragezeile.")
+    # Header und Body ebenfalls mit Zeitlimit: ein langsamer Client belegt die Verbindung nicht endlos
+    headers, body = await asyncio.wait_for(_read_headers_and_body(reader), IDLE_TIMEOUT)
+    return method.upper(), target, version, headers, body
+
+
+async def _read_headers_and_body(reader: asyncio.StreamReader) -> tuple[dict[str, str], bytes]:
+    headers: dict[str, str] = {}
+    while True:
+        try:
+            header = await reader.readline()
+        except ValueError:
+            raise ApiError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, "Header-Zeile zu lang.")
+        if header in (b"\r\n", b"\n", b""):
+            break
+        if len(headers) >= MAX_HEADERS:
+            raise ApiError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, f"Mehr als {MAX_HEADERS} Header.")
+        name, _, value = header.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    try:
+        length = int(headers.get("content-length", "0"))
+    except ValueError:
+        raise ApiError(HTTPStatus.BAD_REQUEST, "Ungültige Content-Length.")
+    if length < 0:
+        raise ApiError(HTTPStatus.BAD_REQUEST, "Ungültige Content-Length.")
+    if length > MAX_BODY:
+        raise ApiError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, f"Body größer als {MAX_BODY} Bytes.")
+    body = await reader.readexactly(length) if length > 0 else b""
+    return headers, body
+
+
+def _response(status: HTTPStatus, payload: Any, keep_alive: bool) -> bytes:
+    body = json.dumps(payload, default=_json_default, ensure_ascii=False).encode()
+    head = (
+        f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+        "Content-Type: application/json; charset=utf-8\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+    )
+    return head.encode("latin-1") + body
+
+
+async def handle_connection(api: AsyncReservationService, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    try:
+        while True:
+            try:
+                request = await _read_request(reader)
+            except ApiError as e:
+                writer.write(_response(e.status, {"error": str(e)}, keep_alive=False))
+                await writer.drain()
+                return
+            if request is None:
+                return
+            method, target, version, headers, body = request
+            connection = headers.get("connection", "").lower()
+            keep_alive = connection != "close" and (version == "HTTP/1.1" or connection == "keep-alive")
+            status, payload = await dispatch(api, method, target, body)
+            writer.write(_response(status, payload, keep_alive))
+            await writer.drain()
+            if not keep_alive:
+                return
+    except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except ConnectionError:
+            pass
+
+
+async def serve(host: str = "127.0.0.1", port: int = 8765, workers: int = API_WORKERS) -> None:
+    async with AsyncReservationService(max_workers=workers) as api:
+        server = await asyncio.start_server(lambda r, w: handle_connection(api, r, w), host, port, backlog=1024)
+        print(f"API auf http://{host}:{port} ({workers} Worker-Threads)")
+        async with server:
+            await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Lokale JSON-API für Reservierungen")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=API_WORKERS)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers))
+    except KeyboardInterrupt:
+        pass
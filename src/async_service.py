@@ -0,0 +1,78 @@
+# src/async_service.py
+# asyncio-Fassade über ReservationService, UserRepo und DeviceRepo (für andere Tools, siehe api_server.py).
+#   - blockierende Storage-Zugriffe laufen in einem begrenzten Thread-Pool (API_WORKERS, Standard 8),
+#     die Event-Loop bleibt frei
+#   - Lesezugriffe laufen parallel (TinyDB: geteilter Snapshot, SQLite: eine Verbindung pro Thread)
+#   - Schreibvorgänge serialisiert der Storage (Geräte-Locks, Unit of Work); WriteBehind bündelt sie
+#     zu gemeinsamen Flushes (Group Commit) – pro Aufruf wird nicht geflusht, erst bei close()
+#   - jede Methode der Vorlage ist awaitbar: `await api.users.get(id)`, `await api.reservations.create(...)`
+from __future__ import annotations
+
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, TypeVar
+
+import db
+from reservation_service import ReservationService
+
+API_WORKERS = int(os.environ.get("API_WORKERS", "8"))
+
+R = TypeVar("R")
+
+
+class _AsyncProxy:
+    """`await proxy.method(...)` führt `target.method(...)` im Thread-Pool der Fassade aus."""
+
+    def __init__(self, target: Any, run: Callable[..., Awaitable[Any]]) -> None:
+        self._target = target
+        self._run = run
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._target, name)
+        if not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        async def call(*args: Any, **kwargs: Any) -> Any:
+            return await self._run(attr, *args, **kwargs)
+
+        # einmal binden, danach normaler Attributzugriff
+        setattr(self, name, call)
+        return call
+
+
+class AsyncReservationService:
+    """
+    Asynchrone Sicht auf die Service-Schicht:
+      - `reservations`: ReservationService (create, create_many, cancel, find_available_devices, ...)
+      - `users` / `devices`: UserRepo / DeviceRepo des Services
+    Als `async with` verwenden oder am Ende `await close()` (wartet laufende Aufrufe ab, flusht).
+    """
+
+    def __init__(self, service: ReservationService | None = None, max_workers: int = API_WORKERS) -> None:
+        if max_workers < 1:
+            raise ValueError("max_workers muss mindestens 1 sein.")
+        self.service = service or ReservationService()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="async-service")
+        self.reservations = _AsyncProxy(self.service, self.run)
+        self.users = _AsyncProxy(self.service.user_repo, self.run)
+        self.devices = _AsyncProxy(self.service.device_repo, self.run)
+
+    async def run(self, fn: Callable[..., R], *args: Any, **kwargs: Any) -> R:
+        """Beliebigen blockierenden Aufruf im Thread-Pool ausführen."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+
+    async def close(self) -> None:
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, functools.partial(self._executor.shutdown, wait=True))
+        # gepufferte Schreibvorgänge (WriteBehind) sofort auf die Platte, nicht erst beim Prozessende
+        await loop.run_in_executor(None, db.flush)
+
+    async def __aenter__(self) -> "AsyncReservationService":
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        await self.close()
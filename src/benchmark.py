@@ -0,0 +1,304 @@
+# src/benchmark.py
+# Microbenchmarks für Repositories, ReservationService und Serializable.
+#
+#   python src/benchmark.py                                   # tinydb + sqlite, 10^2 .. 10^4 Zeilen
+#   python src/benchmark.py --scales 1000000 --backends sqlite
+#   python src/benchmark.py --out neu.jsonl --compare alt.jsonl
+#   python src/benchmark.py --imports                         # Importzeit der App gegen IMPORT_BUDGET_MS
+#
+# Jede Kombination (Backend, Größe) läuft in einem eigenen Prozess auf temporären
+# Datenbankdateien (DB_FILE / DB_SQLITE_FILE): prozessweite Caches und Indizes starten leer,
+# Speicherspitzen beeinflussen sich nicht. Ergebnis: eine JSON-Zeile pro Messung
+# (Wall-Time, Peak-Speicher eines Aufrufs, Commit), vergleichbar über Commits hinweg.
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SCALES = (100, 1_000, 10_000)
+BACKENDS = ("tinydb", "sqlite")
+
+# Wiederholungen pro Operation (teure Operationen seltener)
+REPEAT = {
+    "UserRepo.get": 1000,
+    "DeviceRepo.list_all": 20,
+    "ReservationRepo.find_overlaps": 1000,
+    "ReservationService.create": 100,
+    "Serializable.store_data": 100,
+    "Serializable.find_all": 3,
+}
+
+BASE_TIME = datetime(2030, 1, 1, tzinfo=timezone.utc)
+
+# Module, die user_interface.py beim Start importiert (ohne streamlit selbst)
+APP_MODULES = ("instrumentation", "users", "devices", "repositories", "reservation_service", "cached_reads")
+# Budget in ms (Minimum aus mehreren Kaltstarts, python -X importtime); gemessen ~540 ms / ~40 ms
+IMPORT_BUDGET_MS = {"streamlit": 1000, "app": 100}
+
+
+def device_count(scale: int) -> int:
+    return max(10, scale // 100)
+
+
+def generate(scale: int, seed: int = 42) -> tuple[list, list, list]:
+    """
+    Synthetische Daten: `scale` Nutzer, `scale` Reservierungen, device_count(scale) Geräte.
+    Reservierungen pro Gerät lückenhaft hintereinander (1–4 h, Pausen bis 6 h), also überschneidungsfrei.
+    """
+    from devices import Device
+    from reservations import Reservation
+    from users import User
+
+    rng = random.Random(seed)
+    users = [User(id=f"user{i}@bench.local", name=f"Nutzer {i}") for i in range(scale)]
+    devices = [
+        Device(id=str(i), name=f"Gerät {i}", responsible_user_id=users[i % scale].id)
+        for i in range(1, device_count(scale) + 1)
+    ]
+
+    cursors = {int(d.id): BASE_TIME for d in devices}
+    reservations = []
+    for _ in range(scale):
+        device_id = rng.randint(1, len(devices))
+        start = cursors[device_id] + timedelta(hours=rng.randint(0, 6))
+        end = start + timedelta(hours=rng.randint(1, 4))
+        cursors[device_id] = end
+        reservations.append(Reservation(user_id=rng.choice(users).id, device_id=device_id, start_date=start, end_date=end))
+    return users, devices, reservations
+
+
+def _measure(op: str, call: Callable[[int], Any], repeat: int) -> dict[str, Any]:
+    # 1. Aufruf separat (baut ggf. Indizes auf), dann `repeat` Aufrufe ohne, einer mit tracemalloc
+    t = time.perf_counter()
+    call(0)
+    cold = time.perf_counter() - t
+
+    t = time.perf_counter()
+    for i in range(1, repeat + 1):
+        call(i)
+    total = time.perf_counter() - t
+
+    tracemalloc.start()
+    call(repeat + 1)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "op": op,
+        "n": repeat,
+        "cold_s": round(cold, 6),
+        "total_s": round(total, 6),
+        "mean_us": round(total / repeat * 1e6, 2),
+        "peak_kib": round(peak / 1024, 1),
+    }
+
+
+def run_worker(backend: str, scale: int) -> list[dict[str, Any]]:
+    """Misst alle Operationen für ein Backend und eine Größe (läuft im Kindprozess)."""
+    import db
+    from repositories import create_repos
+    from reservation_service import ReservationService
+    from users import User
+
+    users, devices, reservations = generate(scale)
+    user_repo, device_repo, res_repo = create_repos(backend)
+    service = ReservationService()
+    rng = random.Random(7)
+    results = []
+
+    t = time.perf_counter()
+    user_repo.upsert_many(users)
+    device_repo.upsert_many(devices)
+    res_repo.create_many(reservations)
+    db.flush()
+    results.append({"op": "load", "n": 1, "total_s": round(time.perf_counter() - t, 6)})
+
+    user_ids = [u.id for u in users]
+    horizon = max(r.end_date for r in reservations)
+    span = (horizon - BASE_TIME) / timedelta(hours=1)
+
+    def find_overlaps(_: int) -> None:
+        start = BASE_TIME + timedelta(hours=rng.uniform(0, span))
+        res_repo.find_overlaps(rng.randint(1, len(devices)), start, start + timedelta(hours=4))
+
+    def create(i: int) -> None:
+        # hinter allen vorhandenen Buchungen, pro Aufruf ein eigener Slot -> nie Konflikt
+        start = horizon + timedelta(hours=2 * i)
+        service.create(rng.choice(user_ids), 1 + i % len(devices), start, start + timedelta(hours=1))
+
+    ops: list[tuple[str, Callable[[int], Any]]] = [
+        ("UserRepo.get", lambda _: user_repo.get(rng.choice(user_ids))),
+        ("DeviceRepo.list_all", lambda _: device_repo.list_all()),
+        ("ReservationRepo.find_overlaps", find_overlaps),
+        ("ReservationService.create", create),
+    ]
+    # Serializable arbeitet direkt auf database.json (nur TinyDB)
+    if backend == "tinydb":
+        ops += [
+            ("Serializable.store_data", lambda i: User(id=f"new{i}@bench.local", name="Neu").store_data()),
+            ("Serializable.find_all", lambda _: User.find_all()),
+        ]
+
+    for op, call in ops:
+        results.append(_measure(op, call, REPEAT[op]))
+    db.flush()
+
+    if resource is not None:
+        # ru_maxrss: Linux KiB, macOS Byte
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        results.append({"op": "process", "max_rss_kib": max_rss // 1024 if sys.platform == "darwin" else max_rss})
+    return results
+
+
+def import_times(repeat: int = 5) -> dict[str, float]:
+    """
+    Importzeit beim Kaltstart in ms: "streamlit" und "app" (APP_MODULES zusätzlich zu streamlit).
+    Jede Messung in einem frischen Interpreter; Minimum über `repeat` Läufe.
+    """
+    marker = "-- app --"
+    code = f"import streamlit, sys\nsys.stderr.write({marker!r} + '\\n')\n" + "".join(f"import {m}\n" for m in APP_MODULES)
+    best: dict[str, float] = {}
+    for _ in range(repeat):
+        out = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", code], cwd=SRC_DIR, capture_output=True, text=True, check=True
+        )
+        totals = {"streamlit": 0.0, "app": 0.0}
+        section = None
+        for line in out.stderr.splitlines():
+            if line == marker:
+                section = "app"
+                continue
+            # "import time: self [us] | cumulative | name"; oberste Ebene: genau ein Leerzeichen vor dem Namen
+            parts = line.split("|")
+            if len(parts) != 3 or not parts[1].strip().isdigit() or parts[2].startswith("  "):
+                continue
+            key = section or ("streamlit" if parts[2].strip() == "streamlit" else None)
+            if key:
+                totals[key] += int(parts[1]) / 1000
+        for key, ms in totals.items():
+            best[key] = min(best.get(key, ms), ms)
+    return {key: round(ms, 1) for key, ms in best.items()}
+
+
+def _commit() -> str | None:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=SRC_DIR, capture_output=True, text=True, check=True
+        )
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(backends: list[str], scales: list[int]) -> list[dict[str, Any]]:
+    meta = {
+        "commit": _commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+    }
+    records = []
+    for backend in backends:
+        for scale in scales:
+            with tempfile.TemporaryDirectory(prefix="bench-") as tmp:
+                env = dict(
+                    os.environ,
+                    DB_BACKEND=backend,
+                    DB_FILE=os.path.join(tmp, "database.json"),
+                    DB_SQLITE_FILE=os.path.join(tmp, "database.sqlite3"),
+                    DEVICE_ID_MAX=str(device_count(scale) + 100),
+                )
+                out = subprocess.run(
+                    [sys.executable, os.path.abspath(__file__), "--worker", backend, str(scale)],
+                    env=env, cwd=SRC_DIR, capture_output=True, text=True,
+                )
+            if out.returncode != 0:
+                raise RuntimeError(f"Benchmark {backend}/{scale} fehlgeschlagen:\n{out.stderr}")
+            for result in json.loads(out.stdout):
+                records.append({**meta, "backend": backend, "scale": scale, **result})
+            print(f"{backend:>6} {scale:>9,}: fertig", file=sys.stderr)
+    return records
+
+
+def _key(record: dict[str, Any]) -> tuple:
+    return (record["backend"], record["scale"], record["op"])
+
+
+def print_table(records: list[dict[str, Any]], baseline: list[dict[str, Any]] | None = None) -> None:
+    old = {_key(r): r for r in baseline or () if "mean_us" in r}
+    header = f"{'Backend':<7} {'Zeilen':>9}  {'Operation':<30} {'n':>5} {'kalt ms':>9} {'Ø µs':>11} {'Peak KiB':>9}"
+    if old:
+        header += f" {'vs. Basis':>10}"
+    print(header)
+    for r in records:
+        if "mean_us" not in r:
+            continue
+        line = (
+            f"{r['backend']:<7} {r['scale']:>9,}  {r['op']:<30} {r['n']:>5} "
+            f"{r['cold_s'] * 1000:>9.2f} {r['mean_us']:>11.1f} {r['peak_kib']:>9.1f}"
+        )
+        base = old.get(_key(r))
+        if base and base["mean_us"]:
+            line += f" {r['mean_us'] / base['mean_us']:>9.2f}x"
+        print(line)
+
+
+def _read_jsonl(path: str) -> list[dict[str, Any]]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Microbenchmarks für Repositories und ReservationService.")
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=list(BACKENDS))
+    parser.add_argument("--scales", nargs="+", type=int, default=list(DEFAULT_SCALES), help="Zeilen pro Tabelle (10^2 .. 10^6)")
+    parser.add_argument("--out", help="Ergebnisse als JSON Lines anhängen")
+    parser.add_argument("--compare", help="frühere Ergebnisse (JSON Lines): Faktor Ø-Zeit neu/alt")
+    parser.add_argument("--imports", action="store_true", help="nur Importzeit der App messen (Budget: IMPORT_BUDGET_MS)")
+    parser.add_argument("--worker", nargs=2, metavar=("BACKEND", "SCALE"), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        backend, scale = args.worker
+        print(json.dumps(run_worker(backend, int(scale))))
+        return
+
+    if args.imports:
+        times = import_times()
+        over = False
+        for key, ms in times.items():
+            budget = IMPORT_BUDGET_MS[key]
+            over |= ms > budget
+            print(f"{key:<10} {ms:>8.1f} ms  (Budget {budget} ms){'  ÜBERSCHRITTEN' if ms > budget else ''}")
+        if args.out:
+            meta = {"commit": _commit(), "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds")}
+            with open(args.out, "a", encoding="utf-8") as f:
+                for key, ms in times.items():
+                    f.write(json.dumps({**meta, "op": f"import.{key}", "ms": ms, "budget_ms": IMPORT_BUDGET_MS[key]}) + "\n")
+        sys.exit(1 if over else 0)
+
+    records = run(args.backends, args.scales)
+    if args.out:
+        with open(args.out, "a", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+    print_table(records, _read_jsonl(args.compare) if args.compare else None)
+
+
+if __name__ == "__main__":
+    main()
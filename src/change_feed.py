@@ -0,0 +1,131 @@
+# src/change_feed.py
+# Änderungsfeed der Repository-Schicht (im Prozess).
+#   - publish()/publish_deleted(): insert/update/delete-Ereignisse mit fortlaufender Versionsnummer
+#   - subscribe(callback, tables): Callback pro Ereignis, Rückgabe meldet wieder ab
+#   - since(version): alle Ereignisse nach `version` aus einem Ringpuffer (None: zu alt, neu laden)
+#   - deferred(): in Unit of Work/Transaktion erst am erfolgreichen Ende veröffentlichen, bei Fehlern verwerfen
+# Versionen gelten pro Prozess; Änderungen anderer Prozesse erkennen weiterhin die table_version()-Zähler.
+from __future__ import annotations
+
+import os
+import threading
+import traceback
+from collections import deque
+from contextlib import contextmanager
+from itertools import islice
+from typing import Any, Callable, Deque, Iterable, Iterator, List, Mapping, NamedTuple, Optional, Tuple
+
+INSERT = "insert"
+UPDATE = "update"
+DELETE = "delete"
+
+# so viele Ereignisse hält since() vor
+HISTORY = int(os.environ.get("DB_CHANGE_FEED_HISTORY", "10000"))
+
+
+class Change(NamedTuple):
+    version: int
+    table: str
+    op: str
+    key: Any
+    row: Optional[Mapping[str, Any]]  # neuer Stand (wie to_dict()), bei delete None – nur lesen
+
+
+Callback = Callable[[Change], None]
+
+_lock = threading.RLock()
+_version = 0
+_history: Deque[Change] = deque(maxlen=HISTORY)
+_subscribers: List[Tuple[Optional[frozenset], Callback]] = []
+_local = threading.local()
+
+
+def current_version() -> int:
+    return _version
+
+
+def publish(table: str, op: str, rows: Iterable[Mapping[str, Any]]) -> None:
+    """insert/update: ein Ereignis pro Zeile, Schlüssel ist row["id"]."""
+    _add([(table, op, row["id"], row) for row in rows])
+
+
+def publish_deleted(table: str, keys: Iterable[Any]) -> None:
+    _add([(table, DELETE, key, None) for key in keys])
+
+
+def _add(events: List[Tuple[str, str, Any, Optional[Mapping[str, Any]]]]) -> None:
+    if not events:
+        return
+    pending = getattr(_local, "pending", None)
+    if pending is not None:
+        pending.extend(events)
+        return
+    _emit(events)
+
+
+def _emit(events: List[Tuple[str, str, Any, Optional[Mapping[str, Any]]]]) -> None:
+    global _version
+    # Versionen unter dem Lock vergeben, Callbacks erst danach aufrufen: ein Abonnent, der selbst
+    # schreibt oder auf einen anderen Thread wartet, kann so nicht blockieren. Innerhalb eines Threads
+    # kommen Ereignisse in Versionsreihenfolge an, zwischen Threads ordnet Change.version.
+    with _lock:
+        changes = []
+        for table, op, key, row in events:
+            _version += 1
+            changes.append(Change(_version, table, op, key, row))
+        _history.extend(changes)
+        subscribers = list(_subscribers)
+    for change in changes:
+        for tables, callback in subscribers:
+            if tables is None or change.table in tables:
+                try:
+                    callback(change)
+                except Exception:
+                    # ein fehlerhafter Abonnent darf den (bereits erfolgten) Schreibvorgang nicht abbrechen
+                    traceback.print_exc()
+
+
+@contextmanager
+def deferred() -> Iterator[None]:
+    """Ereignisse im Block sammeln (verschachtelbar): veröffentlicht am Ende des äußersten Blocks, bei Fehlern verworfen."""
+    if getattr(_local, "pending", None) is not None:
+        yield
+        return
+    _local.pending = []
+    try:
+        yield
+        events = _local.pending
+    finally:
+        _local.pending = None
+    _emit(events)
+
+
+def subscribe(callback: Callback, tables: Optional[Iterable[str]] = None) -> Callable[[], None]:
+    """`callback` für jedes künftige Ereignis (optional nur `tables`); liefert die Funktion zum Abmelden."""
+    entry = (frozenset(tables) if tables is not None else None, callback)
+    with _lock:
+        _subscribers.append(entry)
+
+    def unsubscribe() -> None:
+        with _lock:
+            if entry in _subscribers:
+                _subscribers.remove(entry)
+
+    return unsubscribe
+
+
+def since(version: int, tables: Optional[Iterable[str]] = None) -> Optional[List[Change]]:
+    """
+    Ereignisse mit Version > `version`, aufsteigend (optional nur `tables`).
+    None, wenn der Ringpuffer sie nicht mehr vollständig hat: dann komplett neu lesen.
+    """
+    with _lock:
+        if version >= _version:
+            return []
+        if not _history or _history[0].version > version + 1:
+            return None
+        changes = list(islice(_history, version + 1 - _history[0].version, None))
+    if tables is not None:
+        tables = set(tables)
+        changes = [c for c in changes if c.table in tables]
+    return changes
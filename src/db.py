@@ -1,28 +1,86 @@
 # src/db.py
 import os
+import threading
 from datetime import datetime, timezone
 
 from tinydb import TinyDB
 from tinydb.table import Table
 from tinydb_serialization import SerializationMiddleware
 from tinydb_serialization.serializers import DateTimeSerializer
-from tinydb.storages import JSONStorage
 
+import instrumentation
+from storage import Durability, JSONFileStorage, SnapshotCache, SnapshotTable, WriteBehind
 
-DB_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "database.json")
 
-# Serializer (datetime)
+DB_FILE = os.environ.get("DB_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "database.json"))
 
-serializer = SerializationMiddleware(JSONStorage)
-serializer.register_serializer(DateTimeSerializer(), "TinyDateTime")
+# "tinydb" (database.json) oder "sqlite" (siehe sqlite_db.py, Migration: python sqlite_db.py)
+DB_BACKEND = os.environ.get("DB_BACKEND", "tinydb")
 
+# Inventarnummern der Geräte: 1..DEVICE_ID_MAX (siehe DeviceRepo)
+DEVICE_ID_MAX = int(os.environ.get("DEVICE_ID_MAX", "20"))
 
-_DB = TinyDB(DB_FILE, storage=serializer)
+# Aufbewahrung: Reservierungen, die seit so vielen Tagen vorbei sind, wandern ins Archiv (ReservationService.archive_past)
+ARCHIVE_AFTER_DAYS = int(os.environ.get("DB_ARCHIVE_AFTER_DAYS", "90"))
+
+# Write-Behind: Änderungen sammeln und gebündelt schreiben (siehe storage.WriteBehind)
+DURABILITY = Durability(os.environ.get("DB_DURABILITY", Durability.FLUSH.value))
+WRITE_BEHIND_MAX_PENDING = 50
+WRITE_BEHIND_MAX_DELAY = 1.0  # Sekunden
+
+
+class SharedTinyDB(TinyDB):
+    table_class = SnapshotTable
+
+
+def _storage_chain(durability: Durability) -> SnapshotCache:
+    # Middleware-Instanzen halten ihre Storage -> pro Datei eine eigene Kette:
+    # SnapshotCache -> WriteBehind -> SerializationMiddleware -> JSONFileStorage
+    # Serializer (datetime)
+    serializer = SerializationMiddleware(JSONFileStorage)
+    serializer.register_serializer(DateTimeSerializer(), "TinyDateTime")
+    write_behind = WriteBehind(
+        serializer,
+        durability=durability,
+        max_pending=WRITE_BEHIND_MAX_PENDING,
+        max_delay=WRITE_BEHIND_MAX_DELAY,
+    )
+    return SnapshotCache(write_behind, lock=write_behind.lock)
+
+
+# Ein Handle pro Datei, geteilt von get_db() und DatabaseConnector
+_HANDLES: dict[str, TinyDB] = {}
+_HANDLES_LOCK = threading.Lock()
+
+
+def open_db(path: str = DB_FILE, durability: Durability = DURABILITY) -> TinyDB:
+    """Return pooled TinyDB handle for `path` (one parsed snapshot per file)."""
+    path = os.path.abspath(path)
+    with _HANDLES_LOCK:
+        db = _HANDLES.get(path)
+        if db is None:
+            db = _HANDLES[path] = SharedTinyDB(path, storage=_storage_chain(durability))
+        return db
+
+
+@instrumentation.timed("db.flush")
+def flush() -> None:
+    """Write all buffered changes of every open handle to disk."""
+    with _HANDLES_LOCK:
+        handles = list(_HANDLES.values())
+    for db in handles:
+        db.storage.flush()
 
 
 def get_db() -> TinyDB:
-    """Return shared TinyDB instance."""
-    return _DB
+    """Return shared TinyDB instance (opened on first use, not at import)."""
+    # ohne Lock: nach dem ersten Aufruf nur ein dict-Zugriff
+    return _HANDLES.get(os.path.abspath(DB_FILE)) or open_db(DB_FILE)
+
+
+def archive_path(partition: str, db_file: str | None = None) -> str:
+    """Datei einer Archivpartition neben der Datenbank, z. B. database_archive/reservations-2025.json."""
+    return os.path.join(os.path.splitext(db_file or DB_FILE)[0] + "_archive", f"reservations-{partition}.json")
 
 
 def now_utc() -> datetime:
@@ -30,6 +88,11 @@ def now_utc() -> datetime:
     return datetime.now(timezone.utc)
 
 
+def data_version(table_name: str | None = None) -> int:
+    """Datenstand des geteilten Handles – steigt bei jedem Schreibvorgang und bei Änderungen von außen."""
+    return get_db().storage.table_version(table_name)
+
+
 
 class DatabaseConnector:
     __instance = None
@@ -41,4 +104,4 @@ class DatabaseConnector:
         return cls.__instance
 
     def get_table(self, table_name: str) -> Table:
-        return TinyDB(self.path, storage=serializer).table(table_name)
+        return open_db(self.path).table(table_name)
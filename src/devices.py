@@ -1,6 +1,7 @@
 # src/devices.py
 from __future__ import annotations
 
+from collections import namedtuple
 from datetime import datetime
 from typing import Any, Dict, Optional
 
@@ -8,7 +9,11 @@ from serializable import Serializable
 
 
 class Device(Serializable):
+    __slots__ = ("_id", "_db_id", "name", "responsible_user_id", "is_active", "end_of_life")
+
     table_name = "devices"
+    fields = ("id", "name", "responsible_user_id", "is_active", "end_of_life", "creation_date", "last_update")
+    Row = namedtuple("DeviceRow", fields)
 
     def __init__(
         self,
@@ -24,12 +29,22 @@ class Device(Serializable):
         self.is_active = is_active
         self.end_of_life = end_of_life
 
+    @property
+    def id(self):
+        return self._id
+
+    @id.setter
+    def id(self, value) -> None:
+        self._id = value
+        # Gespeichert wird die Inventarnummer als int – einmal beim Setzen statt bei jedem to_dict()
+        self._db_id = int(value) if str(value).isdigit() else value
+
     def set_responsible_user_id(self, user_id: str) -> None:
         self.responsible_user_id = user_id
 
     def to_dict(self) -> Dict[str, Any]:
         return {
-            "id": int(self.id) if str(self.id).isdigit() else self.id,
+            "id": self._db_id,
             "name": self.name,
             "responsible_user_id": self.responsible_user_id,
             "is_active": self.is_active,
@@ -40,13 +55,11 @@ class Device(Serializable):
 
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> "Device":
-        obj = cls(
-            id=str(data["id"]),
-            name=data.get("name", ""),
-            responsible_user_id=data.get("responsible_user_id", ""),
-            is_active=data.get("is_active", True),
-            end_of_life=data.get("end_of_life", None),
-        )
-        obj.creation_date = data.get("creation_date", datetime.now())
-        obj.last_update = data.get("last_update", datetime.now())
+        obj = cls.__new__(cls)
+        obj.id = str(data["id"])
+        obj.name = data.get("name", "")
+        obj.responsible_user_id = data.get("responsible_user_id", "")
+        obj.is_active = data.get("is_active", True)
+        obj.end_of_life = data.get("end_of_life", None)
+        obj._set_timestamps(data)
         return obj
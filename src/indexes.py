@@ -0,0 +1,377 @@
+# src/indexes.py
+from __future__ import annotations
+
+import heapq
+from bisect import bisect_left, bisect_right
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Any, Dict, Hashable, Iterable, Iterator, List, Mapping, Optional, Set, Tuple, TypeVar
+
+from tinydb.table import Document, Table
+
+import change_feed
+import instrumentation
+
+I = TypeVar("I")
+
+
+class IntervalIndex:
+    """
+    Prozessweiter Intervall-Index für Reservierungen, pro Gerät nach Startzeit sortiert.
+      - Overlap-Abfragen per bisect in O(log n + k) statt Full-Table-Scan.
+      - Kandidatenfenster ist (start - längste Dauer, end), damit auch lange
+        Reservierungen gefunden werden, die weit vor `start` beginnen.
+      - `version` merkt sich den Datenbankstand, auf dem der Index aufgebaut wurde.
+      - device_version(): Änderungszähler pro Gerät, `generation` zählt die Neuaufbauten.
+    """
+
+    def __init__(self) -> None:
+        self.version: Optional[Hashable] = None
+        self.generation = 0
+        self._changes: Dict[int, int] = {}
+        self._starts: Dict[int, List[datetime]] = {}
+        self._rows: Dict[int, List[Mapping[str, Any]]] = {}
+        self._max_duration: Dict[int, timedelta] = {}
+        self._by_id: Dict[str, Mapping[str, Any]] = {}
+
+    def rebuild(self, rows: Iterable[Mapping[str, Any]], version: Hashable) -> None:
+        self._starts.clear()
+        self._rows.clear()
+        self._max_duration.clear()
+        self._by_id.clear()
+        self._changes.clear()
+        self.generation += 1
+
+        grouped: Dict[int, List[Mapping[str, Any]]] = {}
+        for row in rows:
+            grouped.setdefault(int(row["device_id"]), []).append(row)
+            self._by_id[row["id"]] = row
+
+        for device_id, device_rows in grouped.items():
+            device_rows.sort(key=lambda r: r["start_date"])
+            self._rows[device_id] = device_rows
+            self._starts[device_id] = [r["start_date"] for r in device_rows]
+            self._max_duration[device_id] = max(r["end_date"] - r["start_date"] for r in device_rows)
+
+        self.version = version
+
+    def add(self, row: Mapping[str, Any]) -> None:
+        device_id = int(row["device_id"])
+        starts = self._starts.setdefault(device_id, [])
+        rows = self._rows.setdefault(device_id, [])
+
+        # bei gleicher Startzeit hinter den vorhandenen Einträgen einsortieren
+        pos = bisect_right(starts, row["start_date"])
+        starts.insert(pos, row["start_date"])
+        rows.insert(pos, row)
+        self._by_id[row["id"]] = row
+        self._changes[device_id] = self._changes.get(device_id, 0) + 1
+
+        duration = row["end_date"] - row["start_date"]
+        if duration > self._max_duration.get(device_id, timedelta(0)):
+            self._max_duration[device_id] = duration
+
+    def remove(self, reservation_id: str) -> None:
+        row = self._by_id.pop(reservation_id, None)
+        if row is None:
+            return
+
+        device_id = int(row["device_id"])
+        self._changes[device_id] = self._changes.get(device_id, 0) + 1
+        starts = self._starts[device_id]
+        rows = self._rows[device_id]
+        pos = bisect_left(starts, row["start_date"])
+        while pos < len(rows) and rows[pos]["id"] != reservation_id:
+            pos += 1
+        if pos < len(rows):
+            del starts[pos]
+            del rows[pos]
+        # _max_duration bleibt bewusst stehen: ein zu großes Fenster ist nur langsamer, nie falsch
+
+    def device_version(self, device_id: int) -> Tuple[int, int]:
+        """Ändert sich mit jedem add()/remove() auf dem Gerät und mit jedem Neuaufbau."""
+        return (self.generation, self._changes.get(int(device_id), 0))
+
+    def for_device(self, device_id: int) -> List[Mapping[str, Any]]:
+        return list(self._rows.get(int(device_id), ()))
+
+    def overlapping(self, device_id: int, start: datetime, end: datetime) -> Iterator[Mapping[str, Any]]:
+        """Liefert alle Einträge mit start < r.end_date und end > r.start_date, sortiert nach Start."""
+        device_id = int(device_id)
+        starts = self._starts.get(device_id)
+        if not starts:
+            return
+
+        rows = self._rows[device_id]
+        lo = bisect_right(starts, start - self._max_duration[device_id])
+        hi = bisect_left(starts, end, lo=lo)
+        for i in range(lo, hi):
+            if rows[i]["end_date"] > start:
+                yield rows[i]
+
+
+class TableIndex:
+    """
+    Hash-Index einer TinyDB-Tabelle.
+      - Primärindex: id -> doc_id (eindeutig), Lookups in O(1) statt Query-Scan.
+      - Sekundärindizes (opt-in): Attributwert -> {doc_id}, z.B. responsible_user_id.
+      - `version` merkt sich den Datenbankstand, auf dem der Index aufgebaut wurde.
+    """
+
+    def __init__(self) -> None:
+        self.version: Optional[Hashable] = None
+        self.primary: Dict[Any, int] = {}
+        self.secondary: Dict[str, Dict[Any, Set[int]]] = {}
+        self._values: Dict[int, Tuple[Any, ...]] = {}
+
+    def add_secondary(self, *attributes: str) -> None:
+        for attribute in attributes:
+            self.secondary.setdefault(attribute, {})
+        # erzwingt beim nächsten Zugriff einen Neuaufbau inkl. der neuen Attribute
+        self.version = None
+
+    def rebuild(self, docs: Iterable[Document], version: Hashable) -> None:
+        self.primary.clear()
+        self._values.clear()
+        for values in self.secondary.values():
+            values.clear()
+
+        for doc in docs:
+            self.put(doc.doc_id, doc)
+
+        self.version = version
+
+    def put(self, doc_id: int, row: Mapping[str, Any]) -> None:
+        """Nach insert/update: Einträge des Dokuments (neu) setzen."""
+        self.discard(doc_id)
+
+        if row.get("id") is not None:
+            self.primary[row["id"]] = doc_id
+
+        values = tuple(row.get(attribute) for attribute in self.secondary)
+        for attribute, value in zip(self.secondary, values):
+            self.secondary[attribute].setdefault(value, set()).add(doc_id)
+        self._values[doc_id] = (row.get("id"),) + values
+
+    def discard(self, doc_id: int) -> None:
+        """Nach remove: alle Einträge des Dokuments entfernen."""
+        old = self._values.pop(doc_id, None)
+        if old is None:
+            return
+
+        if self.primary.get(old[0]) == doc_id:
+            del self.primary[old[0]]
+        for attribute, value in zip(self.secondary, old[1:]):
+            doc_ids = self.secondary[attribute].get(value)
+            if doc_ids is not None:
+                doc_ids.discard(doc_id)
+                if not doc_ids:
+                    del self.secondary[attribute][value]
+
+    def get(self, key: Any) -> Optional[int]:
+        return self.primary.get(key)
+
+    def lookup(self, attribute: str, value: Any) -> Set[int]:
+        return set(self.secondary[attribute].get(value, ()))
+
+
+class IdAllocator:
+    """
+    Freie Inventarnummern im Bereich 1..max_id.
+      - Vergebene IDs als Menge: Gültigkeits- und Belegt-Prüfung in O(1).
+      - next_free(): Min-Heap freigegebener IDs unterhalb des Scan-Zeigers, darüber
+        läuft der Zeiger nur vorwärts -> amortisiert O(log n) pro Vergabe.
+      - `version` wie bei den anderen Indizes: Neuaufbau aus den vorhandenen IDs bei Änderung.
+    """
+
+    def __init__(self, max_id: int) -> None:
+        self.max_id = max_id
+        self.version: Optional[Hashable] = None
+        self._used: Set[int] = set()
+        self._released: List[int] = []  # Heap, kann bereits wieder vergebene IDs enthalten (lazy)
+        self._scan = 1                  # IDs < _scan sind vergeben oder liegen in _released
+
+    def rebuild(self, ids: Iterable[Any], version: Hashable) -> None:
+        self._used = {int(i) for i in ids}
+        self._released = []
+        self._scan = 1
+        self.version = version
+
+    def is_valid(self, device_id: int) -> bool:
+        return 1 <= device_id <= self.max_id
+
+    def is_free(self, device_id: int) -> bool:
+        return self.is_valid(device_id) and device_id not in self._used
+
+    def used(self) -> Set[int]:
+        return set(self._used)
+
+    def next_free(self) -> Optional[int]:
+        """Kleinste freie ID oder None, wenn der Bereich voll ist."""
+        released = self._released
+        while released and released[0] in self._used:
+            heapq.heappop(released)
+        if released:
+            return released[0]
+        while self._scan <= self.max_id and self._scan in self._used:
+            self._scan += 1
+        return self._scan if self._scan <= self.max_id else None
+
+    def free_ids(self, limit: Optional[int] = None) -> List[int]:
+        """Freie IDs aufsteigend, höchstens `limit` Stück (ohne Limit: der ganze Bereich)."""
+        limit = self.max_id if limit is None else limit
+        result = sorted({i for i in self._released if i not in self._used})[:limit]
+        candidate = self._scan
+        while len(result) < limit and candidate <= self.max_id:
+            if candidate not in self._used:
+                result.append(candidate)
+            candidate += 1
+        return result
+
+    def allocate(self, device_id: int) -> None:
+        self._used.add(device_id)
+
+    def release(self, device_id: int) -> None:
+        self._used.discard(device_id)
+        if device_id < self._scan:
+            heapq.heappush(self._released, device_id)
+
+
+# Prozessweit geteilt, Schlüssel (Storage, Tabelle): Repos werden bei jedem Rerun neu erzeugt
+_TABLE_INDEXES: Dict[Tuple[int, str], TableIndex] = {}
+_INTERVAL_INDEXES: Dict[Tuple[int, str], IntervalIndex] = {}
+
+
+def table_version(table: Table) -> int:
+    """Datenstand der Tabelle laut SnapshotCache (steigt bei jedem Schreibvorgang)."""
+    return table.storage.table_version(table.name)
+
+
+def write_lock(table: Table):
+    """
+    Unit of Work des Storages (SnapshotCache): Prüfen, Schreiben und Indexpflege laufen unter dessen Lock
+    und auf einem Snapshot – sonst baut ein paralleler Leser den Index zwischen Write und index.put() neu auf
+    (doppelte Einträge), oder ein anderer Prozess schreibt zwischen Index-Lookup und Write.
+    Geschrieben wird am Ende des Blocks: storage.flush() erst danach aufrufen.
+    """
+    return table.storage.unit_of_work()
+
+
+class TableWrite:
+    """
+    Ein Schreibvorgang auf eine Tabelle (siehe table_write): nachgeführte Indizes mit track() anmelden,
+    Ereignisse mit publish()/publish_deleted() sammeln – beides erledigt table_write() am Ende.
+    """
+
+    def __init__(self, table: Table, feed_table: Optional[str] = None) -> None:
+        self.table = table
+        self.feed_table = feed_table or table.name
+        self.indexes: List[Any] = []
+        self.events: List[Tuple[str, Any]] = []
+
+    def track(self, index: I) -> I:
+        self.indexes.append(index)
+        return index
+
+    def publish(self, op: str, rows: Iterable[Mapping[str, Any]]) -> None:
+        self.events.append((op, list(rows)))
+
+    def publish_deleted(self, keys: Iterable[Any]) -> None:
+        self.events.append((change_feed.DELETE, list(keys)))
+
+
+@contextmanager
+def table_write(table: Table, feed_table: Optional[str] = None) -> Iterator[TableWrite]:
+    """
+    write_lock() plus Abschluss: am Ende des Blocks stehen alle mit track() angemeldeten Indizes auf dem
+    neuen Tabellenstand (kein Neuaufbau) und die Ereignisse gehen an den Änderungsfeed (als `feed_table`).
+    Indizes erst im Block holen – vorher können sie einen älteren Stand zeigen. Bei einer Exception
+    entfällt beides, der Rollback erzwingt ohnehin einen Neuaufbau.
+    """
+    write = TableWrite(table, feed_table)
+    with write_lock(table):
+        yield write
+        version = table_version(table)
+        for index in write.indexes:
+            index.version = version
+        for op, rows in write.events:
+            if op == change_feed.DELETE:
+                change_feed.publish_deleted(write.feed_table, rows)
+            else:
+                change_feed.publish(write.feed_table, op, rows)
+
+
+def table_index(table: Table, *secondary: str) -> TableIndex:
+    """
+    Liefert den geteilten Hash-Index für `table` und baut ihn neu auf,
+    wenn sich die Tabelle seit dem letzten Stand geändert hat.
+    `secondary` meldet zusätzliche Attribute für Sekundärindizes an.
+    """
+    key = (id(table.storage), table.name)
+    # Neuaufbau liest nur: der Lock des Storages genügt (nicht write_lock)
+    with table.storage.lock:
+        index = _TABLE_INDEXES.get(key)
+        if index is None:
+            index = _TABLE_INDEXES[key] = TableIndex()
+
+        missing = [attribute for attribute in secondary if attribute not in index.secondary]
+        if missing:
+            index.add_secondary(*missing)
+
+        version = table_version(table)
+        if index.version != version:
+            instrumentation.count("index.rebuild")
+            index.rebuild(table, version)
+    return index
+
+
+_SORTED_DOC_IDS: Dict[Tuple[int, str, str], Tuple[int, List[int]]] = {}
+
+
+def sorted_doc_ids(table: Table, sort_key: str) -> List[int]:
+    """
+    doc_ids von `table` nach `sort_key` sortiert (fehlende Werte zuletzt).
+    Wird bis zur nächsten Änderung der Tabelle gecacht – Seiten sind dann nur noch Slices.
+    """
+    key = (id(table.storage), table.name, sort_key)
+    version = table_version(table)
+    cached = _SORTED_DOC_IDS.get(key)
+    if cached is None or cached[0] != version:
+        instrumentation.count("index.rebuild")
+        docs = list(table)
+        docs.sort(key=lambda d: (d.get(sort_key) is None, d.get(sort_key)))
+        cached = _SORTED_DOC_IDS[key] = (version, [d.doc_id for d in docs])
+    return cached[1]
+
+
+_ID_ALLOCATORS: Dict[Tuple[int, str], IdAllocator] = {}
+
+
+def id_allocator(table: Table, max_id: int) -> IdAllocator:
+    """Wie table_index(), aber der ID-Allokator einer Tabelle mit numerischen ids (Geräte)."""
+    key = (id(table.storage), table.name)
+    with table.storage.lock:
+        allocator = _ID_ALLOCATORS.get(key)
+        if allocator is None or allocator.max_id != max_id:
+            allocator = _ID_ALLOCATORS[key] = IdAllocator(max_id)
+
+        version = table_version(table)
+        if allocator.version != version:
+            instrumentation.count("index.rebuild")
+            allocator.rebuild(table_index(table).primary, version)
+    return allocator
+
+
+def interval_index(table: Table) -> IntervalIndex:
+    """Wie table_index(), aber der Intervall-Index einer Reservierungstabelle."""
+    key = (id(table.storage), table.name)
+    with table.storage.lock:
+        index = _INTERVAL_INDEXES.get(key)
+        if index is None:
+            index = _INTERVAL_INDEXES[key] = IntervalIndex()
+
+        version = table_version(table)
+        if index.version != version:
+            instrumentation.count("index.rebuild")
+            index.rebuild(table, version)
+    return index
@@ -0,0 +1,156 @@
+# src/instrumentation.py
+# Schaltbare Messpunkte für Storage- und Repository-Schicht.
+#   - @timed("Name"): Aufrufe, Latenz-Histogramm pro Operation
+#   - count("zähler", n): Ereignisse (Full-Table-Scans, Datei-Lesen/-Schreiben, Bytes),
+#     global und zusätzlich bei den gerade laufenden @timed-Operationen des Threads
+# Aus (Standard): pro Aufruf nur eine Flag-Abfrage. An mit DB_INSTRUMENTATION=1 oder enable().
+from __future__ import annotations
+
+import os
+import threading
+import time
+import types
+from bisect import bisect_left
+from functools import wraps
+from typing import Any, Callable, Dict, Iterable, List, Optional, TypeVar
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+# Obergrenzen der Histogramm-Buckets in ms (letzter Bucket: alles darüber)
+BUCKETS_MS = (0.01, 0.03, 0.1, 0.3, 1.0, 3.0, 10.0, 30.0, 100.0, 300.0, 1000.0)
+
+
+class _OpStats:
+    __slots__ = ("calls", "total_ms", "max_ms", "histogram", "counters")
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.histogram = [0] * (len(BUCKETS_MS) + 1)
+        self.counters: Dict[str, int] = {}
+
+    def percentile(self, q: float) -> Optional[float]:
+        # Näherung: Obergrenze des Buckets, in dem das q-Quantil liegt
+        if not self.calls:
+            return None
+        rank = q * self.calls
+        seen = 0
+        for bound, n in zip(BUCKETS_MS + (self.max_ms,), self.histogram):
+            seen += n
+            if seen >= rank:
+                return round(min(bound, self.max_ms), 3)
+        return round(self.max_ms, 3)
+
+
+_enabled = os.environ.get("DB_INSTRUMENTATION", "").lower() in ("1", "true", "on")
+_lock = threading.Lock()
+_ops: Dict[str, _OpStats] = {}
+_counters: Dict[str, int] = {}
+_local = threading.local()
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def enable() -> None:
+    global _enabled
+    _enabled = True
+
+
+def disable() -> None:
+    global _enabled
+    _enabled = False
+
+
+def reset() -> None:
+    with _lock:
+        _ops.clear()
+        _counters.clear()
+
+
+def count(name: str, n: int = 1) -> None:
+    """Zähler erhöhen (global und für die laufende Operation)."""
+    if not _enabled:
+        return
+    stack: Optional[List[_OpStats]] = getattr(_local, "stack", None)
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+        # inklusiv: jede laufende Operation des Threads (verschachtelt: äußere und innere) einmal
+        for stats in {id(s): s for s in stack or ()}.values():
+            stats.counters[name] = stats.counters.get(name, 0) + n
+
+
+def timed(name: str) -> Callable[[F], F]:
+    """Decorator: Aufrufzahl und Latenz von `name`; Zähler während des Aufrufs gehen an `name`."""
+
+    def decorate(fn: F) -> F:
+        @wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if not _enabled:
+                return fn(*args, **kwargs)
+
+            with _lock:
+                stats = _ops.get(name)
+                if stats is None:
+                    stats = _ops[name] = _OpStats()
+            stack = getattr(_local, "stack", None)
+            if stack is None:
+                stack = _local.stack = []
+            stack.append(stats)
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                elapsed_ms = (time.perf_counter() - start) * 1000
+                stack.pop()
+                with _lock:
+                    stats.calls += 1
+                    stats.total_ms += elapsed_ms
+                    stats.max_ms = max(stats.max_ms, elapsed_ms)
+                    stats.histogram[bisect_left(BUCKETS_MS, elapsed_ms)] += 1
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorate
+
+
+# Nicht gemessen: Kontextmanager-Fabriken (gemessen würde nur das Erzeugen, nicht der Block)
+# und triviale Zugriffe, die in jedem Rerun als Cache-Schlüssel laufen
+UNTIMED = frozenset({"unit_of_work", "version"})
+
+
+def instrument_methods(prefix: Optional[str] = None, exclude: Iterable[str] = UNTIMED) -> Callable[[type], type]:
+    """Klassen-Decorator: alle eigenen öffentlichen Methoden außer `exclude` mit @timed("Klasse.methode") versehen."""
+    exclude = frozenset(exclude)
+
+    def decorate(cls: type) -> type:
+        label = prefix or cls.__name__
+        for attr, value in list(vars(cls).items()):
+            # nur normale Methoden (static-/classmethods und Properties bleiben unverändert)
+            if attr.startswith("_") or attr in exclude or not isinstance(value, types.FunctionType):
+                continue
+            setattr(cls, attr, timed(f"{label}.{attr}")(value))
+        return cls
+
+    return decorate
+
+
+def snapshot() -> Dict[str, Any]:
+    """Aktueller Stand als dict (für API und Diagnostik-Seite)."""
+    with _lock:
+        ops = {
+            name: {
+                "calls": s.calls,
+                "total_ms": round(s.total_ms, 3),
+                "mean_ms": round(s.total_ms / s.calls, 4) if s.calls else None,
+                "p50_ms": s.percentile(0.5),
+                "p95_ms": s.percentile(0.95),
+                "max_ms": round(s.max_ms, 3),
+                "histogram": dict(zip([f"≤{b:g} ms" for b in BUCKETS_MS] + [f">{BUCKETS_MS[-1]:g} ms"], s.histogram)),
+                "counters": dict(s.counters),
+            }
+            for name, s in _ops.items()
+        }
+        return {"enabled": _enabled, "ops": ops, "counters": dict(_counters)}
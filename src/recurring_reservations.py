@@ -0,0 +1,155 @@
+# src/recurring_reservations.py
+from __future__ import annotations
+
+from collections import namedtuple
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, Optional
+from uuid import uuid4
+
+from reservations import Reservation
+from serializable import Serializable
+
+FREQUENCIES = {"daily": timedelta(days=1), "weekly": timedelta(weeks=1)}
+
+# Obergrenze pro Serie (täglich über knapp drei Jahre, wöchentlich über 19 Jahre)
+MAX_OCCURRENCES = 1000
+
+
+class RecurringReservation(Serializable):
+    """
+    Serienbuchung als ein Datensatz: erster Termin (start_date/end_date), Wiederholung alle
+    `interval` Tage bzw. Wochen, begrenzt durch `until` (letzter möglicher Start) oder `count`.
+    Einzeltermine werden nie gespeichert, sondern bei Bedarf erzeugt (siehe occurrences()).
+    """
+    __slots__ = ("user_id", "device_id", "start_date", "end_date", "frequency", "interval", "until", "count")
+
+    table_name = "recurring_reservations"
+    fields = (
+        "id", "user_id", "device_id", "start_date", "end_date",
+        "frequency", "interval", "until", "count", "creation_date", "last_update",
+    )
+    Row = namedtuple("RecurringReservationRow", fields)
+
+    def __init__(
+        self,
+        user_id: str,
+        device_id: int,
+        start_date: datetime,
+        end_date: datetime,
+        frequency: str = "weekly",
+        interval: int = 1,
+        until: Optional[datetime] = None,
+        count: Optional[int] = None,
+        id: str | None = None,
+    ):
+        super().__init__(id=id or str(uuid4()))
+        self.user_id = user_id
+        self.device_id = int(device_id)
+        self.start_date = start_date
+        self.end_date = end_date
+        self.frequency = frequency
+        self.interval = int(interval)
+        self.until = until
+        self.count = count
+
+    @property
+    def step(self) -> timedelta:
+        return FREQUENCIES[self.frequency] * self.interval
+
+    @property
+    def duration(self) -> timedelta:
+        return self.end_date - self.start_date
+
+    @property
+    def last_index(self) -> int:
+        """Nummer des letzten Termins (der erste hat 0)."""
+        if self.count is not None:
+            return self.count - 1
+        return (self.until - self.start_date) // self.step
+
+    @property
+    def last_end(self) -> datetime:
+        return self.end_date + self.last_index * self.step
+
+    def validate(self) -> None:
+        if self.start_date >= self.end_date:
+            raise ValueError("Start muss vor Ende liegen.")
+        if self.frequency not in FREQUENCIES:
+            raise ValueError(f"Unbekannte Wiederholung: {self.frequency} (erlaubt: {', '.join(FREQUENCIES)}).")
+        if self.interval < 1:
+            raise ValueError("Intervall muss mindestens 1 sein.")
+        if (self.until is None) == (self.count is None):
+            raise ValueError("Serie braucht entweder ein Enddatum oder eine Anzahl von Terminen.")
+        if self.count is not None and self.count < 1:
+            raise ValueError("Anzahl der Termine muss mindestens 1 sein.")
+        if self.until is not None and self.until < self.start_date:
+            raise ValueError("Enddatum der Serie liegt vor dem ersten Termin.")
+        if self.duration > self.step:
+            raise ValueError("Ein Termin ist länger als der Abstand zwischen zwei Terminen.")
+        if self.last_index >= MAX_OCCURRENCES:
+            raise ValueError(f"Höchstens {MAX_OCCURRENCES} Termine pro Serie.")
+
+    def occurrence(self, k: int) -> Reservation:
+        """Termin Nummer `k` als Reservation (id "<Serien-id>#<k>", wird nicht gespeichert)."""
+        start = self.start_date + k * self.step
+        r = Reservation.__new__(Reservation)
+        r.id = f"{self.id}#{k}"
+        r.user_id = self.user_id
+        r.device_id = self.device_id
+        r.start_date = start
+        r.end_date = start + self.duration
+        r.creation_date = self.creation_date
+        r.last_update = self.last_update
+        return r
+
+    def occurrences(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> Iterator[Reservation]:
+        """
+        Termine, die [start, end) schneiden, aufsteigend – lazy, ohne die Termine davor zu erzeugen:
+        der erste passende wird direkt berechnet (Termin k endet nach `start` ⇔ k > (start - end_date) / step).
+        """
+        k = 0
+        if start is not None and start >= self.end_date:
+            k = (start - self.end_date) // self.step + 1
+        step = self.step
+        last = self.last_index
+        while k <= last:
+            if end is not None and self.start_date + k * step >= end:
+                return
+            yield self.occurrence(k)
+            k += 1
+
+    def describe(self) -> str:
+        unit = {"daily": ("täglich", "Tage"), "weekly": ("wöchentlich", "Wochen")}[self.frequency]
+        rhythm = unit[0] if self.interval == 1 else f"alle {self.interval} {unit[1]}"
+        limit = f"{self.count}×" if self.count is not None else f"bis {self.until:%d.%m.%Y}"
+        return f"{rhythm}, {limit}"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "user_id": self.user_id,
+            "device_id": self.device_id,
+            "start_date": self.start_date,
+            "end_date": self.end_date,
+            "frequency": self.frequency,
+            "interval": self.interval,
+            "until": self.until,
+            "count": self.count,
+            "creation_date": self.creation_date,
+            "last_update": self.last_update,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "RecurringReservation":
+        obj = cls.__new__(cls)
+        obj.id = data.get("id") or str(uuid4())
+        obj.user_id = data["user_id"]
+        obj.device_id = int(data["device_id"])
+        obj.start_date = data["start_date"]
+        obj.end_date = data["end_date"]
+        obj.frequency = data.get("frequency", "weekly")
+        obj.interval = int(data.get("interval", 1))
+        obj.until = data.get("until")
+        obj.count = data.get("count")
+        obj._set_timestamps(data)
+        return obj
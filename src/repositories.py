@@ -1,74 +1,229 @@
 # app/repositories.py
 from __future__ import annotations
 
-from tinydb import Query
-from db import get_db, now_utc
+import heapq
+import os
+import change_feed
+from db import DB_BACKEND, DEVICE_ID_MAX, archive_path, get_db, now_utc, open_db
+from instrumentation import instrument_methods
 from users import User
 from devices import Device
+from dataclasses import dataclass
 from datetime import datetime
+from itertools import chain
+from operator import itemgetter
+from typing import Iterable
+from indexes import (
+    IdAllocator,
+    IntervalIndex,
+    TableIndex,
+    TableWrite,
+    id_allocator,
+    interval_index,
+    sorted_doc_ids,
+    table_index,
+    table_version,
+    table_write,
+)
+from recurring_reservations import RecurringReservation
 from reservations import Reservation
+from tinydb.table import Document, Table
 
+
+# Tabellenname der Archivpartitionen im Änderungsfeed (wie die SQLite-Tabelle)
+ARCHIVE_TABLE = "reservations_archive"
+
+
+@dataclass
+class Page:
+    """Ausschnitt einer Liste: items[offset:offset + limit] plus Gesamtanzahl."""
+    items: list
+    total: int
+    offset: int
+    limit: int
+
+
+def _get_docs(table: Table, doc_ids: Iterable[int]) -> list[Document]:
+    # Einzel-Lookups per doc_id: O(k) auf dem gecachten Snapshot statt Scan über die Tabelle
+    docs = (table.get(doc_id=doc_id) for doc_id in doc_ids)
+    return [d for d in docs if d is not None]
+
+
+@instrument_methods()
 class UserRepo:
     def __init__(self) -> None:
         self.table = get_db().table("users")
 
+    def version(self) -> int:
+        """Datenstand der Tabelle – steigt bei jedem Schreibvorgang (Cache-Schlüssel)."""
+        return table_version(self.table)
+
+    def unit_of_work(self):
+        """
+        Konsistenter Snapshot für alle Repos im Block, Schreibvorgänge als ein Write, Rollback bei Fehlern
+        (siehe SnapshotCache.unit_of_work).
+        """
+        return self.table.storage.unit_of_work()
+
     def upsert(self, user: User) -> None:
-        q = Query()
-        self.table.upsert(user.to_dict(), q.id == user.id)
+        with table_write(self.table) as write:
+            index = write.track(table_index(self.table))
+            payload = user.to_dict()
+            doc_id = index.get(user.id)
+            if doc_id is None:
+                doc_id = self.table.insert(payload)
+                write.publish(change_feed.INSERT, [payload])
+            else:
+                self.table.update(payload, doc_ids=[doc_id])
+                write.publish(change_feed.UPDATE, [payload])
+            index.put(doc_id, payload)
+
+    def upsert_many(self, users: Iterable[User]) -> None:
+        """Bulk-Upsert in einem Schreibvorgang (bei doppelten ids gewinnt der letzte Eintrag)."""
+        with table_write(self.table) as write:
+            index = write.track(table_index(self.table))
+            updates: dict[int, dict] = {}
+            inserts: dict[str, dict] = {}
+            for user in users:
+                payload = user.to_dict()
+                doc_id = index.get(user.id)
+                if doc_id is None:
+                    inserts[user.id] = payload
+                else:
+                    updates[doc_id] = payload
+
+            doc_ids = self.table.write_many(updates, list(inserts.values()))
+            for doc_id, payload in updates.items():
+                index.put(doc_id, payload)
+            for doc_id, payload in zip(doc_ids, inserts.values()):
+                index.put(doc_id, payload)
+            write.publish(change_feed.UPDATE, updates.values())
+            write.publish(change_feed.INSERT, inserts.values())
 
     def get(self, user_id: str) -> User | None:
-        q = Query()
-        d = self.table.get(q.id == user_id)
+        doc_id = table_index(self.table).get(user_id)
+        d = self.table.get(doc_id=doc_id) if doc_id is not None else None
         return User.from_dict(d) if d else None
 
-    def list_all(self) -> list[User]:
-        return [User.from_dict(d) for d in self.table.all()]
+    def get_many(self, user_ids: Iterable[str]) -> dict[str, User]:
+        index = table_index(self.table)
+        doc_ids = {index.get(user_id) for user_id in set(user_ids)} - {None}
+        return {d["id"]: User.from_dict(d) for d in _get_docs(self.table, doc_ids)}
+
+    def list_all(self, as_rows: bool = False) -> list[User] | list[User.Row]:
+        """as_rows=True: kompakte Tupel (User.Row) statt Modellobjekten für große Listen."""
+        rows = self.table.raw_rows()
+        if as_rows:
+            return User.rows_from_dicts(rows)
+        return [User.from_dict(d) for d in rows]
+
+    def count(self) -> int:
+        return len(self.table)
+
+    def list_page(self, offset: int = 0, limit: int = 50, sort_key: str = "id") -> Page:
+        doc_ids = sorted_doc_ids(self.table, sort_key)
+        rows = _get_docs(self.table, doc_ids[offset:offset + limit])
+        return Page([User.from_dict(d) for d in rows], len(doc_ids), offset, limit)
 
     def delete(self, user_id: str) -> None:
-        q = Query()
-        self.table.remove(q.id == user_id)
+        with table_write(self.table) as write:
+            index = write.track(table_index(self.table))
+            doc_id = index.get(user_id)
+            if doc_id is None:
+                return
+            self.table.remove(doc_ids=[doc_id])
+            index.discard(doc_id)
+            write.publish_deleted([user_id])
+
+    def delete_many(self, user_ids: Iterable[str]) -> int:
+        """Löscht alle vorhandenen `user_ids` in einem Schreibvorgang, liefert die Anzahl."""
+        with table_write(self.table) as write:
+            index = write.track(table_index(self.table))
+            doc_ids = {user_id: index.get(user_id) for user_id in set(user_ids)}
+            doc_ids = {user_id: doc_id for user_id, doc_id in doc_ids.items() if doc_id is not None}
+            if not doc_ids:
+                return 0
+            self.table.remove(doc_ids=list(doc_ids.values()))
+            for doc_id in doc_ids.values():
+                index.discard(doc_id)
+            write.publish_deleted(doc_ids)
+        return len(doc_ids)
 
 
+@instrument_methods()
 class DeviceRepo:
     """
     Geräte-Repo auf TinyDB-Basis.
-      - Inventarnummern sind auf 1..20 beschränkt.
-      - create() darf keine bereits vergebene ID anlegen.
+      - Inventarnummern sind auf 1..MAX_IDS beschränkt (DEVICE_ID_MAX, Standard 20).
+      - create() darf keine bereits vergebene ID anlegen, ohne ID wird die kleinste freie vergeben.
       - update() erhält creation_date, aktualisiert last_update.
+      - Freie IDs verwaltet ein IdAllocator (keine Scans über Tabelle oder Bereich).
     """
-    MAX_IDS = 20
+    MAX_IDS = DEVICE_ID_MAX
 
     def __init__(self) -> None:
         self.table = get_db().table("devices")
         self.user_repo = UserRepo()
 
+    def version(self) -> int:
+        return table_version(self.table)
+
+    def unit_of_work(self):
+        return self.table.storage.unit_of_work()
+
+    def _index(self) -> TableIndex:
+        return table_index(self.table, "responsible_user_id")
+
     @classmethod
     def _validate_id(cls, device_id: int) -> None:
         if not (1 <= int(device_id) <= cls.MAX_IDS):
             raise ValueError(f"Inventarnummer muss zwischen 1 und {cls.MAX_IDS} liegen.")
 
-    def existing_ids(self) -> set[int]:
-        return {int(d["id"]) for d in self.table.all() if d.get("id") is not None}
+    def _allocator(self) -> IdAllocator:
+        return id_allocator(self.table, self.MAX_IDS)
 
-    def free_ids(self) -> list[int]:
-        existing = self.existing_ids()
-        return [i for i in range(1, self.MAX_IDS + 1) if i not in existing]
+    def _tracked(self, write: TableWrite) -> tuple[IdAllocator, TableIndex]:
+        # Allokator und Index im Schreibvorgang: beide werden nachgeführt
+        return write.track(self._allocator()), write.track(self._index())
 
-    def create(self, device: Device) -> None:
-        device.id = int(device.id)
+    def _assign_id(self, device: Device, allocator: IdAllocator) -> None:
+        # ohne Inventarnummer (None/0) die kleinste freie vergeben
+        device.id = int(device.id or 0) or allocator.next_free() or 0
+        if not device.id:
+            raise ValueError(f"Alle Inventarnummern 1–{self.MAX_IDS} sind bereits vergeben.")
         self._validate_id(device.id)
 
+    def existing_ids(self) -> set[int]:
+        return self._allocator().used()
+
+    def free_ids(self, limit: int | None = None) -> list[int]:
+        """Freie Inventarnummern aufsteigend (höchstens `limit`)."""
+        return self._allocator().free_ids(limit)
+
+    def next_free_id(self) -> int | None:
+        return self._allocator().next_free()
+
+    def is_free(self, device_id: int) -> bool:
+        return self._allocator().is_free(int(device_id))
+
+    def create(self, device: Device) -> None:
         # Verantwortliche Person muss existieren
         if self.user_repo.get(device.responsible_user_id) is None:
             raise ValueError("Verantwortliche Person existiert nicht (User zuerst anlegen).")
 
-        q = Query()
-        if self.table.get(q.id == int(device.id)) is not None:
-            raise ValueError("Inventarnummer bereits vergeben.")
+        with table_write(self.table) as write:
+            allocator, index = self._tracked(write)
+            self._assign_id(device, allocator)
+            if not allocator.is_free(device.id):
+                raise ValueError("Inventarnummer bereits vergeben.")
 
-        device.creation_date = now_utc()
-        device.last_update = now_utc()
-        self.table.insert(device.to_dict())
+            device.creation_date = now_utc()
+            device.last_update = now_utc()
+            payload = device.to_dict()
+            doc_id = self.table.insert(payload)
+            index.put(doc_id, payload)
+            allocator.allocate(device.id)
+            write.publish(change_feed.INSERT, [payload])
 
     def update(self, device: Device) -> None:
         device.id = int(device.id)
@@ -77,15 +232,20 @@ class DeviceRepo:
         if self.user_repo.get(device.responsible_user_id) is None:
             raise ValueError("Verantwortliche Person existiert nicht (User zuerst anlegen).")
 
-        q = Query()
-        existing = self.table.get(q.id == int(device.id))
-        if existing is None:
-            raise ValueError("Gerät existiert nicht (kann nicht aktualisiert werden).")
+        with table_write(self.table) as write:
+            allocator, index = self._tracked(write)
+            doc_id = index.get(int(device.id))
+            existing = self.table.get(doc_id=doc_id) if doc_id is not None else None
+            if existing is None:
+                raise ValueError("Gerät existiert nicht (kann nicht aktualisiert werden).")
 
-        old = Device.from_dict(existing)
-        device.creation_date = old.creation_date
-        device.last_update = now_utc()
-        self.table.update(device.to_dict(), q.id == int(device.id))
+            old = Device.from_dict(existing)
+            device.creation_date = old.creation_date
+            device.last_update = now_utc()
+            payload = device.to_dict()
+            self.table.update(payload, doc_ids=[doc_id])
+            index.put(doc_id, payload)
+            write.publish(change_feed.UPDATE, [payload])
 
     def upsert(self, device: Device) -> None:
         if self.get(int(device.id)) is None:
@@ -93,39 +253,493 @@ class DeviceRepo:
         else:
             self.update(device)
 
+    def upsert_many(self, devices: Iterable[Device]) -> None:
+        """
+        Bulk-Upsert in einem Schreibvorgang.
+        Es wird erst alles validiert – bei einem Fehler wird nichts geschrieben.
+        """
+        devices = list(devices)
+        for device in devices:
+            device.id = int(device.id)
+            self._validate_id(device.id)
+
+        users = self.user_repo.get_many(d.responsible_user_id for d in devices)
+        if any(d.responsible_user_id not in users for d in devices):
+            raise ValueError("Verantwortliche Person existiert nicht (User zuerst anlegen).")
+
+        with table_write(self.table) as write:
+            allocator, index = self._tracked(write)
+            now = now_utc()
+            updates: dict[int, dict] = {}
+            inserts: dict[int, dict] = {}
+            for device in devices:
+                doc_id = index.get(device.id)
+                device.last_update = now
+                if doc_id is None:
+                    device.creation_date = now
+                    inserts[device.id] = device.to_dict()
+                else:
+                    device.creation_date = self.table.get(doc_id=doc_id)["creation_date"]
+                    updates[doc_id] = device.to_dict()
+
+            doc_ids = self.table.write_many(updates, list(inserts.values()))
+            for doc_id, payload in updates.items():
+                index.put(doc_id, payload)
+            for doc_id, payload in zip(doc_ids, inserts.values()):
+                index.put(doc_id, payload)
+            for device_id in inserts:
+                allocator.allocate(device_id)
+            write.publish(change_feed.UPDATE, updates.values())
+            write.publish(change_feed.INSERT, inserts.values())
+
     def get(self, device_id: int) -> Device | None:
         self._validate_id(int(device_id))
-        q = Query()
-        d = self.table.get(q.id == int(device_id))
+        doc_id = self._index().get(int(device_id))
+        d = self.table.get(doc_id=doc_id) if doc_id is not None else None
         return Device.from_dict(d) if d else None
 
-    def list_all(self) -> list[Device]:
-        return [Device.from_dict(d) for d in self.table.all()]
+    def get_many(self, device_ids: Iterable[int]) -> dict[int, Device]:
+        index = self._index()
+        doc_ids = {index.get(int(device_id)) for device_id in set(device_ids)} - {None}
+        return {int(d["id"]): Device.from_dict(d) for d in _get_docs(self.table, doc_ids)}
+
+    def list_all(self, as_rows: bool = False) -> list[Device] | list[Device.Row]:
+        """as_rows=True: kompakte Tupel (Device.Row) statt Modellobjekten für große Listen."""
+        rows = self.table.raw_rows()
+        if as_rows:
+            return Device.rows_from_dicts(rows)
+        return [Device.from_dict(d) for d in rows]
+
+    def count(self) -> int:
+        return len(self.table)
+
+    def list_page(self, offset: int = 0, limit: int = 50, sort_key: str = "id") -> Page:
+        doc_ids = sorted_doc_ids(self.table, sort_key)
+        rows = _get_docs(self.table, doc_ids[offset:offset + limit])
+        return Page([Device.from_dict(d) for d in rows], len(doc_ids), offset, limit)
+
+    def list_for_user(self, user_id: str) -> list[Device]:
+        """Geräte, für die `user_id` verantwortlich ist (Sekundärindex)."""
+        doc_ids = self._index().lookup("responsible_user_id", user_id)
+        return [Device.from_dict(d) for d in _get_docs(self.table, sorted(doc_ids))]
 
     def delete(self, device_id: int) -> None:
         self._validate_id(int(device_id))
-        q = Query()
-        self.table.remove(q.id == int(device_id))
+        with table_write(self.table) as write:
+            allocator, index = self._tracked(write)
+            doc_id = index.get(int(device_id))
+            if doc_id is None:
+                return
+            self.table.remove(doc_ids=[doc_id])
+            index.discard(doc_id)
+            allocator.release(int(device_id))
+            write.publish_deleted([int(device_id)])
+
+    def delete_many(self, device_ids: Iterable[int]) -> int:
+        """Löscht alle vorhandenen `device_ids` in einem Schreibvorgang, liefert die Anzahl."""
+        device_ids = {int(device_id) for device_id in device_ids}
+        with table_write(self.table) as write:
+            allocator, index = self._tracked(write)
+            doc_ids = {device_id: index.get(device_id) for device_id in device_ids}
+            doc_ids = {device_id: doc_id for device_id, doc_id in doc_ids.items() if doc_id is not None}
+            if not doc_ids:
+                return 0
+            self.table.remove(doc_ids=list(doc_ids.values()))
+            for device_id, doc_id in doc_ids.items():
+                index.discard(doc_id)
+                allocator.release(device_id)
+            write.publish_deleted(doc_ids)
+        return len(doc_ids)
+
+    def reassign_responsible(self, user_ids: Iterable[str], new_user_id: str) -> int:
+        """Verantwortung aller Geräte von `user_ids` an `new_user_id` übertragen (Sekundärindex, ein Schreibvorgang)."""
+        with table_write(self.table) as write:
+            _, index = self._tracked(write)
+            doc_ids = set().union(*(index.lookup("responsible_user_id", user_id) for user_id in set(user_ids)))
+            if not doc_ids:
+                return 0
+            fields = {"responsible_user_id": new_user_id, "last_update": now_utc()}
+            self.table.write_many({doc_id: fields for doc_id in doc_ids})
+            docs = _get_docs(self.table, doc_ids)
+            for d in docs:
+                index.put(d.doc_id, d)
+            write.publish(change_feed.UPDATE, docs)
+        return len(doc_ids)
 
+
+@instrument_methods()
 class ReservationRepo:
+    """
+    Reservierungs-Repo auf TinyDB-Basis.
+      - Overlap-Abfragen laufen über einen Intervall-Index pro Gerät.
+      - Der Index wird bei create()/delete() mitgeführt und neu aufgebaut,
+        sobald sich die Tabelle anderweitig geändert hat.
+      - Serienbuchungen (RecurringReservation) liegen als je ein Datensatz in einer eigenen Tabelle,
+        Hash-Index nach Gerät und Nutzer; Termine erzeugt der ReservationService.
+      - Zeitpartitionen: `table` hält nur aktuelle und künftige Reservierungen, abgelaufene verschiebt
+        archive_before() in eine Archivdatei pro Startjahr (Katalog mit Zeitraum in `archive_table`).
+        Overlap-Abfragen sehen nur `table`; Historie gibt es auf Anfrage (include_archive=True).
+    """
+
     def __init__(self) -> None:
         self.table = get_db().table("reservations")
+        self.series_table = get_db().table(RecurringReservation.table_name)
+        self.archive_table = get_db().table("archive_partitions")
+        self._horizon: tuple[int | None, datetime | None] = (None, None)
+
+    def version(self) -> int:
+        # Summe monotoner Zähler: ändert sich auch, wenn nur Serien oder das Archiv geändert wurden
+        return table_version(self.table) + table_version(self.series_table) + table_version(self.archive_table)
+
+    def unit_of_work(self):
+        return self.table.storage.unit_of_work()
+
+    def device_versions(self, device_ids: Iterable[int]) -> tuple:
+        """Stand der Buchungen auf `device_ids`: ändert sich mit jeder Reservierung darauf, jeder Serie und dem Archiv."""
+        intervals = self._intervals()
+        return (
+            table_version(self.series_table),
+            table_version(self.archive_table),
+            *(intervals.device_version(device_id) for device_id in sorted({int(d) for d in device_ids})),
+        )
+
+    def _intervals(self) -> IntervalIndex:
+        return interval_index(self.table)
+
+    def _index(self) -> TableIndex:
+        return table_index(self.table, "user_id")
+
+    def _tracked(self, write: TableWrite) -> tuple[IntervalIndex, TableIndex]:
+        return write.track(self._intervals()), write.track(self._index())
 
     def create(self, r: Reservation) -> None:
-        r.creation_date = now_utc()
-        r.last_update = now_utc()
-        self.table.insert(r.to_dict())
+        with table_write(self.table) as write:
+            intervals, index = self._tracked(write)
+            r.creation_date = now_utc()
+            r.last_update = now_utc()
+            row = r.to_dict()
+            doc_id = self.table.insert(row)
+            intervals.add(row)
+            index.put(doc_id, row)
+            write.publish(change_feed.INSERT, [row])
+
+    def create_many(self, reservations: Iterable[Reservation]) -> None:
+        """Bulk-Insert in einem Schreibvorgang (keine Konfliktprüfung, siehe ReservationService.create_many)."""
+        with table_write(self.table) as write:
+            intervals, index = self._tracked(write)
+            now = now_utc()
+            rows = []
+            for r in reservations:
+                r.creation_date = now
+                r.last_update = now
+                rows.append(r.to_dict())
+            if not rows:
+                return
+
+            doc_ids = self.table.insert_multiple(rows)
+            for doc_id, row in zip(doc_ids, rows):
+                intervals.add(row)
+                index.put(doc_id, row)
+            write.publish(change_feed.INSERT, rows)
 
     def delete(self, reservation_id: str) -> None:
-        q = Query()
-        self.table.remove(q.id == reservation_id)
+        with table_write(self.table) as write:
+            intervals, index = self._tracked(write)
+            doc_id = index.get(reservation_id)
+            if doc_id is None:
+                return
+            self.table.remove(doc_ids=[doc_id])
+            intervals.remove(reservation_id)
+            index.discard(doc_id)
+            write.publish_deleted([reservation_id])
+
+    def delete_many(self, reservation_ids: Iterable[str]) -> int:
+        """Löscht alle vorhandenen `reservation_ids` (auch archivierte) in einem Schreibvorgang, liefert die Anzahl."""
+        reservation_ids = set(reservation_ids)
+        with table_write(self.table) as write:
+            intervals, index = self._tracked(write)
+            doc_ids = {reservation_id: index.get(reservation_id) for reservation_id in reservation_ids}
+            doc_ids = {reservation_id: doc_id for reservation_id, doc_id in doc_ids.items() if doc_id is not None}
+            if doc_ids:
+                self.table.remove(doc_ids=list(doc_ids.values()))
+                for reservation_id, doc_id in doc_ids.items():
+                    intervals.remove(reservation_id)
+                    index.discard(doc_id)
+                write.publish_deleted(doc_ids)
+            rest = reservation_ids - doc_ids.keys()
+            return len(doc_ids) + (self._archive_delete(rest) if rest else 0)
+
+    def reassign_user(self, user_ids: Iterable[str], new_user_id: str) -> int:
+        """Reservierungen von `user_ids` (auch archivierte) auf `new_user_id` umschreiben (Sekundärindex, ein Schreibvorgang)."""
+        user_ids = set(user_ids)
+        with table_write(self.table) as write:
+            intervals, index = self._tracked(write)
+            doc_ids = set().union(*(index.lookup("user_id", user_id) for user_id in user_ids))
+            if doc_ids:
+                fields = {"user_id": new_user_id, "last_update": now_utc()}
+                self.table.write_many({doc_id: fields for doc_id in doc_ids})
+                docs = _get_docs(self.table, doc_ids)
+                for d in docs:
+                    intervals.remove(d["id"])
+                    intervals.add(d)
+                    index.put(d.doc_id, d)
+                write.publish(change_feed.UPDATE, docs)
+            return len(doc_ids) + self._archive_reassign(user_ids, new_user_id)
+
+    def _series_index(self) -> TableIndex:
+        return table_index(self.series_table, "device_id", "user_id")
+
+    def create_series(self, series: RecurringReservation) -> None:
+        with table_write(self.series_table) as write:
+            index = write.track(self._series_index())
+            series.creation_date = now_utc()
+            series.last_update = now_utc()
+            row = series.to_dict()
+            doc_id = self.series_table.insert(row)
+            index.put(doc_id, row)
+            write.publish(change_feed.INSERT, [row])
+
+    def get_series(self, series_id: str) -> RecurringReservation | None:
+        doc_id = self._series_index().get(series_id)
+        d = self.series_table.get(doc_id=doc_id) if doc_id is not None else None
+        return RecurringReservation.from_dict(d) if d else None
+
+    def series_for_devices(self, device_ids: Iterable[int]) -> dict[int, list[RecurringReservation]]:
+        """Serien pro Gerät (Sekundärindex), nach erstem Termin sortiert."""
+        index = self._series_index()
+        result = {}
+        for device_id in map(int, device_ids):
+            docs = _get_docs(self.series_table, index.lookup("device_id", device_id))
+            result[device_id] = sorted(map(RecurringReservation.from_dict, docs), key=lambda s: s.start_date)
+        return result
+
+    def series_for_user(self, user_id: str) -> list[RecurringReservation]:
+        doc_ids = self._series_index().lookup("user_id", user_id)
+        return [RecurringReservation.from_dict(d) for d in _get_docs(self.series_table, sorted(doc_ids))]
+
+    def list_series(self, as_rows: bool = False) -> list[RecurringReservation] | list[RecurringReservation.Row]:
+        """Alle Serien; as_rows=True: kompakte Tupel (RecurringReservation.Row), z. B. für analytics."""
+        rows = self.series_table.raw_rows()
+        if as_rows:
+            return RecurringReservation.rows_from_dicts(rows)
+        return [RecurringReservation.from_dict(d) for d in rows]
+
+    def delete_series(self, series_ids: Iterable[str]) -> int:
+        """Löscht ganze Serien in einem Schreibvorgang, liefert die Anzahl."""
+        with table_write(self.series_table) as write:
+            index = write.track(self._series_index())
+            doc_ids = {series_id: index.get(series_id) for series_id in set(series_ids)}
+            doc_ids = {series_id: doc_id for series_id, doc_id in doc_ids.items() if doc_id is not None}
+            if not doc_ids:
+                return 0
+            self.series_table.remove(doc_ids=list(doc_ids.values()))
+            for doc_id in doc_ids.values():
+                index.discard(doc_id)
+            write.publish_deleted(doc_ids)
+        return len(doc_ids)
+
+    def reassign_series_user(self, user_ids: Iterable[str], new_user_id: str) -> int:
+        with table_write(self.series_table) as write:
+            index = write.track(self._series_index())
+            doc_ids = set().union(*(index.lookup("user_id", user_id) for user_id in set(user_ids)))
+            if not doc_ids:
+                return 0
+            fields = {"user_id": new_user_id, "last_update": now_utc()}
+            self.series_table.write_many({doc_id: fields for doc_id in doc_ids})
+            docs = _get_docs(self.series_table, doc_ids)
+            for d in docs:
+                index.put(d.doc_id, d)
+            write.publish(change_feed.UPDATE, docs)
+        return len(doc_ids)
 
-    def list_for_device(self, device_id: int) -> list[Reservation]:
-        q = Query()
-        rows = self.table.search(q.device_id == int(device_id))
+    # Archiv: eine Datei pro Startjahr (db.archive_path), geöffnet erst bei Bedarf
+
+    def _partition(self, partition_id: str) -> Table:
+        path = archive_path(partition_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return open_db(path).table("reservations")
+
+    def archived_partitions(self, start: datetime | None = None, end: datetime | None = None) -> list[dict]:
+        """
+        Katalog der Archivpartitionen (id, first_start, last_end, count), nach id sortiert;
+        mit `start`/`end` nur die, deren Zeitraum [start, end) schneidet.
+        """
+        return sorted(
+            (
+                dict(p) for p in self.archive_table.raw_rows()
+                if (start is None or p["last_end"] > start) and (end is None or p["first_start"] < end)
+            ),
+            key=itemgetter("id"),
+        )
+
+    def archived_until(self) -> datetime | None:
+        """Ende der spätesten archivierten Reservierung (None: Archiv leer), gecacht bis zur nächsten Katalogänderung."""
+        version = table_version(self.archive_table)
+        if self._horizon[0] != version:
+            self._horizon = (version, max((p["last_end"] for p in self.archive_table.raw_rows()), default=None))
+        return self._horizon[1]
+
+    def archive_before(self, cutoff: datetime) -> int:
+        """
+        Aufbewahrungs-Job: verschiebt alle Reservierungen, die bis `cutoff` enden, in die Partition
+        ihres Startjahres, liefert die Anzahl. Erst werden die Partitionen geschrieben und geflusht,
+        danach löscht eine eigene Transaktion aus der Haupttabelle. Beide Schritte gehen über die ID:
+        bricht der Job dazwischen ab, überschreibt der nächste Lauf die Kopien im Archiv.
+        """
+        by_partition: dict[str, list] = {}
+        for d in self.table.raw_rows():
+            if d["end_date"] <= cutoff:
+                by_partition.setdefault(f"{d['start_date']:%Y}", []).append(dict(d))
+
+        for partition_id, rows in sorted(by_partition.items()):
+            part = self._partition(partition_id)
+            with table_write(part, ARCHIVE_TABLE) as write:
+                archived = write.track(table_index(part))
+                known = {d["id"]: archived.get(d["id"]) for d in rows}
+                new_rows = [d for d in rows if known[d["id"]] is None]
+                old_rows = {known[d["id"]]: d for d in rows if known[d["id"]] is not None}
+                new_ids = part.write_many(old_rows, new_rows)
+                for doc_id, row in [*old_rows.items(), *zip(new_ids, new_rows)]:
+                    archived.put(doc_id, row)
+                write.publish(change_feed.INSERT, new_rows)
+                write.publish(change_feed.UPDATE, old_rows.values())
+            # nach dem Block: table_write schreibt erst an seinem Ende
+            part.storage.flush()
+            self._update_catalog(partition_id, part, rows)
+
+        # nur unverändert kopierte Zeilen löschen – was sich seither geändert hat, kopiert der nächste Lauf neu
+        copied = {d["id"]: d["last_update"] for rows in by_partition.values() for d in rows}
+        with self.unit_of_work():
+            index = table_index(self.table)
+            current = _get_docs(self.table, filter(None, map(index.get, copied)))
+            return self.delete_many(
+                d["id"] for d in current if d["end_date"] <= cutoff and d["last_update"] == copied[d["id"]]
+            )
+
+    def _update_catalog(self, partition_id: str, part: Table, added: Iterable[dict] = ()) -> None:
+        # Zeitraum wächst nur mit (wie IntervalIndex._max_duration: zu weit ist nur langsamer, nie falsch),
+        # jeder Aufruf schreibt den Eintrag neu und erhöht damit version()
+        with table_write(self.archive_table) as write:
+            index = write.track(table_index(self.archive_table))
+            doc_id = index.get(partition_id)
+            old = self.archive_table.get(doc_id=doc_id) if doc_id is not None else None
+            count = len(part)
+            if not count:
+                if doc_id is not None:
+                    self.archive_table.remove(doc_ids=[doc_id])
+                    index.discard(doc_id)
+            else:
+                added = list(added)
+                entry = {
+                    "id": partition_id,
+                    "first_start": min([d["start_date"] for d in added] + ([old["first_start"]] if old else [])),
+                    "last_end": max([d["end_date"] for d in added] + ([old["last_end"]] if old else [])),
+                    "count": count,
+                }
+                if doc_id is None:
+                    doc_id = self.archive_table.insert(entry)
+                else:
+                    self.archive_table.update(entry, doc_ids=[doc_id])
+                index.put(doc_id, entry)
+
+    def _archive_delete(self, reservation_ids: set[str]) -> int:
+        deleted = 0
+        for p in self.archived_partitions():
+            part = self._partition(p["id"])
+            with table_write(part, ARCHIVE_TABLE) as write:
+                index = write.track(table_index(part))
+                doc_ids = {reservation_id: index.get(reservation_id) for reservation_id in reservation_ids}
+                doc_ids = {reservation_id: doc_id for reservation_id, doc_id in doc_ids.items() if doc_id is not None}
+                if not doc_ids:
+                    continue
+                part.remove(doc_ids=list(doc_ids.values()))
+                for doc_id in doc_ids.values():
+                    index.discard(doc_id)
+                write.publish_deleted(doc_ids)
+            part.storage.flush()
+            deleted += len(doc_ids)
+            self._update_catalog(p["id"], part)
+        return deleted
+
+    def _archive_reassign(self, user_ids: set[str], new_user_id: str) -> int:
+        changed = 0
+        fields = {"user_id": new_user_id, "last_update": now_utc()}
+        for p in self.archived_partitions():
+            part = self._partition(p["id"])
+            with table_write(part, ARCHIVE_TABLE) as write:
+                index = write.track(table_index(part, "user_id"))
+                doc_ids = set().union(*(index.lookup("user_id", user_id) for user_id in user_ids))
+                if not doc_ids:
+                    continue
+                part.write_many({doc_id: fields for doc_id in doc_ids})
+                docs = _get_docs(part, doc_ids)
+                for d in docs:
+                    index.put(d.doc_id, d)
+                write.publish(change_feed.UPDATE, docs)
+            part.storage.flush()
+            changed += len(doc_ids)
+            self._update_catalog(p["id"], part)
+        return changed
+
+    def list_all(self, as_rows: bool = False, include_archive: bool = False) -> list[Reservation] | list[Reservation.Row]:
+        """as_rows=True: kompakte Tupel (Reservation.Row), z. B. für Auswertungen (siehe analytics)."""
+        rows = self.table.raw_rows()
+        if include_archive:
+            rows = chain(rows, *(self._partition(p["id"]).raw_rows() for p in self.archived_partitions()))
+        if as_rows:
+            return Reservation.rows_from_dicts(rows)
         return [Reservation.from_dict(d) for d in rows]
 
+    def _device_rows(self, device_id: int, include_archive: bool) -> list:
+        rows = self._intervals().for_device(int(device_id))
+        if include_archive:
+            archived = [interval_index(self._partition(p["id"])).for_device(int(device_id)) for p in self.archived_partitions()]
+            rows = list(heapq.merge(*archived, rows, key=itemgetter("start_date")))
+        return rows
+
+    def list_for_device(self, device_id: int, include_archive: bool = False) -> list[Reservation]:
+        return [Reservation.from_dict(d) for d in self._device_rows(device_id, include_archive)]
+
+    def list_page_for_device(self, device_id: int, offset: int = 0, limit: int = 50, include_archive: bool = False) -> Page:
+        """Reservierungen eines Geräts seitenweise, nach Startzeit sortiert (Intervall-Index)."""
+        rows = self._device_rows(device_id, include_archive)
+        items = [Reservation.from_dict(d) for d in rows[offset:offset + limit]]
+        return Page(items, len(rows), offset, limit)
+
+    def list_for_user(self, user_id: str, include_archive: bool = False) -> list[Reservation]:
+        """Reservierungen von `user_id` (Sekundärindex)."""
+        doc_ids = self._index().lookup("user_id", user_id)
+        result = [Reservation.from_dict(d) for d in _get_docs(self.table, sorted(doc_ids))]
+        if include_archive:
+            for p in self.archived_partitions():
+                part = self._partition(p["id"])
+                doc_ids = table_index(part, "user_id").lookup("user_id", user_id)
+                result.extend(Reservation.from_dict(d) for d in _get_docs(part, sorted(doc_ids)))
+        return result
+
     def find_overlaps(self, device_id: int, start: datetime, end: datetime) -> list[Reservation]:
-        # TinyDB kann nicht super SQL-mäßig interval overlap -> filtern in Python
-        reservations = self.list_for_device(device_id)
-        return [r for r in reservations if (start < r.end_date and end > r.start_date)]
+        rows = self._intervals().overlapping(int(device_id), start, end)
+        return [Reservation.from_dict(d) for d in rows]
+
+    def find_first_overlap(self, device_id: int, start: datetime, end: datetime) -> Reservation | None:
+        # Für die Konfliktprüfung reicht der erste Treffer
+        d = next(self._intervals().overlapping(int(device_id), start, end), None)
+        return Reservation.from_dict(d) if d else None
+
+    def busy_intervals(self, device_ids: Iterable[int], start: datetime, end: datetime) -> dict[int, list[tuple[datetime, datetime]]]:
+        """Belegte Zeiträume (start, end) im Fenster für mehrere Geräte, pro Gerät nach Start sortiert."""
+        intervals = self._intervals()
+        return {
+            device_id: [(d["start_date"], d["end_date"]) for d in intervals.overlapping(device_id, start, end)]
+            for device_id in map(int, device_ids)
+        }
+
+
+def create_repos(backend: str = DB_BACKEND) -> tuple[UserRepo, DeviceRepo, ReservationRepo]:
+    """Repos für das konfigurierte Backend ("tinydb" oder "sqlite")."""
+    if backend == "tinydb":
+        return UserRepo(), DeviceRepo(), ReservationRepo()
+    if backend == "sqlite":
+        from sqlite_repositories import SqliteDeviceRepo, SqliteReservationRepo, SqliteUserRepo
+        return SqliteUserRepo(), SqliteDeviceRepo(), SqliteReservationRepo()
+    raise ValueError(f"Unbekanntes Datenbank-Backend: {backend}")
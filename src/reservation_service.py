@@ -1,27 +1,136 @@
 from __future__ import annotations
-from datetime import datetime, timezone
-from repositories import UserRepo, DeviceRepo, ReservationRepo
+import heapq
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from enum import Enum
+from itertools import accumulate
+from operator import attrgetter
+from typing import Callable, Iterable, Iterator, TypeVar
+from db import ARCHIVE_AFTER_DAYS
+from devices import Device
+from recurring_reservations import RecurringReservation
+from repositories import create_repos
 from reservations import Reservation
 
+_by_start = attrgetter("start_date")
+
+T = TypeVar("T")
+
 
 class ReservationError(Exception):
     pass
 
+
+class _DeviceLocks:
+    """
+    Ein Lock pro Gerät (prozessweit, alle Sessions teilen sich die Instanz):
+    Overlap-Prüfung und Anlegen laufen pro Gerät atomar, verschiedene Geräte parallel
+    (die Unit of Work umfasst nur das Schreiben, siehe ReservationService._book).
+    """
+
+    def __init__(self, timeout: float = 10.0) -> None:
+        self.timeout = timeout
+        self._guard = threading.Lock()
+        self._locks: dict[int, threading.Lock] = {}
+
+    @contextmanager
+    def hold(self, device_ids: Iterable[int]) -> Iterator[None]:
+        # feste Reihenfolge (aufsteigende ID) verhindert Deadlocks bei mehreren Geräten
+        with self._guard:
+            locks = [self._locks.setdefault(d, threading.Lock()) for d in sorted(set(device_ids))]
+        acquired: list[threading.Lock] = []
+        try:
+            for lock in locks:
+                if not lock.acquire(timeout=self.timeout):
+                    raise ReservationError("Gerät wird gerade von einer anderen Buchung bearbeitet. Bitte erneut versuchen.")
+                acquired.append(lock)
+            yield
+        finally:
+            for lock in reversed(acquired):
+                lock.release()
+
+
+_device_locks = _DeviceLocks()
+
+
+@dataclass
+class BookingResult:
+    """Ergebnis eines Eintrags aus create_many (index = Position in der Eingabe)."""
+    index: int
+    reservation: Reservation | None = None
+    error: str | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class DeleteMode(str, Enum):
+    RESTRICT = "restrict"   # abbrechen, solange Geräte/Reservierungen darauf verweisen
+    CASCADE = "cascade"     # abhängige Geräte und Reservierungen mitlöschen
+    REASSIGN = "reassign"   # Verweise auf einen anderen Nutzer umhängen (nur beim Löschen von Nutzern)
+
+
+@dataclass
+class DeleteResult:
+    """Anzahl gelöschter bzw. umgehängter Zeilen pro Tabelle (Serienbuchungen zählen als Reservierungen)."""
+    users: int = 0
+    devices: int = 0
+    reservations: int = 0
+    reassigned_devices: int = 0
+    reassigned_reservations: int = 0
+
+
 class ReservationService:
-    def __init__(self) -> None:
-        self.user_repo = UserRepo()
-        self.device_repo = DeviceRepo()
-        self.res_repo = ReservationRepo()
+    def __init__(self, repos: tuple | None = None) -> None:
+        # repos: (user_repo, device_repo, res_repo), z. B. die geteilten aus cached_reads.repos()
+        self.user_repo, self.device_repo, self.res_repo = repos or create_repos()
 
     @staticmethod
-    def _overlaps(
-        a_start: datetime,
-        a_end: datetime,
-        b_start: datetime,
-        b_end: datetime,
-    ) -> bool:
-        # Overlap, wenn sich die Intervalle schneiden
-        return a_start < b_end and a_end > b_start
+    def _device_error(device: Device | None) -> str | None:
+        if device is None:
+            return "Gerät existiert nicht."
+        if not device.is_active:
+            return "Gerät ist nicht aktiv."
+        if (
+            device.end_of_life is not None
+            and device.end_of_life < datetime.now(timezone.utc)
+        ):
+            return "Gerät ist End-of-Life und nicht mehr reservierbar."
+        return None
+
+    def _archive_error(self, start: datetime, horizon: datetime | None) -> str | None:
+        # Overlap-Prüfungen sehen nur die aktuelle Partition: vor dem Archivstand darf nichts beginnen
+        if horizon is not None and start < horizon:
+            return f"Zeitraum bis {horizon:%d.%m.%Y %H:%M} ist archiviert."
+        return None
+
+    def _book(self, device_ids: Iterable[int], check: Callable[[], T], write: Callable[[T], None]) -> T:
+        """
+        Prüfen und Anlegen von Buchungen auf `device_ids`:
+          - `check()` läuft nur unter den Geräte-Locks, Buchungen auf anderen Geräten laufen parallel
+          - die Unit of Work (global: Storage-Lock bzw. BEGIN IMMEDIATE) umfasst nur den Abgleich des
+            Datenstands und `write()`; hat sich seit der Prüfung etwas geändert (anderer Prozess,
+            Schreiben ohne Geräte-Lock), läuft `check()` darin noch einmal
+        Liefert das Ergebnis von `check()`.
+        """
+        device_ids = sorted(set(device_ids))
+
+        def state() -> tuple:
+            # Nutzer und Geräte als ganze Tabelle (selten geändert), Buchungen pro Gerät
+            return self.user_repo.version(), self.device_repo.version(), self.res_repo.device_versions(device_ids)
+
+        with _device_locks.hold(device_ids):
+            before = state()
+            result = check()
+            with self.res_repo.unit_of_work():
+                if state() != before:
+                    result = check()
+                write(result)
+        return result
 
     def create(
         self,
@@ -34,36 +143,349 @@ class ReservationService:
         if start >= end:
             raise ReservationError("Start muss vor Ende liegen.")
 
-        user = self.user_repo.get(user_id)
-        if user is None:
-            raise ReservationError("User existiert nicht.")
+        res = Reservation(
+            user_id=user_id,
+            device_id=int(device_id),
+            start_date=start,
+            end_date=end,
+        )
 
-        device = self.device_repo.get(int(device_id))
-        if device is None:
-            raise ReservationError("Gerät existiert nicht.")
-        if not device.is_active:
-            raise ReservationError("Gerät ist nicht aktiv.")
-        if (
-            device.end_of_life is not None
-            and device.end_of_life < datetime.now(timezone.utc)
-        ):
-            raise ReservationError("Gerät ist End-of-Life und nicht mehr reservierbar.")
+        def check() -> None:
+            if self.user_repo.get(user_id) is None:
+                raise ReservationError("User existiert nicht.")
+            error = self._device_error(self.device_repo.get(res.device_id)) or self._archive_error(
+                start, self.res_repo.archived_until()
+            )
+            if error:
+                raise ReservationError(error)
+
+            r = self.res_repo.find_first_overlap(res.device_id, start, end)
+            if r is None:
+                r = next(self._series_busy(res.device_id, start, end), None)
+            if r is not None:
+                raise ReservationError(
+                    f"Überschneidung mit Reservierung {r.id}: {r.start_date} – {r.end_date}"
+                )
+
+        self._book([res.device_id], check, lambda _: self.res_repo.create(res))
+        return res
+
+    def create_many(
+        self,
+        items: Iterable[tuple[str, int, datetime, datetime]],
+    ) -> list[BookingResult]:
+        """
+        Bulk-Reservierung für (user_id, device_id, start, end)-Einträge.
+          - User/Geräte werden in einem Durchgang geladen und geprüft.
+          - Konflikte mit bestehenden Reservierungen und innerhalb des Imports
+            werden pro Gerät per Sort-and-Sweep erkannt (bei Konflikten im Import
+            gewinnt der früher beginnende Eintrag).
+          - Alle gültigen Einträge werden mit einem Schreibvorgang angelegt; die betroffenen Geräte
+            sind dabei gesperrt, die Unit of Work umfasst nur das Schreiben (siehe _book).
+        Liefert pro Eintrag ein BookingResult in Eingabereihenfolge.
+        """
+        items = [(user_id, int(device_id), start, end) for user_id, device_id, start, end in items]
+
+        def check() -> list[BookingResult]:
+            results = [BookingResult(index=i) for i in range(len(items))]
+            users = self.user_repo.get_many(user_id for user_id, _, _, _ in items)
+            devices = self.device_repo.get_many(device_id for _, device_id, _, _ in items)
+            horizon = self.res_repo.archived_until()
+
+            by_device: dict[int, list[int]] = {}
+            for i, (user_id, device_id, start, end) in enumerate(items):
+                if start >= end:
+                    results[i].error = "Start muss vor Ende liegen."
+                elif user_id not in users:
+                    results[i].error = "User existiert nicht."
+                else:
+                    results[i].error = self._device_error(devices.get(device_id)) or self._archive_error(start, horizon)
+                if results[i].ok:
+                    by_device.setdefault(device_id, []).append(i)
 
-        overlaps = self.res_repo.find_overlaps(int(device_id), start, end)
-        if overlaps:
-            r = overlaps[0]
-            raise ReservationError(
-                f"Überschneidung mit Reservierung {r.id}: {r.start_date} – {r.end_date}"
+            for device_id, candidates in by_device.items():
+                self._sweep_device(device_id, items, candidates, results)
+            return results
+
+        def write(results: list[BookingResult]) -> None:
+            self.res_repo.create_many([r.reservation for r in results if r.reservation is not None])
+
+        return self._book((device_id for _, device_id, _, _ in items), check, write)
+
+    def _sweep_device(
+        self,
+        device_id: int,
+        items: list[tuple[str, int, datetime, datetime]],
+        candidates: list[int],
+        results: list[BookingResult],
+    ) -> None:
+        # 1) gegen bestehende Reservierungen: eine Bereichsabfrage für den ganzen Import,
+        #    dann pro Eintrag bisect + Präfix-Maximum der Endzeiten
+        window_start = min(items[i][2] for i in candidates)
+        window_end = max(items[i][3] for i in candidates)
+        stored = list(self._busy(device_id, window_start, window_end))
+        stored_starts = [r.start_date for r in stored]
+        max_end = list(accumulate((r.end_date for r in stored), max))
+
+        free: list[int] = []
+        for i in candidates:
+            _, _, start, end = items[i]
+            k = bisect_left(stored_starts, end)
+            if k and max_end[k - 1] > start:
+                r = next(stored[j] for j in range(k) if stored[j].end_date > start)
+                results[i].error = f"Überschneidung mit Reservierung {r.id}: {r.start_date} – {r.end_date}"
+            else:
+                free.append(i)
+
+        # 2) innerhalb des Imports: nach Start sortieren, Ende des letzten angenommenen Eintrags merken
+        free.sort(key=lambda i: items[i][2])
+        last: int | None = None
+        for i in free:
+            user_id, _, start, end = items[i]
+            if last is not None and start < items[last][3]:
+                results[i].error = f"Überschneidung mit Eintrag {last} im Import."
+                continue
+            results[i].reservation = Reservation(
+                user_id=user_id,
+                device_id=device_id,
+                start_date=start,
+                end_date=end,
             )
+            last = i
 
-        res = Reservation(
+    def find_available_devices(self, start: datetime, end: datetime) -> list[Device]:
+        """
+        Alle reservierbaren Geräte (aktiv, nicht EOL), die im Zeitraum [start, end) frei sind.
+        Belegungen werden für alle Geräte in einem Durchgang geladen (busy_intervals).
+        """
+        if start >= end:
+            raise ReservationError("Start muss vor Ende liegen.")
+
+        devices = [d for d in self.device_repo.list_all() if self._device_error(d) is None]
+        busy = self._busy_intervals((int(d.id) for d in devices), start, end)
+        return sorted((d for d in devices if not busy[int(d.id)]), key=lambda d: int(d.id))
+
+    def find_free_slots(
+        self,
+        device_id: int,
+        window: tuple[datetime, datetime],
+        min_duration: timedelta = timedelta(0),
+    ) -> list[tuple[datetime, datetime]]:
+        """
+        Freie Zeitfenster eines Geräts innerhalb von `window` (start, end), jeweils mindestens
+        `min_duration` lang. Ein Sweep über die nach Start sortierten Belegungen.
+        """
+        window_start, window_end = window
+        if window_start >= window_end:
+            raise ReservationError("Start muss vor Ende liegen.")
+
+        device_error = self._device_error(self.device_repo.get(int(device_id)))
+        if device_error:
+            raise ReservationError(device_error)
+
+        busy = self._busy_intervals([int(device_id)], window_start, window_end)[int(device_id)]
+        slots: list[tuple[datetime, datetime]] = []
+        cursor = window_start
+        for busy_start, busy_end in busy:
+            if busy_start > cursor and busy_start - cursor >= min_duration:
+                slots.append((cursor, busy_start))
+            cursor = max(cursor, busy_end)
+        if window_end > cursor and window_end - cursor >= min_duration:
+            slots.append((cursor, window_end))
+        return slots
+
+    def _series_busy(self, device_id: int, start: datetime, end: datetime) -> Iterator[Reservation]:
+        # Serientermine des Geräts in [start, end), nach Start sortiert (lazy)
+        series = self.res_repo.series_for_devices([device_id])[int(device_id)]
+        return heapq.merge(*(s.occurrences(start, end) for s in series), key=_by_start)
+
+    def _busy(self, device_id: int, start: datetime, end: datetime) -> Iterator[Reservation]:
+        """Einzelbuchungen und Serientermine, die [start, end) schneiden, nach Start sortiert."""
+        return heapq.merge(
+            self.res_repo.find_overlaps(device_id, start, end), self._series_busy(device_id, start, end), key=_by_start
+        )
+
+    def _busy_intervals(self, device_ids: Iterable[int], start: datetime, end: datetime) -> dict[int, list[tuple[datetime, datetime]]]:
+        # wie res_repo.busy_intervals, zusätzlich die Serientermine im Fenster
+        device_ids = [int(d) for d in device_ids]
+        busy = self.res_repo.busy_intervals(device_ids, start, end)
+        for device_id, series in self.res_repo.series_for_devices(device_ids).items():
+            if series:
+                occurrences = ([(o.start_date, o.end_date) for o in s.occurrences(start, end)] for s in series)
+                busy[device_id] = list(heapq.merge(busy[device_id], *occurrences))
+        return busy
+
+    def list_for_device_window(self, device_id: int, start: datetime, end: datetime) -> list[Reservation]:
+        """Buchungen eines Geräts in [start, end): Serien liefern nur ihre Termine im Fenster."""
+        if start >= end:
+            raise ReservationError("Start muss vor Ende liegen.")
+        return list(self._busy(int(device_id), start, end))
+
+    def series_conflicts(self, series: RecurringReservation) -> list[tuple[Reservation, Reservation]]:
+        """
+        Termine der Serie, die mit bestehenden Buchungen kollidieren: (Termin, blockierende Buchung).
+        Ein Merge-Durchlauf: Termine und Belegungen im Zeitraum der Serie (eine Bereichsabfrage
+        plus Termine anderer Serien) kommen beide nach Start sortiert; dazu das größte bisher
+        gesehene Belegungsende – Endzeiten der Termine steigen, also genügt ein Durchgang.
+        """
+        busy = self._busy(series.device_id, series.start_date, series.last_end)
+        pending = next(busy, None)
+        blocker: Reservation | None = None
+        conflicts = []
+        for occurrence in series.occurrences():
+            while pending is not None and pending.start_date < occurrence.end_date:
+                if blocker is None or pending.end_date > blocker.end_date:
+                    blocker = pending
+                pending = next(busy, None)
+            if blocker is not None and blocker.end_date > occurrence.start_date:
+                conflicts.append((occurrence, blocker))
+        return conflicts
+
+    def create_series(
+        self,
+        user_id: str,
+        device_id: int,
+        start: datetime,
+        end: datetime,
+        frequency: str = "weekly",
+        interval: int = 1,
+        until: datetime | None = None,
+        count: int | None = None,
+    ) -> RecurringReservation:
+        """
+        Serienbuchung (täglich/wöchentlich, bis `until` oder `count` Termine) als ein Datensatz.
+        Kollidiert ein Termin mit einer bestehenden Buchung, wird nichts angelegt.
+        """
+        series = RecurringReservation(
             user_id=user_id,
             device_id=int(device_id),
             start_date=start,
             end_date=end,
+            frequency=frequency,
+            interval=interval,
+            until=until,
+            count=count,
         )
-        self.res_repo.create(res)
-        return res
+        try:
+            series.validate()
+        except ValueError as e:
+            raise ReservationError(str(e))
+
+        def check() -> None:
+            if self.user_repo.get(user_id) is None:
+                raise ReservationError("User existiert nicht.")
+            error = self._device_error(self.device_repo.get(series.device_id)) or self._archive_error(
+                series.start_date, self.res_repo.archived_until()
+            )
+            if error:
+                raise ReservationError(error)
+
+            conflicts = self.series_conflicts(series)
+            if conflicts:
+                dates = ", ".join(f"{o.start_date:%d.%m.%Y %H:%M}" for o, _ in conflicts[:3])
+                more = f" (und {len(conflicts) - 3} weitere)" if len(conflicts) > 3 else ""
+                raise ReservationError(f"{len(conflicts)} Termin(e) der Serie überschneiden sich mit Buchungen: {dates}{more}")
+
+        self._book([series.device_id], check, lambda _: self.res_repo.create_series(series))
+        return series
+
+    def archive_past(self, before: datetime | None = None) -> int:
+        """
+        Aufbewahrungs-Job: Reservierungen, die vor `before` enden (Standard: vor ARCHIVE_AFTER_DAYS Tagen),
+        in die Archivpartitionen verschieben. Liefert die Anzahl.
+        """
+        if before is None:
+            before = datetime.now(timezone.utc) - timedelta(days=ARCHIVE_AFTER_DAYS)
+        return self.res_repo.archive_before(before)
 
     def cancel(self, reservation_id: str) -> None:
-        self.res_repo.delete(reservation_id)
\ No newline at end of file
+        # delete_many findet auch archivierte Reservierungen
+        self.res_repo.delete_many([reservation_id])
+
+    def cancel_series(self, series_id: str) -> None:
+        self.res_repo.delete_series([series_id])
+
+    def delete_users(
+        self,
+        user_ids: Iterable[str],
+        mode: DeleteMode | str = DeleteMode.RESTRICT,
+        reassign_to: str | None = None,
+    ) -> DeleteResult:
+        """
+        Nutzer löschen, ohne verwaiste Geräte (responsible_user_id) oder Reservierungen/Serien (user_id)
+        zu hinterlassen:
+          - RESTRICT: Fehler, solange noch Geräte oder Reservierungen auf die Nutzer verweisen.
+          - CASCADE: deren Geräte (samt aller Reservierungen darauf) und Reservierungen mitlöschen.
+          - REASSIGN: Geräte und Reservierungen an `reassign_to` übertragen.
+        Betroffene Zeilen kommen aus den Rückwärtsindizes (O(k)), geschrieben wird in einer Unit of Work.
+        Archivierte Reservierungen zählen mit (TinyDB: Archivdateien liegen außerhalb der Unit of Work).
+        """
+        user_ids = set(user_ids)
+        mode = DeleteMode(mode)
+        if mode is DeleteMode.REASSIGN:
+            if reassign_to is None or reassign_to in user_ids:
+                raise ReservationError("Bitte einen anderen Nutzer wählen, der Geräte und Reservierungen übernimmt.")
+            if self.user_repo.get(reassign_to) is None:
+                raise ReservationError("Nutzer für die Übernahme existiert nicht.")
+
+        result = DeleteResult()
+        device_ids = {int(d.id) for user_id in user_ids for d in self.device_repo.list_for_user(user_id)}
+        # Geräte-Locks vor der Unit of Work (gleiche Reihenfolge wie create): keine Buchung auf ein Gerät im Löschen
+        with _device_locks.hold(device_ids), self.user_repo.unit_of_work():
+            devices = [d for user_id in user_ids for d in self.device_repo.list_for_user(user_id)]
+            reservations = {
+                r.id for user_id in user_ids for r in self.res_repo.list_for_user(user_id, include_archive=True)
+            }
+            series = {s.id for user_id in user_ids for s in self.res_repo.series_for_user(user_id)}
+
+            if mode is DeleteMode.RESTRICT and (devices or reservations or series):
+                raise ReservationError(
+                    f"Noch {len(devices)} Gerät(e), {len(reservations)} Reservierung(en) und {len(series)} Serie(n) "
+                    "verweisen auf den Nutzer. Zuerst übertragen oder mitlöschen."
+                )
+            if mode is DeleteMode.CASCADE:
+                device_ids = [int(d.id) for d in devices]
+                for device_id in device_ids:
+                    reservations.update(r.id for r in self.res_repo.list_for_device(device_id, include_archive=True))
+                for device_series in self.res_repo.series_for_devices(device_ids).values():
+                    series.update(s.id for s in device_series)
+                result.reservations = self.res_repo.delete_many(reservations) + self.res_repo.delete_series(series)
+                result.devices = self.device_repo.delete_many(device_ids)
+            elif mode is DeleteMode.REASSIGN:
+                result.reassigned_devices = self.device_repo.reassign_responsible(user_ids, reassign_to)
+                result.reassigned_reservations = (
+                    self.res_repo.reassign_user(user_ids, reassign_to)
+                    + self.res_repo.reassign_series_user(user_ids, reassign_to)
+                )
+            result.users = self.user_repo.delete_many(user_ids)
+        return result
+
+    def delete_devices(self, device_ids: Iterable[int], mode: DeleteMode | str = DeleteMode.RESTRICT) -> DeleteResult:
+        """
+        Geräte löschen: RESTRICT bricht ab, solange Reservierungen darauf bestehen,
+        CASCADE löscht sie mit (Intervall-Index pro Gerät, ein Schreibvorgang).
+        """
+        device_ids = {int(device_id) for device_id in device_ids}
+        mode = DeleteMode(mode)
+        if mode is DeleteMode.REASSIGN:
+            raise ReservationError("Geräte können nur mit „restrict“ oder „cascade“ gelöscht werden.")
+
+        result = DeleteResult()
+        with _device_locks.hold(device_ids), self.device_repo.unit_of_work():
+            reservations = {
+                r.id for device_id in device_ids for r in self.res_repo.list_for_device(device_id, include_archive=True)
+            }
+            series = {s.id for device_series in self.res_repo.series_for_devices(device_ids).values() for s in device_series}
+            if (reservations or series) and mode is DeleteMode.RESTRICT:
+                raise ReservationError(
+                    f"Auf den Geräten bestehen noch {len(reservations)} Reservierung(en) und {len(series)} Serie(n). "
+                    "Zuerst stornieren oder mitlöschen."
+                )
+            result.reservations = self.res_repo.delete_many(reservations) + self.res_repo.delete_series(series)
+            result.devices = self.device_repo.delete_many(device_ids)
+        return result
+
+
+if __name__ == "__main__":
+    # Aufbewahrungs-Job von Hand oder per cron: python src/reservation_service.py
+    print(f"{ReservationService().archive_past()} Reservierung(en) archiviert.")
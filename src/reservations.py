@@ -1,4 +1,5 @@
 from __future__ import annotations
+from collections import namedtuple
 from datetime import datetime
 from typing import Any, Dict
 from uuid import uuid4
@@ -6,7 +7,11 @@ from serializable import Serializable
 
 
 class Reservation(Serializable):
+    __slots__ = ("user_id", "device_id", "start_date", "end_date")
+
     table_name = "reservations"
+    fields = ("id", "user_id", "device_id", "start_date", "end_date", "creation_date", "last_update")
+    Row = namedtuple("ReservationRow", fields)
 
     def __init__(
         self,
@@ -35,13 +40,11 @@ class Reservation(Serializable):
 
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> "Reservation":
-        obj = cls(
-            id=data.get("id"),
-            user_id=data["user_id"],
-            device_id=int(data["device_id"]),
-            start_date=data["start_date"],
-            end_date=data["end_date"],
-        )
-        obj.creation_date = data.get("creation_date", datetime.now())
-        obj.last_update = data.get("last_update", datetime.now())
-        return obj
\ No newline at end of file
+        obj = cls.__new__(cls)
+        obj.id = data.get("id") or str(uuid4())
+        obj.user_id = data["user_id"]
+        obj.device_id = int(data["device_id"])
+        obj.start_date = data["start_date"]
+        obj.end_date = data["end_date"]
+        obj._set_timestamps(data)
+        return obj
@@ -1,23 +1,80 @@
 # src/serializable.py
 from __future__ import annotations
 
+import operator
 from abc import ABC, abstractmethod
+from bisect import bisect_left, bisect_right
 from datetime import datetime
-from typing import Any, ClassVar, Dict, List, Optional, Type, TypeVar
+from typing import Any, ClassVar, Dict, Iterable, Iterator, List, Mapping, NamedTuple, Optional, Set, Tuple, Type, TypeVar
 
-from tinydb import Query
+import change_feed
 from db import DatabaseConnector  # <-- wichtig: ohne src.
+from indexes import sorted_doc_ids, table_index, table_write
+from instrumentation import count, timed
 
 T = TypeVar("T", bound="Serializable")
 
+# Vergleiche für query(): Suffix am Attributnamen, ohne Suffix Gleichheit
+_COMPARISONS = {
+    "eq": operator.eq,
+    "ne": operator.ne,
+    "lt": operator.lt,
+    "lte": operator.le,
+    "gt": operator.gt,
+    "gte": operator.ge,
+    "in": lambda value, options: value in options,
+}
+_RANGES = ("lt", "lte", "gt", "gte")
+
+Predicate = Tuple[str, str, Any]
+
+
+def _matches(row: Mapping[str, Any], predicates: List[Predicate]) -> bool:
+    for attribute, op, expected in predicates:
+        value = row.get(attribute)
+        # fehlende Werte liegen in keinem Bereich (und vergleichen nicht mit datetime)
+        if value is None and op in _RANGES:
+            return False
+        if not _COMPARISONS[op](value, expected):
+            return False
+    return True
+
+
+def _sort_key(value: Any) -> tuple:
+    # wie sorted_doc_ids(): fehlende Werte zuletzt
+    return (value is None, value)
+
 
 class Serializable(ABC):
+    """
+    Basisklasse der Modelle (User, Device, Reservation, RecurringReservation).
+      - __slots__ statt __dict__: deutlich weniger Speicher pro Objekt.
+      - from_dict() der Subklassen umgeht __init__ (kein datetime.now()/uuid4() auf Vorrat).
+      - `fields`/`Row`: kompakte Tupel-Form für große Listen (siehe rows_from_dicts).
+    """
+    __slots__ = ("id", "creation_date", "last_update")
+
     table_name: ClassVar[str] = ""
+    fields: ClassVar[tuple[str, ...]] = ()
+    Row: ClassVar[Type[NamedTuple]]
 
     def __init__(self, id: str):
         self.id = id
-        self.creation_date = datetime.now()
-        self.last_update = datetime.now()
+        now = datetime.now()
+        self.creation_date = now
+        self.last_update = now
+
+    def _set_timestamps(self, data: Mapping[str, Any]) -> None:
+        # Fallback nur, wenn das Feld fehlt
+        self.creation_date = data["creation_date"] if "creation_date" in data else datetime.now()
+        self.last_update = data["last_update"] if "last_update" in data else datetime.now()
+
+    @classmethod
+    def rows_from_dicts(cls, rows: Iterable[Mapping[str, Any]]) -> list:
+        """Bulk-Form: ein `Row`-Tupel pro Datensatz (Spalten wie `fields`), ohne Modellobjekte."""
+        make = cls.Row._make
+        fields = cls.fields
+        return [make(map(row.get, fields)) for row in rows]
 
     @classmethod
     def _table(cls):
@@ -34,34 +91,161 @@ class Serializable(ABC):
     def from_dict(cls: Type[T], data: Dict[str, Any]) -> T:
         ...
 
+    @timed("Serializable.store_data")
     def store_data(self) -> None:
         self.last_update = datetime.now()
         table = self._table()
-        q = Query()
-        existing = table.search(q.id == self.id)
+        with table_write(table) as write:
+            index = write.track(table_index(table))
 
-        payload = self.to_dict()
+            payload = self.to_dict()
+            doc_id = index.get(payload["id"])
 
-        if existing:
-            table.update(payload, doc_ids=[existing[0].doc_id])
-        else:
-            table.insert(payload)
+            if doc_id is not None:
+                table.update(payload, doc_ids=[doc_id])
+                write.publish(change_feed.UPDATE, [payload])
+            else:
+                doc_id = table.insert(payload)
+                write.publish(change_feed.INSERT, [payload])
+            index.put(doc_id, payload)
 
+    @timed("Serializable.delete")
     def delete(self) -> None:
         table = self._table()
-        q = Query()
-        table.remove(q.id == self.id)
+        with table_write(table) as write:
+            index = write.track(table_index(table))
+            key = self.to_dict()["id"]
+            doc_id = index.get(key)
+            if doc_id is None:
+                return
+            table.remove(doc_ids=[doc_id])
+            index.discard(doc_id)
+            write.publish_deleted([key])
 
     @classmethod
-    def find_by_attribute(cls: Type[T], attribute: str, value: Any) -> Optional[T]:
+    def query(
+        cls: Type[T],
+        order_by: Optional[str] = None,
+        descending: bool = False,
+        limit: Optional[int] = None,
+        **conditions: Any,
+    ) -> Iterator[T]:
+        """
+        Lazy Abfrage, alle Bedingungen gelten zusammen (UND), z. B.
+            Reservation.query(device_id=3, start_date__gte=t0, start_date__lt=t1, order_by="start_date", limit=10)
+        Vergleich per Suffix: __ne, __lt, __lte, __gt, __gte, __in (ohne Suffix: Gleichheit).
+          - Gleichheit/__in auf `id` oder einem Sekundärindex: nur diese Kandidaten statt Scan
+          - order_by: sortierte doc_ids (gecacht), Bereich auf demselben Attribut per Binärsuche
+          - sonst ein Durchlauf, der nach `limit` Treffern aufhört
+        Objekte entstehen erst beim Iterieren.
+        """
+        predicates: List[Predicate] = []
+        for key, value in conditions.items():
+            attribute, _, op = key.partition("__")
+            op = op or "eq"
+            if op not in _COMPARISONS:
+                allowed = ", ".join(f"__{name}" for name in _COMPARISONS if name != "eq")
+                raise ValueError(f"Unbekannter Vergleich __{op} (erlaubt: {allowed}).")
+            cls._check_attribute(attribute)
+            predicates.append((attribute, op, set(value) if op == "in" else value))
+        if order_by is not None:
+            cls._check_attribute(order_by)
+        if limit is not None and limit < 0:
+            raise ValueError("limit darf nicht negativ sein.")
+
+        # Prüfungen oben sofort, Lesen erst beim ersten next()
+        return cls._run_query(predicates, order_by, descending, limit)
+
+    @classmethod
+    def _check_attribute(cls, attribute: str) -> None:
+        if cls.fields and attribute not in cls.fields:
+            raise ValueError(f"{cls.__name__} hat kein Attribut '{attribute}'.")
+
+    @classmethod
+    def _run_query(
+        cls: Type[T],
+        predicates: List[Predicate],
+        order_by: Optional[str],
+        descending: bool,
+        limit: Optional[int],
+    ) -> Iterator[T]:
+        if limit == 0:
+            return
         table = cls._table()
-        q = Query()
-        result = table.search(getattr(q, attribute) == value)
-        if not result:
+        candidates = cls._indexed_candidates(table, predicates)
+        ordered = sorted_doc_ids(table, order_by) if candidates is None and order_by is not None else []
+        raw = table.raw_table()
+
+        if candidates is not None:
+            rows: Iterable[Mapping[str, Any]] = (raw[key] for key in map(str, sorted(candidates)) if key in raw)
+            if order_by is not None:
+                # Kandidaten aus dem Index sind wenige: hier direkt sortieren
+                rows = sorted(rows, key=lambda row: _sort_key(row.get(order_by)), reverse=descending)
+        elif order_by is not None:
+            lo, hi = _bisect(ordered, raw, order_by, predicates)
+            doc_ids = ordered[lo:hi]
+            rows = (raw[key] for key in map(str, reversed(doc_ids) if descending else doc_ids) if key in raw)
+        else:
+            count("table.scan")
+            rows = raw.values()
+
+        found = 0
+        for row in rows:
+            if _matches(row, predicates):
+                yield cls.from_dict(row)
+                found += 1
+                if found == limit:
+                    return
+
+    @classmethod
+    def _indexed_candidates(cls, table, predicates: List[Predicate]) -> Optional[Set[int]]:
+        """doc_ids laut kleinstem passenden Index (id oder Sekundärindex), None: kein Index anwendbar."""
+        index = table_index(table)
+        best: Optional[Set[int]] = None
+        for attribute, op, value in predicates:
+            if op not in ("eq", "in"):
+                continue
+            values = value if op == "in" else (value,)
+            if attribute == "id":
+                doc_ids = {doc_id for doc_id in map(index.get, values) if doc_id is not None}
+            elif attribute in index.secondary:
+                doc_ids = set().union(*(index.lookup(attribute, v) for v in values))
+            else:
+                continue
+            if best is None or len(doc_ids) < len(best):
+                best = doc_ids
+        return best
+
+    @classmethod
+    @timed("Serializable.find_by_attribute")
+    def find_by_attribute(cls: Type[T], attribute: str, value: Any) -> Optional[T]:
+        # query() hört beim ersten Treffer auf (id/Sekundärindex ohne Scan);
+        # unbekanntes Attribut: kein Treffer wie bisher, query() würde ValueError werfen
+        if cls.fields and attribute not in cls.fields:
             return None
-        return cls.from_dict(result[0])
+        return next(cls.query(limit=1, **{attribute: value}), None)
 
     @classmethod
+    @timed("Serializable.find_all")
     def find_all(cls: Type[T]) -> List[T]:
         table = cls._table()
         return [cls.from_dict(row) for row in table.all()]
+
+
+def _bisect(doc_ids: List[int], raw: Mapping[str, Mapping[str, Any]], attribute: str, predicates: List[Predicate]) -> Tuple[int, int]:
+    """Bereich [lo, hi) in den nach `attribute` sortierten doc_ids, der die Bedingungen auf `attribute` erfüllen kann."""
+    def key(doc_id: int) -> tuple:
+        row = raw.get(str(doc_id))
+        return _sort_key(row.get(attribute) if row is not None else None)
+
+    lo, hi = 0, len(doc_ids)
+    for name, op, value in predicates:
+        if name != attribute or value is None or op not in ("eq",) + _RANGES:
+            continue
+        if op in ("gt", "gte", "eq"):
+            find = bisect_right if op == "gt" else bisect_left
+            lo = max(lo, find(doc_ids, (False, value), lo, hi, key=key))
+        if op in ("lt", "lte", "eq"):
+            find = bisect_left if op == "lt" else bisect_right
+            hi = min(hi, find(doc_ids, (False, value), lo, hi, key=key))
+    return lo, max(lo, hi)
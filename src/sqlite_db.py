@@ -0,0 +1,294 @@
+# src/sqlite_db.py
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Iterator, Optional
+
+import change_feed
+from db import DB_FILE, archive_path, open_db
+
+
+SQLITE_FILE = os.environ.get("DB_SQLITE_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "database.sqlite3"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id            TEXT PRIMARY KEY,
+    name          TEXT NOT NULL,
+    creation_date TEXT,
+    last_update   TEXT
+);
+
+CREATE TABLE IF NOT EXISTS devices (
+    id                  INTEGER PRIMARY KEY,
+    name                TEXT NOT NULL,
+    responsible_user_id TEXT NOT NULL,
+    is_active           INTEGER NOT NULL DEFAULT 1,
+    end_of_life         TEXT,
+    creation_date       TEXT,
+    last_update         TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_devices_responsible ON devices (responsible_user_id);
+
+CREATE TABLE IF NOT EXISTS reservations (
+    id            TEXT PRIMARY KEY,
+    user_id       TEXT NOT NULL,
+    device_id     INTEGER NOT NULL,
+    start_date    TEXT NOT NULL,
+    end_date      TEXT NOT NULL,
+    creation_date TEXT,
+    last_update   TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_reservations_device_time ON reservations (device_id, start_date, end_date);
+CREATE INDEX IF NOT EXISTS idx_reservations_user ON reservations (user_id);
+
+-- Serienbuchungen: ein Datensatz pro Serie, Termine werden nicht gespeichert
+CREATE TABLE IF NOT EXISTS recurring_reservations (
+    id            TEXT PRIMARY KEY,
+    user_id       TEXT NOT NULL,
+    device_id     INTEGER NOT NULL,
+    start_date    TEXT NOT NULL,
+    end_date      TEXT NOT NULL,
+    frequency     TEXT NOT NULL,
+    interval      INTEGER NOT NULL DEFAULT 1,
+    until         TEXT,
+    count         INTEGER,
+    creation_date TEXT,
+    last_update   TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_recurring_device ON recurring_reservations (device_id);
+CREATE INDEX IF NOT EXISTS idx_recurring_user ON recurring_reservations (user_id);
+
+-- Archiv abgelaufener Reservierungen, partition_id = Startjahr (siehe SqliteReservationRepo.archive_before)
+CREATE TABLE IF NOT EXISTS reservations_archive (
+    id            TEXT PRIMARY KEY,
+    partition_id  TEXT NOT NULL,
+    user_id       TEXT NOT NULL,
+    device_id     INTEGER NOT NULL,
+    start_date    TEXT NOT NULL,
+    end_date      TEXT NOT NULL,
+    creation_date TEXT,
+    last_update   TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_archive_device_time ON reservations_archive (device_id, start_date, end_date);
+CREATE INDEX IF NOT EXISTS idx_archive_user ON reservations_archive (user_id);
+CREATE INDEX IF NOT EXISTS idx_archive_end ON reservations_archive (end_date);
+
+-- Versionszähler pro Tabelle, von Triggern bei jeder Änderung erhöht (prozessübergreifend gültig)
+CREATE TABLE IF NOT EXISTS table_versions (
+    name    TEXT PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
+);
+INSERT OR IGNORE INTO table_versions (name)
+VALUES ('users'), ('devices'), ('reservations'), ('recurring_reservations'), ('reservations_archive');
+""" + "".join(
+    f"""
+CREATE TRIGGER IF NOT EXISTS {table}_version_{event.lower()} AFTER {event} ON {table}
+BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE name = '{table}';
+END;
+"""
+    for table in ("users", "devices", "reservations", "recurring_reservations", "reservations_archive")
+    for event in ("INSERT", "UPDATE", "DELETE")
+) + """
+-- Zähler pro Gerät: ändert sich mit jeder Buchung oder Serie darauf (ReservationService bucht optimistisch)
+CREATE TABLE IF NOT EXISTS device_versions (
+    device_id INTEGER PRIMARY KEY,
+    version   INTEGER NOT NULL
+);
+""" + "".join(
+    f"""
+CREATE TRIGGER IF NOT EXISTS {table}_device_version_{event.lower()} AFTER {event} ON {table}
+BEGIN
+""" + "".join(
+        f"""    INSERT INTO device_versions (device_id, version) VALUES ({row}.device_id, 1)
+        ON CONFLICT (device_id) DO UPDATE SET version = version + 1;
+"""
+        for row in rows
+    ) + """END;
+"""
+    for table in ("reservations", "recurring_reservations")
+    for event, rows in (("INSERT", ("NEW",)), ("UPDATE", ("OLD", "NEW")), ("DELETE", ("OLD",)))
+)
+
+# Feste Breite + UTC: Textvergleich in SQL entspricht dem zeitlichen Vergleich
+_TS_FORMAT = "%Y-%m-%dT%H:%M:%S.%f+00:00"
+
+
+def to_db_time(value: Optional[datetime]) -> Optional[str]:
+    """datetime -> UTC-Text fester Breite (naive Zeitpunkte gelten als UTC)."""
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).strftime(_TS_FORMAT)
+
+
+def from_db_time(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value is not None else None
+
+
+_local = threading.local()
+
+
+def get_connection(path: str = SQLITE_FILE) -> sqlite3.Connection:
+    """Eine Verbindung pro Thread und Datei (Streamlit-Sessions laufen in eigenen Threads)."""
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+
+    path = os.path.abspath(path)
+    conn = connections.get(path)
+    if conn is None:
+        conn = sqlite3.connect(path)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(SCHEMA)
+        connections[path] = conn
+    return conn
+
+
+@contextmanager
+def transaction(conn: sqlite3.Connection, immediate: bool = False) -> Iterator[sqlite3.Connection]:
+    """
+    Wie `with conn:`, aber verschachtelbar: nur der äußerste Block committet bzw. rollt zurück.
+    immediate=True sperrt die Datenbank schon beim Beginn (Lesen + Schreiben als eine Einheit).
+    Ereignisse des Änderungsfeeds gehen erst nach dem Commit hinaus (change_feed.deferred).
+    """
+    depths = getattr(_local, "depths", None)
+    if depths is None:
+        depths = _local.depths = {}
+
+    key = id(conn)
+    depths[key] = depths.get(key, 0) + 1
+    try:
+        if depths[key] > 1:
+            yield conn
+            return
+        with change_feed.deferred():
+            if immediate and not conn.in_transaction:
+                conn.execute("BEGIN IMMEDIATE")
+            with conn:
+                yield conn
+    finally:
+        depths[key] -= 1
+
+
+def table_version(conn: sqlite3.Connection, name: str) -> int:
+    """Datenstand einer Tabelle – steigt bei jedem Schreibvorgang (auch aus anderen Prozessen)."""
+    return conn.execute("SELECT version FROM table_versions WHERE name = ?", (name,)).fetchone()[0]
+
+
+def migrate_from_json(json_path: str = DB_FILE, sqlite_path: str = SQLITE_FILE) -> dict[str, int]:
+    """
+    Einmalige Übernahme aller Tabellen aus database.json in die SQLite-Datenbank.
+    Bereits vorhandene Zeilen mit gleicher id werden überschrieben.
+    """
+    source = open_db(json_path)
+    conn = get_connection(sqlite_path)
+    users = source.table("users").all()
+    devices = source.table("devices").all()
+    reservations = source.table("reservations").all()
+    series = source.table("recurring_reservations").all()
+    archived = [
+        (p["id"], d)
+        for p in source.table("archive_partitions").all()
+        for d in open_db(archive_path(p["id"], json_path)).table("reservations").all()
+    ]
+
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO users (id, name, creation_date, last_update) VALUES (?, ?, ?, ?)",
+            [
+                (d["id"], d.get("name", ""), to_db_time(d.get("creation_date")), to_db_time(d.get("last_update")))
+                for d in users
+            ],
+        )
+        conn.executemany(
+            "INSERT OR REPLACE INTO devices (id, name, responsible_user_id, is_active, end_of_life, creation_date, last_update) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    int(d["id"]),
+                    d.get("name", ""),
+                    d.get("responsible_user_id", ""),
+                    int(d.get("is_active", True)),
+                    to_db_time(d.get("end_of_life")),
+                    to_db_time(d.get("creation_date")),
+                    to_db_time(d.get("last_update")),
+                )
+                for d in devices
+            ],
+        )
+        conn.executemany(
+            "INSERT OR REPLACE INTO reservations (id, user_id, device_id, start_date, end_date, creation_date, last_update) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    d["id"],
+                    d["user_id"],
+                    int(d["device_id"]),
+                    to_db_time(d["start_date"]),
+                    to_db_time(d["end_date"]),
+                    to_db_time(d.get("creation_date")),
+                    to_db_time(d.get("last_update")),
+                )
+                for d in reservations
+            ],
+        )
+        conn.executemany(
+            "INSERT OR REPLACE INTO recurring_reservations "
+            "(id, user_id, device_id, start_date, end_date, frequency, interval, until, count, creation_date, last_update) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    d["id"],
+                    d["user_id"],
+                    int(d["device_id"]),
+                    to_db_time(d["start_date"]),
+                    to_db_time(d["end_date"]),
+                    d.get("frequency", "weekly"),
+                    int(d.get("interval", 1)),
+                    to_db_time(d.get("until")),
+                    d.get("count"),
+                    to_db_time(d.get("creation_date")),
+                    to_db_time(d.get("last_update")),
+                )
+                for d in series
+            ],
+        )
+        conn.executemany(
+            "INSERT OR REPLACE INTO reservations_archive "
+            "(id, partition_id, user_id, device_id, start_date, end_date, creation_date, last_update) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    d["id"],
+                    partition_id,
+                    d["user_id"],
+                    int(d["device_id"]),
+                    to_db_time(d["start_date"]),
+                    to_db_time(d["end_date"]),
+                    to_db_time(d.get("creation_date")),
+                    to_db_time(d.get("last_update")),
+                )
+                for partition_id, d in archived
+            ],
+        )
+
+    return {
+        "users": len(users),
+        "devices": len(devices),
+        "reservations": len(reservations),
+        "recurring_reservations": len(series),
+        "reservations_archive": len(archived),
+    }
+
+
+if __name__ == "__main__":
+    counts = migrate_from_json()
+    print(f"Migriert nach {SQLITE_FILE}: " + ", ".join(f"{n} {name}" for name, n in counts.items()))
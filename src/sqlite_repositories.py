@@ -0,0 +1,656 @@
+# src/sqlite_repositories.py
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Callable, Iterable, Iterator
+
+import change_feed
+from db import now_utc
+from devices import Device
+from indexes import IdAllocator
+from instrumentation import instrument_methods
+from repositories import DeviceRepo, Page
+from recurring_reservations import RecurringReservation
+from reservations import Reservation
+from sqlite_db import SQLITE_FILE, from_db_time, get_connection, table_version, to_db_time, transaction
+from users import User
+
+
+def _select_in(
+    conn: sqlite3.Connection, sql: str, values: Iterable[Any], params: tuple = (), chunk: int = 500
+) -> Iterator[sqlite3.Row]:
+    # `sql` enthält genau ein "IN ({})" hinter den Platzhaltern für `params`;
+    # SQLite begrenzt die Anzahl der Parameter pro Statement
+    values = list(values)
+    for i in range(0, len(values), chunk):
+        part = values[i:i + chunk]
+        yield from conn.execute(sql.format(", ".join("?" * len(part))), (*params, *part))
+
+
+def _execute_in(conn: sqlite3.Connection, sql: str, values: Iterable[Any], params: tuple = (), chunk: int = 500) -> int:
+    # wie _select_in, für UPDATE/DELETE: liefert die Anzahl geänderter Zeilen
+    values = list(values)
+    changed = 0
+    for i in range(0, len(values), chunk):
+        part = values[i:i + chunk]
+        changed += conn.execute(sql.format(", ".join("?" * len(part))), (*params, *part)).rowcount
+    return changed
+
+
+def _ids(conn: sqlite3.Connection, table: str, column: str, values: Iterable[Any]) -> set:
+    # ids der Zeilen mit `column` IN values – vor UPDATE/DELETE, für den Änderungsfeed
+    return {r[0] for r in _select_in(conn, f"SELECT id FROM {table} WHERE {column} IN ({{}})", values)}
+
+
+def _rows(conn: sqlite3.Connection, table: str, ids: Iterable[Any], data: Callable[[sqlite3.Row], dict]) -> list[dict]:
+    return [data(r) for r in _select_in(conn, f"SELECT * FROM {table} WHERE id IN ({{}})", ids)]
+
+
+def _publish_upserts(table: str, existing: set, rows: Iterable[dict]) -> None:
+    rows = {row["id"]: row for row in rows}.values()
+    change_feed.publish(table, change_feed.UPDATE, [row for row in rows if row["id"] in existing])
+    change_feed.publish(table, change_feed.INSERT, [row for row in rows if row["id"] not in existing])
+
+
+class _SqliteRepo:
+    # Verbindung erst beim ersten Zugriff und pro Thread (get_connection):
+    # eine Repo-Instanz darf prozessweit geteilt werden (st.cache_resource)
+    def __init__(self, path: str = SQLITE_FILE) -> None:
+        self.path = os.path.abspath(path)
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        return get_connection(self.path)
+
+    @contextmanager
+    def unit_of_work(self) -> Iterator[None]:
+        """
+        Block als eine Transaktion (BEGIN IMMEDIATE): konsistenter Stand für alle Lesezugriffe,
+        atomarer Commit bzw. Rollback, auch über Repos hinweg (siehe sqlite_db.transaction).
+        """
+        try:
+            with transaction(self.conn, immediate=True):
+                yield
+        except BaseException:
+            # zurückgerollt: ein nachgeführter ID-Allokator kennt dann Geräte, die es nicht gibt
+            with _ID_ALLOCATORS_LOCK:
+                _ID_ALLOCATORS.pop(self.path, None)
+            raise
+
+
+def _page(conn: sqlite3.Connection, table: str, columns: set[str], sort_key: str, offset: int, limit: int) -> tuple[list[sqlite3.Row], int]:
+    # sort_key kommt in den SQL-Text -> nur bekannte Spalten zulassen
+    if sort_key not in columns:
+        raise ValueError(f"Unbekanntes Sortierfeld: {sort_key}")
+    total = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    rows = conn.execute(
+        f"SELECT * FROM {table} ORDER BY {sort_key} IS NULL, {sort_key}, id LIMIT ? OFFSET ?", (limit, offset)
+    ).fetchall()
+    return rows, total
+
+
+def _user_from_row(row: sqlite3.Row) -> User:
+    return User.from_dict(_user_data(row))
+
+
+def _user_data(row: sqlite3.Row) -> dict[str, Any]:
+    return {
+        "id": row["id"],
+        "name": row["name"],
+        "creation_date": from_db_time(row["creation_date"]),
+        "last_update": from_db_time(row["last_update"]),
+    }
+
+
+def _device_from_row(row: sqlite3.Row) -> Device:
+    return Device.from_dict(_device_data(row))
+
+
+def _device_data(row: sqlite3.Row) -> dict[str, Any]:
+    return {
+        "id": row["id"],
+        "name": row["name"],
+        "responsible_user_id": row["responsible_user_id"],
+        "is_active": bool(row["is_active"]),
+        "end_of_life": from_db_time(row["end_of_life"]),
+        "creation_date": from_db_time(row["creation_date"]),
+        "last_update": from_db_time(row["last_update"]),
+    }
+
+
+def _reservation_from_row(row: sqlite3.Row) -> Reservation:
+    return Reservation.from_dict(_reservation_data(row))
+
+
+def _reservation_data(row: sqlite3.Row) -> dict[str, Any]:
+    return {
+        "id": row["id"],
+        "user_id": row["user_id"],
+        "device_id": row["device_id"],
+        "start_date": from_db_time(row["start_date"]),
+        "end_date": from_db_time(row["end_date"]),
+        "creation_date": from_db_time(row["creation_date"]),
+        "last_update": from_db_time(row["last_update"]),
+    }
+
+
+def _series_from_row(row: sqlite3.Row) -> RecurringReservation:
+    return RecurringReservation.from_dict(_series_data(row))
+
+
+def _series_data(row: sqlite3.Row) -> dict[str, Any]:
+    return {
+        "id": row["id"],
+        "user_id": row["user_id"],
+        "device_id": row["device_id"],
+        "start_date": from_db_time(row["start_date"]),
+        "end_date": from_db_time(row["end_date"]),
+        "frequency": row["frequency"],
+        "interval": row["interval"],
+        "until": from_db_time(row["until"]),
+        "count": row["count"],
+        "creation_date": from_db_time(row["creation_date"]),
+        "last_update": from_db_time(row["last_update"]),
+    }
+
+
+@instrument_methods()
+class SqliteUserRepo(_SqliteRepo):
+    """UserRepo auf SQLite-Basis (gleiche öffentliche Methoden wie repositories.UserRepo)."""
+
+    _UPSERT = (
+        "INSERT INTO users (id, name, creation_date, last_update) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT(id) DO UPDATE SET name = excluded.name, "
+        "creation_date = excluded.creation_date, last_update = excluded.last_update"
+    )
+
+    def version(self) -> int:
+        return table_version(self.conn, "users")
+
+    @staticmethod
+    def _params(user: User) -> tuple:
+        d = user.to_dict()
+        return (d["id"], d["name"], to_db_time(d["creation_date"]), to_db_time(d["last_update"]))
+
+    def upsert(self, user: User) -> None:
+        with transaction(self.conn):
+            existing = _ids(self.conn, "users", "id", [user.id])
+            self.conn.execute(self._UPSERT, self._params(user))
+            _publish_upserts("users", existing, [user.to_dict()])
+
+    def upsert_many(self, users: Iterable[User]) -> None:
+        users = list(users)
+        with transaction(self.conn):
+            existing = _ids(self.conn, "users", "id", {u.id for u in users})
+            self.conn.executemany(self._UPSERT, [self._params(u) for u in users])
+            _publish_upserts("users", existing, [u.to_dict() for u in users])
+
+    def get(self, user_id: str) -> User | None:
+        row = self.conn.execute("SELECT * FROM users WHERE id = ?", (user_id,)).fetchone()
+        return _user_from_row(row) if row else None
+
+    def get_many(self, user_ids: Iterable[str]) -> dict[str, User]:
+        rows = _select_in(self.conn, "SELECT * FROM users WHERE id IN ({})", set(user_ids))
+        return {r["id"]: _user_from_row(r) for r in rows}
+
+    def list_all(self, as_rows: bool = False) -> list[User] | list[User.Row]:
+        rows = self.conn.execute("SELECT * FROM users")
+        if as_rows:
+            return User.rows_from_dicts(map(_user_data, rows))
+        return [_user_from_row(r) for r in rows]
+
+    def count(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+    def list_page(self, offset: int = 0, limit: int = 50, sort_key: str = "id") -> Page:
+        rows, total = _page(self.conn, "users", {"id", "name", "creation_date", "last_update"}, sort_key, offset, limit)
+        return Page([_user_from_row(r) for r in rows], total, offset, limit)
+
+    def delete(self, user_id: str) -> None:
+        self.delete_many([user_id])
+
+    def delete_many(self, user_ids: Iterable[str]) -> int:
+        with transaction(self.conn):
+            existing = _ids(self.conn, "users", "id", set(user_ids))
+            deleted = _execute_in(self.conn, "DELETE FROM users WHERE id IN ({})", existing)
+            change_feed.publish_deleted("users", existing)
+        return deleted
+
+
+# ID-Allokator pro Datenbankdatei, prozessweit geteilt (wie indexes.id_allocator)
+_ID_ALLOCATORS: dict[str, IdAllocator] = {}
+_ID_ALLOCATORS_LOCK = threading.RLock()
+
+
+@instrument_methods()
+class SqliteDeviceRepo(_SqliteRepo, DeviceRepo):
+    """
+    DeviceRepo auf SQLite-Basis.
+    ID-Regeln (MAX_IDS, _validate_id, free_ids, upsert) kommen unverändert aus DeviceRepo.
+    Doppelte IDs verhindert der Primärschlüssel; der Allokator wird nach eigenen Schreibvorgängen
+    nachgeführt und bei fremden Änderungen (Versionssprung) aus der Tabelle neu aufgebaut.
+    """
+
+    def __init__(self, path: str = SQLITE_FILE) -> None:
+        super().__init__(path)
+        self.user_repo = SqliteUserRepo(path)
+
+    def version(self) -> int:
+        return table_version(self.conn, "devices")
+
+    def _allocator(self) -> IdAllocator:
+        with _ID_ALLOCATORS_LOCK:
+            allocator = _ID_ALLOCATORS.get(self.path)
+            if allocator is None or allocator.max_id != self.MAX_IDS:
+                allocator = _ID_ALLOCATORS[self.path] = IdAllocator(self.MAX_IDS)
+            version = self.version()
+            if allocator.version != version:
+                allocator.rebuild((r[0] for r in self.conn.execute("SELECT id FROM devices")), version)
+        return allocator
+
+    def _track(self, allocator: IdAllocator, version_before: int, changed_rows: int) -> None:
+        # Trigger zählen pro Zeile: nur wenn niemand dazwischen geschrieben hat, ist der Allokator aktuell
+        version = self.version()
+        if version == version_before + changed_rows:
+            allocator.version = version
+
+    def _params(self, device: Device) -> tuple:
+        d = device.to_dict()
+        return (
+            d["name"],
+            d["responsible_user_id"],
+            int(d["is_active"]),
+            to_db_time(d["end_of_life"]),
+            to_db_time(d["creation_date"]),
+            to_db_time(d["last_update"]),
+            int(d["id"]),
+        )
+
+    def create(self, device: Device) -> None:
+        if self.user_repo.get(device.responsible_user_id) is None:
+            raise ValueError("Verantwortliche Person existiert nicht (User zuerst anlegen).")
+
+        with _ID_ALLOCATORS_LOCK:
+            allocator = self._allocator()
+            self._assign_id(device, allocator)
+            version = allocator.version
+            device.creation_date = now_utc()
+            device.last_update = now_utc()
+            try:
+                with transaction(self.conn):
+                    self.conn.execute(
+                        "INSERT INTO devices (name, responsible_user_id, is_active, end_of_life, creation_date, last_update, id) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        self._params(device),
+                    )
+                    change_feed.publish("devices", change_feed.INSERT, [device.to_dict()])
+            except sqlite3.IntegrityError:
+                raise ValueError("Inventarnummer bereits vergeben.")
+            allocator.allocate(device.id)
+            self._track(allocator, version, 1)
+
+    def update(self, device: Device) -> None:
+        device.id = int(device.id)
+        self._validate_id(device.id)
+
+        if self.user_repo.get(device.responsible_user_id) is None:
+            raise ValueError("Verantwortliche Person existiert nicht (User zuerst anlegen).")
+
+        row = self.conn.execute("SELECT creation_date FROM devices WHERE id = ?", (device.id,)).fetchone()
+        if row is None:
+            raise ValueError("Gerät existiert nicht (kann nicht aktualisiert werden).")
+
+        device.creation_date = from_db_time(row["creation_date"])
+        device.last_update = now_utc()
+        with _ID_ALLOCATORS_LOCK:
+            allocator = self._allocator()
+            version = allocator.version
+            with transaction(self.conn):
+                self.conn.execute(
+                    "UPDATE devices SET name = ?, responsible_user_id = ?, is_active = ?, end_of_life = ?, "
+                    "creation_date = ?, last_update = ? WHERE id = ?",
+                    self._params(device),
+                )
+                change_feed.publish("devices", change_feed.UPDATE, [device.to_dict()])
+            self._track(allocator, version, 1)
+
+    def upsert_many(self, devices: Iterable[Device]) -> None:
+        devices = list(devices)
+        for device in devices:
+            device.id = int(device.id)
+            self._validate_id(device.id)
+
+        users = self.user_repo.get_many(d.responsible_user_id for d in devices)
+        if any(d.responsible_user_id not in users for d in devices):
+            raise ValueError("Verantwortliche Person existiert nicht (User zuerst anlegen).")
+
+        now = now_utc()
+        with _ID_ALLOCATORS_LOCK:
+            allocator = self._allocator()
+            version = allocator.version
+            with transaction(self.conn):
+                # creation_date bleibt bei vorhandenen Geräten erhalten (wie update() und das TinyDB-Repo)
+                created = {
+                    r["id"]: from_db_time(r["creation_date"])
+                    for r in _select_in(self.conn, "SELECT id, creation_date FROM devices WHERE id IN ({})", {d.id for d in devices})
+                }
+                existing = set(created)
+                for device in devices:
+                    device.creation_date = created.get(device.id, now)
+                    device.last_update = now
+                self.conn.executemany(
+                    "INSERT INTO devices (name, responsible_user_id, is_active, end_of_life, creation_date, last_update, id) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT(id) DO UPDATE SET name = excluded.name, responsible_user_id = excluded.responsible_user_id, "
+                    "is_active = excluded.is_active, end_of_life = excluded.end_of_life, last_update = excluded.last_update",
+                    [self._params(d) for d in devices],
+                )
+                _publish_upserts("devices", existing, _rows(self.conn, "devices", {d.id for d in devices}, _device_data))
+            for device in devices:
+                allocator.allocate(device.id)
+            self._track(allocator, version, len(devices))
+
+    def get(self, device_id: int) -> Device | None:
+        self._validate_id(int(device_id))
+        row = self.conn.execute("SELECT * FROM devices WHERE id = ?", (int(device_id),)).fetchone()
+        return _device_from_row(row) if row else None
+
+    def get_many(self, device_ids: Iterable[int]) -> dict[int, Device]:
+        rows = _select_in(self.conn, "SELECT * FROM devices WHERE id IN ({})", {int(i) for i in device_ids})
+        return {r["id"]: _device_from_row(r) for r in rows}
+
+    def list_all(self, as_rows: bool = False) -> list[Device] | list[Device.Row]:
+        rows = self.conn.execute("SELECT * FROM devices")
+        if as_rows:
+            return Device.rows_from_dicts(map(_device_data, rows))
+        return [_device_from_row(r) for r in rows]
+
+    def count(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM devices").fetchone()[0]
+
+    def list_page(self, offset: int = 0, limit: int = 50, sort_key: str = "id") -> Page:
+        columns = {"id", "name", "responsible_user_id", "is_active", "end_of_life", "creation_date", "last_update"}
+        rows, total = _page(self.conn, "devices", columns, sort_key, offset, limit)
+        return Page([_device_from_row(r) for r in rows], total, offset, limit)
+
+    def list_for_user(self, user_id: str) -> list[Device]:
+        rows = self.conn.execute("SELECT * FROM devices WHERE responsible_user_id = ?", (user_id,))
+        return [_device_from_row(r) for r in rows]
+
+    def delete(self, device_id: int) -> None:
+        self._validate_id(int(device_id))
+        with _ID_ALLOCATORS_LOCK:
+            allocator = self._allocator()
+            version = allocator.version
+            with transaction(self.conn):
+                deleted = self.conn.execute("DELETE FROM devices WHERE id = ?", (int(device_id),)).rowcount
+                if deleted:
+                    change_feed.publish_deleted("devices", [int(device_id)])
+            allocator.release(int(device_id))
+            self._track(allocator, version, deleted)
+
+    def delete_many(self, device_ids: Iterable[int]) -> int:
+        device_ids = {int(device_id) for device_id in device_ids}
+        with _ID_ALLOCATORS_LOCK:
+            allocator = self._allocator()
+            version = allocator.version
+            with transaction(self.conn):
+                existing = _ids(self.conn, "devices", "id", device_ids)
+                deleted = _execute_in(self.conn, "DELETE FROM devices WHERE id IN ({})", existing)
+                change_feed.publish_deleted("devices", existing)
+            for device_id in device_ids:
+                allocator.release(device_id)
+            self._track(allocator, version, deleted)
+        return deleted
+
+    def reassign_responsible(self, user_ids: Iterable[str], new_user_id: str) -> int:
+        with _ID_ALLOCATORS_LOCK:
+            allocator = self._allocator()
+            version = allocator.version
+            with transaction(self.conn):
+                ids = _ids(self.conn, "devices", "responsible_user_id", set(user_ids))
+                changed = _execute_in(
+                    self.conn,
+                    "UPDATE devices SET responsible_user_id = ?, last_update = ? WHERE id IN ({})",
+                    ids,
+                    params=(new_user_id, to_db_time(now_utc())),
+                )
+                change_feed.publish("devices", change_feed.UPDATE, _rows(self.conn, "devices", ids, _device_data))
+            self._track(allocator, version, changed)
+        return changed
+
+
+@instrument_methods()
+class SqliteReservationRepo(_SqliteRepo):
+    """
+    ReservationRepo auf SQLite-Basis.
+    Die Overlap-Bedingung läuft als SQL über den Index (device_id, start_date, end_date).
+    Abgelaufene Reservierungen liegen in `reservations_archive` (Spalte partition_id = Startjahr),
+    Overlap-Abfragen sehen nur `reservations`.
+    """
+
+    _COLUMNS = "id, user_id, device_id, start_date, end_date, creation_date, last_update"
+    _INSERT = f"INSERT INTO reservations ({_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?)"
+    # Quelle für Abfragen mit include_archive=True
+    _WITH_ARCHIVE = f"(SELECT {_COLUMNS} FROM reservations UNION ALL SELECT {_COLUMNS} FROM reservations_archive)"
+
+    def version(self) -> int:
+        return sum(table_version(self.conn, name) for name in ("reservations", "recurring_reservations", "reservations_archive"))
+
+    def device_versions(self, device_ids: Iterable[int]) -> tuple:
+        """Stand der Buchungen auf `device_ids` (Zähler pro Gerät aus Triggern, siehe sqlite_db) und des Archivs."""
+        device_ids = sorted({int(d) for d in device_ids})
+        versions = dict(
+            _select_in(self.conn, "SELECT device_id, version FROM device_versions WHERE device_id IN ({})", device_ids)
+        )
+        return (table_version(self.conn, "reservations_archive"), *(versions.get(d, 0) for d in device_ids))
+
+    def _source(self, include_archive: bool) -> str:
+        return self._WITH_ARCHIVE if include_archive else "reservations"
+
+    @staticmethod
+    def _params(r: Reservation) -> tuple:
+        d = r.to_dict()
+        return (
+            d["id"],
+            d["user_id"],
+            d["device_id"],
+            to_db_time(d["start_date"]),
+            to_db_time(d["end_date"]),
+            to_db_time(d["creation_date"]),
+            to_db_time(d["last_update"]),
+        )
+
+    def create(self, r: Reservation) -> None:
+        r.creation_date = now_utc()
+        r.last_update = now_utc()
+        with transaction(self.conn):
+            self.conn.execute(self._INSERT, self._params(r))
+            change_feed.publish("reservations", change_feed.INSERT, [r.to_dict()])
+
+    def create_many(self, reservations: Iterable[Reservation]) -> None:
+        now = now_utc()
+        reservations = list(reservations)
+        for r in reservations:
+            r.creation_date = now
+            r.last_update = now
+        with transaction(self.conn):
+            self.conn.executemany(self._INSERT, [self._params(r) for r in reservations])
+            change_feed.publish("reservations", change_feed.INSERT, [r.to_dict() for r in reservations])
+
+    def delete(self, reservation_id: str) -> None:
+        with transaction(self.conn):
+            if self.conn.execute("DELETE FROM reservations WHERE id = ?", (reservation_id,)).rowcount:
+                change_feed.publish_deleted("reservations", [reservation_id])
+
+    def delete_many(self, reservation_ids: Iterable[str]) -> int:
+        reservation_ids = set(reservation_ids)
+        deleted = 0
+        with transaction(self.conn):
+            for table in ("reservations", "reservations_archive"):
+                existing = _ids(self.conn, table, "id", reservation_ids)
+                deleted += _execute_in(self.conn, f"DELETE FROM {table} WHERE id IN ({{}})", existing)
+                change_feed.publish_deleted(table, existing)
+        return deleted
+
+    def reassign_user(self, user_ids: Iterable[str], new_user_id: str) -> int:
+        user_ids = set(user_ids)
+        changed = 0
+        with transaction(self.conn):
+            for table in ("reservations", "reservations_archive"):
+                changed += self._reassign(table, user_ids, new_user_id, _reservation_data)
+        return changed
+
+    def _reassign(self, table: str, user_ids: set[str], new_user_id: str, data: Callable[[sqlite3.Row], dict]) -> int:
+        ids = _ids(self.conn, table, "user_id", user_ids)
+        changed = _execute_in(
+            self.conn,
+            f"UPDATE {table} SET user_id = ?, last_update = ? WHERE id IN ({{}})",
+            ids,
+            params=(new_user_id, to_db_time(now_utc())),
+        )
+        change_feed.publish(table, change_feed.UPDATE, _rows(self.conn, table, ids, data))
+        return changed
+
+    def archived_partitions(self, start: datetime | None = None, end: datetime | None = None) -> list[dict]:
+        rows = self.conn.execute(
+            "SELECT partition_id, MIN(start_date), MAX(end_date), COUNT(*) FROM reservations_archive "
+            "GROUP BY partition_id ORDER BY partition_id"
+        )
+        partitions = [
+            {"id": p, "first_start": from_db_time(s), "last_end": from_db_time(e), "count": n} for p, s, e, n in rows
+        ]
+        return [
+            p for p in partitions
+            if (start is None or p["last_end"] > start) and (end is None or p["first_start"] < end)
+        ]
+
+    def archived_until(self) -> datetime | None:
+        return from_db_time(self.conn.execute("SELECT MAX(end_date) FROM reservations_archive").fetchone()[0])
+
+    def archive_before(self, cutoff: datetime) -> int:
+        # Kopieren und Löschen in einer Transaktion, OR IGNORE wie der Duplikat-Check im TinyDB-Repo
+        with transaction(self.conn, immediate=True):
+            rows = [
+                _reservation_data(r)
+                for r in self.conn.execute("SELECT * FROM reservations WHERE end_date <= ?", (to_db_time(cutoff),))
+            ]
+            self.conn.execute(
+                f"INSERT OR IGNORE INTO reservations_archive (partition_id, {self._COLUMNS}) "
+                f"SELECT substr(start_date, 1, 4), {self._COLUMNS} FROM reservations WHERE end_date <= ?",
+                (to_db_time(cutoff),),
+            )
+            moved = self.conn.execute("DELETE FROM reservations WHERE end_date <= ?", (to_db_time(cutoff),)).rowcount
+            change_feed.publish("reservations_archive", change_feed.INSERT, rows)
+            change_feed.publish_deleted("reservations", [row["id"] for row in rows])
+        return moved
+
+    def create_series(self, series: RecurringReservation) -> None:
+        series.creation_date = now_utc()
+        series.last_update = now_utc()
+        d = series.to_dict()
+        with transaction(self.conn):
+            self.conn.execute(
+                "INSERT INTO recurring_reservations "
+                "(id, user_id, device_id, start_date, end_date, frequency, interval, until, count, creation_date, last_update) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    d["id"], d["user_id"], d["device_id"], to_db_time(d["start_date"]), to_db_time(d["end_date"]),
+                    d["frequency"], d["interval"], to_db_time(d["until"]), d["count"],
+                    to_db_time(d["creation_date"]), to_db_time(d["last_update"]),
+                ),
+            )
+            change_feed.publish("recurring_reservations", change_feed.INSERT, [d])
+
+    def get_series(self, series_id: str) -> RecurringReservation | None:
+        row = self.conn.execute("SELECT * FROM recurring_reservations WHERE id = ?", (series_id,)).fetchone()
+        return _series_from_row(row) if row else None
+
+    def series_for_devices(self, device_ids: Iterable[int]) -> dict[int, list[RecurringReservation]]:
+        result: dict[int, list[RecurringReservation]] = {int(d): [] for d in device_ids}
+        rows = _select_in(
+            self.conn, "SELECT * FROM recurring_reservations WHERE device_id IN ({}) ORDER BY start_date", result
+        )
+        for row in rows:
+            result[row["device_id"]].append(_series_from_row(row))
+        return result
+
+    def series_for_user(self, user_id: str) -> list[RecurringReservation]:
+        rows = self.conn.execute("SELECT * FROM recurring_reservations WHERE user_id = ?", (user_id,))
+        return [_series_from_row(r) for r in rows]
+
+    def list_series(self, as_rows: bool = False) -> list[RecurringReservation] | list[RecurringReservation.Row]:
+        rows = self.conn.execute("SELECT * FROM recurring_reservations")
+        if as_rows:
+            return RecurringReservation.rows_from_dicts(map(_series_data, rows))
+        return [_series_from_row(r) for r in rows]
+
+    def delete_series(self, series_ids: Iterable[str]) -> int:
+        with transaction(self.conn):
+            existing = _ids(self.conn, "recurring_reservations", "id", set(series_ids))
+            deleted = _execute_in(self.conn, "DELETE FROM recurring_reservations WHERE id IN ({})", existing)
+            change_feed.publish_deleted("recurring_reservations", existing)
+        return deleted
+
+    def reassign_series_user(self, user_ids: Iterable[str], new_user_id: str) -> int:
+        with transaction(self.conn):
+            return self._reassign("recurring_reservations", set(user_ids), new_user_id, _series_data)
+
+    def list_all(self, as_rows: bool = False, include_archive: bool = False) -> list[Reservation] | list[Reservation.Row]:
+        rows = self.conn.execute(f"SELECT * FROM {self._source(include_archive)}")
+        if as_rows:
+            return Reservation.rows_from_dicts(map(_reservation_data, rows))
+        return [_reservation_from_row(r) for r in rows]
+
+    def list_for_device(self, device_id: int, include_archive: bool = False) -> list[Reservation]:
+        rows = self.conn.execute(
+            f"SELECT * FROM {self._source(include_archive)} WHERE device_id = ? ORDER BY start_date", (int(device_id),)
+        )
+        return [_reservation_from_row(r) for r in rows]
+
+    def list_page_for_device(self, device_id: int, offset: int = 0, limit: int = 50, include_archive: bool = False) -> Page:
+        source = self._source(include_archive)
+        total = self.conn.execute(
+            f"SELECT COUNT(*) FROM {source} WHERE device_id = ?", (int(device_id),)
+        ).fetchone()[0]
+        rows = self.conn.execute(
+            f"SELECT * FROM {source} WHERE device_id = ? ORDER BY start_date LIMIT ? OFFSET ?",
+            (int(device_id), limit, offset),
+        )
+        return Page([_reservation_from_row(r) for r in rows], total, offset, limit)
+
+    def list_for_user(self, user_id: str, include_archive: bool = False) -> list[Reservation]:
+        rows = self.conn.execute(f"SELECT * FROM {self._source(include_archive)} WHERE user_id = ?", (user_id,))
+        return [_reservation_from_row(r) for r in rows]
+
+    def _overlap_query(self, device_id: int, start: datetime, end: datetime, limit: int = -1) -> sqlite3.Cursor:
+        return self.conn.execute(
+            "SELECT * FROM reservations WHERE device_id = ? AND start_date < ? AND end_date > ? "
+            "ORDER BY start_date LIMIT ?",
+            (int(device_id), to_db_time(end), to_db_time(start), limit),
+        )
+
+    def find_overlaps(self, device_id: int, start: datetime, end: datetime) -> list[Reservation]:
+        return [_reservation_from_row(r) for r in self._overlap_query(device_id, start, end)]
+
+    def find_first_overlap(self, device_id: int, start: datetime, end: datetime) -> Reservation | None:
+        row = self._overlap_query(device_id, start, end, limit=1).fetchone()
+        return _reservation_from_row(row) if row else None
+
+    def busy_intervals(self, device_ids: Iterable[int], start: datetime, end: datetime) -> dict[int, list[tuple[datetime, datetime]]]:
+        # eine Abfrage für alle Geräte (IN-Liste) statt find_overlaps pro Gerät
+        busy: dict[int, list[tuple[datetime, datetime]]] = {int(d): [] for d in device_ids}
+        rows = _select_in(
+            self.conn,
+            "SELECT device_id, start_date, end_date FROM reservations "
+            "WHERE start_date < ? AND end_date > ? AND device_id IN ({}) ORDER BY device_id, start_date",
+            busy,
+            params=(to_db_time(end), to_db_time(start)),
+        )
+        for device_id, s, e in rows:
+            busy[device_id].append((from_db_time(s), from_db_time(e)))
+        return busy
@@ -0,0 +1,528 @@
+# src/storage.py
+from __future__ import annotations
+
+import atexit
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager, suppress
+from enum import Enum
+from itertools import count
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Sequence
+
+from tinydb.middlewares import Middleware
+from tinydb.storages import Storage
+from tinydb.table import Table
+
+import change_feed
+import instrumentation
+
+try:
+    import fcntl
+    LOCK_EX = fcntl.LOCK_EX
+except ImportError:  # Windows: keine Dateisperren, nur ein Prozess pro Datenbank
+    fcntl = None
+    LOCK_EX = 2
+
+# Kennung pro JSONFileStorage für die Pufferanzeige in der Lock-Datei (siehe JSONFileStorage.set_buffered)
+_OWNER_IDS = count(1)
+
+# umask lässt sich nur setzen und zurücksetzen, nicht lesen
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+class Durability(str, Enum):
+    NONE = "none"       # gepuffert, nie fsync (schnell, Datenverlust bei Absturz möglich)
+    FLUSH = "flush"     # gepuffert, fsync bei jedem Flush
+    COMMIT = "commit"   # jede Änderung sofort schreiben + fsync (kein Puffer)
+
+
+class ConflictError(RuntimeError):
+    """Ein anderer Prozess hat seit dem eigenen letzten Lesen committet, ohne dass die Sperre gehalten wurde."""
+
+
+class JSONFileStorage(Storage):
+    """
+    JSON-Datei, die sich mehrere Prozesse teilen können.
+      - Schreiben exklusiv per fcntl.flock (LOCK_EX) auf `<datei>.lock`; acquire()/release() halten die
+        Sperre über Lesen, Prüfen und Schreiben (Unit of Work): dazwischen committet kein anderer Prozess,
+        Prüfungen wie die Überschneidung gelten also auch prozessübergreifend
+      - set_buffered(): ein Write-Behind-Puffer meldet noch nicht geschriebene Änderungen in der Lock-Datei an
+        (ohne die Sperre zu halten); acquire() wartet, bis fremde Puffer geschrieben sind – sonst läse der
+        Schreiber einen Stand ohne sie, und ein Commit ließe den fremden Flush mit ConflictError scheitern
+      - Lesen und Öffnen ohne Sperre (Leser blockieren nie), Stand vor und nach dem Lesen muss übereinstimmen
+      - Schreiben atomar: temporäre Datei + os.replace, Leser sehen nie eine halb geschriebene Datei
+      - Dateistand (mtime, Größe, Inode, Commit-Zähler) nach jedem eigenen Lesen/Schreiben gemerkt:
+        Änderungen von außen erkennt changed_on_disk() ohne Sperre
+      - hat ein anderer Prozess seit dem eigenen letzten Lesen committet, bricht write() mit ConflictError ab
+    fsync nach dem Schreiben ist abschaltbar (siehe Durability).
+    """
+
+    def __init__(self, path: str, fsync: bool = True, create_dirs: bool = False, encoding: Optional[str] = None, **kwargs: Any) -> None:
+        super().__init__()
+        self.path = path
+        self.fsync = fsync
+        self.encoding = encoding
+        self.kwargs = kwargs
+        self._signature: Optional[tuple[int, int, int, int]] = None
+        self._holds = 0
+        self._holds_lock = threading.Lock()
+        self._owner = b"%010d%010d" % (os.getpid(), next(_OWNER_IDS))
+        self._buffered = False
+
+        if create_dirs:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock_fd = os.open(path + ".lock", os.O_RDWR | os.O_CREAT, 0o666)
+        if not os.path.exists(path):
+            with self.exclusive():
+                if not os.path.exists(path):
+                    self._replace("")
+
+    def acquire(self) -> None:
+        """Exklusive Sperre nehmen (zählend, auch über Threads): bis zum letzten release() committet kein anderer Prozess."""
+        with self._holds_lock:
+            if not self._holds and fcntl is not None:
+                delay = 0.002
+                while True:
+                    fcntl.flock(self._lock_fd, LOCK_EX)
+                    # mit eigenem Puffer nicht warten: der muss selbst hinaus (ein fremder wäre ein Konflikt)
+                    if self._buffered or not self._foreign_buffer():
+                        break
+                    fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+                    instrumentation.count("file.buffer_wait")
+                    time.sleep(delay)
+                    delay = min(delay * 2, 0.05)
+                instrumentation.count("file.lock")
+            self._holds += 1
+
+    def release(self) -> None:
+        with self._holds_lock:
+            self._holds -= 1
+            if not self._holds and fcntl is not None:
+                fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    @contextmanager
+    def exclusive(self) -> Iterator[None]:
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def set_buffered(self, buffered: bool) -> None:
+        """Eigene, noch nicht geschriebene Änderungen in der Lock-Datei an- bzw. abmelden (Bytes 20–39)."""
+        self._buffered = buffered
+        if fcntl is not None:
+            os.pwrite(self._lock_fd, self._owner if buffered else b"0" * 20, 20)
+
+    def _foreign_buffer(self) -> bool:
+        owner = os.pread(self._lock_fd, 20, 20)
+        if not owner.strip(b"0\0") or owner == self._owner:
+            return False
+        try:
+            os.kill(int(owner[:10]), 0)
+        except ProcessLookupError:
+            # Prozess beendet, ohne zu flushen: sein Puffer ist verloren, nicht darauf warten
+            return False
+        except PermissionError:
+            pass
+        return True
+
+    def _stat(self) -> tuple[int, int, int, int]:
+        instrumentation.count("file.stat")
+        st = os.stat(self.path)
+        # mtime/Größe/Inode allein reichen nicht: os.replace gibt den Inode frei, der nächste Commit kann ihn
+        # mit gleicher Größe in derselben Zeitstempel-Auflösung wiederverwenden -> zusätzlich der Commit-Zähler
+        return (st.st_mtime_ns, st.st_size, st.st_ino, self._generation())
+
+    def _generation(self) -> int:
+        # Commit-Zähler in der Lock-Datei, von Schreibern unter LOCK_EX erhöht
+        if fcntl is None:
+            return 0
+        # vor dem ersten Commit leer bzw. mit Nullbytes (set_buffered schreibt dahinter)
+        return int(os.pread(self._lock_fd, 20, 0).strip(b"\0") or 0)
+
+    def changed_on_disk(self) -> bool:
+        return self._stat() != self._signature
+
+    def _load(self) -> str:
+        with open(self.path, encoding=self.encoding) as handle:
+            return handle.read()
+
+    def read(self) -> Optional[Dict[str, Dict[str, Any]]]:
+        while True:
+            # ein Commit ersetzt die Datei und erhöht danach den Zähler: gleicher Stand vorher und
+            # nachher heißt, Inhalt und Stand passen zusammen (sonst mitten in einen Commit gelesen)
+            signature = self._stat()
+            text = self._load()
+            if self._stat() == signature:
+                break
+        self._signature = signature
+        instrumentation.count("file.read")
+        instrumentation.count("file.bytes_read", len(text))
+        return json.loads(text) if text else None
+
+    def write(self, data: Dict[str, Dict[str, Any]]) -> None:
+        serialized = json.dumps(data, **self.kwargs)
+        with self.exclusive():
+            if self._signature is not None and self._stat() != self._signature:
+                # nur möglich, wenn ohne gehaltene Sperre gelesen und geschrieben wurde: nicht überschreiben
+                raise ConflictError(f"{self.path} wurde von einem anderen Prozess geändert.")
+            self._replace(serialized)
+            if fcntl is not None:
+                os.pwrite(self._lock_fd, b"%020d" % (self._generation() + 1), 0)
+            self._signature = self._stat()
+        instrumentation.count("file.write")
+        instrumentation.count("file.bytes_written", len(serialized))
+
+    def _replace(self, serialized: str) -> None:
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix=os.path.basename(self.path) + ".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding=self.encoding) as handle:
+                handle.write(serialized)
+                handle.flush()
+                if self.fsync:
+                    os.fsync(handle.fileno())
+                    instrumentation.count("file.fsync")
+            # mkstemp legt 0600 an, die Datenbank bekommt die üblichen Rechte (umask)
+            os.chmod(tmp, 0o666 & ~_UMASK)
+            os.replace(tmp, self.path)
+        except BaseException:
+            with suppress(FileNotFoundError):
+                os.unlink(tmp)
+            raise
+        if self.fsync and fcntl is not None:
+            # Umbenennung selbst dauerhaft machen (Verzeichniseintrag)
+            dir_fd = os.open(directory, os.O_RDONLY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+
+    def close(self) -> None:
+        os.close(self._lock_fd)
+
+
+class WriteBehind(Middleware):
+    """
+    Write-Behind-Puffer vor der Serialisierung (Group Commit).
+      - write() merkt sich nur den neuesten Datenbankstand, geschrieben wird
+        erst nach `max_pending` Änderungen oder spätestens nach `max_delay` Sekunden.
+      - flush() schreibt sofort; beim Beenden des Prozesses wird automatisch geflusht.
+      - Durability.COMMIT schreibt jede Änderung direkt durch.
+      - der Puffer hält keine Dateisperre, flush() nimmt sie nur für Prüfen und Ersetzen der Datei.
+        Er setzt auf dem gelesenen Stand auf und ist in der Lock-Datei angemeldet (JSONFileStorage.set_buffered):
+        schreibende Prozesse warten bis zu `max_delay` Sekunden auf den Flush, Lesen und Öffnen nie.
+      - hat trotzdem jemand dazwischen committet (Schreiben ohne Unit of Work), bricht flush() mit
+        ConflictError ab und verwirft den Puffer; der nächste Lesezugriff lädt den Stand von der Platte.
+    `lock` schützt den Puffer und muss von allen Schreibern geteilt werden (siehe SnapshotCache).
+    """
+
+    def __init__(
+        self,
+        storage_cls,
+        durability: Durability = Durability.FLUSH,
+        max_pending: int = 50,
+        max_delay: float = 1.0,
+    ) -> None:
+        super().__init__(storage_cls)
+        self.durability = Durability(durability)
+        self.max_pending = max_pending
+        self.max_delay = max_delay
+        self.lock = threading.RLock()
+        self._pending: Optional[Dict[str, Dict[str, Any]]] = None
+        self._pending_count = 0
+        self._timer: Optional[threading.Timer] = None
+
+    def __call__(self, *args: Any, **kwargs: Any) -> "WriteBehind":
+        kwargs.setdefault("fsync", self.durability is not Durability.NONE)
+        super().__call__(*args, **kwargs)
+        atexit.register(self.flush)
+        return self
+
+    @property
+    def pending(self) -> int:
+        return self._pending_count
+
+    def read(self) -> Optional[Dict[str, Dict[str, Any]]]:
+        with self.lock:
+            if self._pending is not None:
+                if not self.storage.changed_on_disk():
+                    return self._pending
+                # fremder Commit seit dem gelesenen Stand: der Puffer lässt sich nicht mehr schreiben
+                self.flush()
+            return self.storage.read()
+
+    def write(self, data: Dict[str, Dict[str, Any]]) -> None:
+        with self.lock:
+            if self.durability is Durability.COMMIT:
+                self.storage.write(data)
+                return
+
+            if self._pending is None:
+                self.storage.set_buffered(True)
+            self._pending = data
+            self._pending_count += 1
+            if self._pending_count >= self.max_pending:
+                self.flush()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.max_delay, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    @instrumentation.timed("storage.flush")
+    def flush(self) -> None:
+        """Gepufferte Änderungen sofort in einem Schreibvorgang auf die Platte bringen."""
+        with self.lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if self._pending is None:
+                return
+            try:
+                # Sperre nur für den Commit: Dateistand prüfen, ersetzen, Puffer abmelden
+                with self.storage.exclusive():
+                    self.storage.write(self._pending)
+                    self.storage.set_buffered(False)
+            except ConflictError:
+                self.storage.set_buffered(False)
+                self._pending = None
+                self._pending_count = 0
+                raise
+            self._pending = None
+            self._pending_count = 0
+
+    def close(self) -> None:
+        self.flush()
+        atexit.unregister(self.flush)
+        self.storage.close()
+
+
+class SnapshotCache(Middleware):
+    """
+    Hält den deserialisierten Datenbankinhalt im Speicher.
+      - Gelesen und deserialisiert wird nur, wenn sich die Datei geändert hat
+        (mtime/Größe, siehe JSONFileStorage.changed_on_disk).
+      - Versionszähler pro Tabelle: steigt bei jedem Schreibvorgang auf die
+        Tabelle und bei Änderungen von außen (dann für alle Tabellen).
+      - `lock` serialisiert Read-Modify-Write der Tabellen (siehe SnapshotTable);
+        mit WriteBehind darunter muss es dessen Lock sein.
+      - unit_of_work(): ein Snapshot für alle Lesezugriffe, Schreibvorgänge (auch auf mehrere
+        Tabellen) als ein Write an die Storage darunter, Rollback bei Fehlern; hält dabei die
+        exklusive Dateisperre, andere Prozesse schreiben erst danach.
+    """
+
+    def __init__(self, storage_cls, lock: Optional[threading.RLock] = None) -> None:
+        super().__init__(storage_cls)
+        self.lock = lock or threading.RLock()
+        self.cache: Optional[Dict[str, Dict[str, Any]]] = None
+        self.version = 0
+        self._loaded = False
+        self._base_version = 0
+        self._table_versions: Dict[str, int] = {}
+        self._table_refs: Dict[str, Any] = {}
+        self._uow_local = threading.local()
+        self._uow_active = False
+        self._uow_dirty = False
+
+    @property
+    def _uow_depth(self) -> int:
+        # pro Thread: nur der Thread, der die Unit of Work hält, liest deren ungeschriebenen Stand
+        return getattr(self._uow_local, "depth", 0)
+
+    @_uow_depth.setter
+    def _uow_depth(self, depth: int) -> None:
+        self._uow_local.depth = depth
+
+    def _refresh(self) -> None:
+        # in der eigenen Unit of Work nicht erneut prüfen: ein Snapshot, eigene Änderungen stehen nur im Cache
+        if self._uow_depth:
+            return
+        if self._uow_active:
+            # Unit of Work eines anderen Threads: bis Commit bzw. Rollback warten, statt ihren Stand zu lesen
+            with self.lock:
+                self._reload_if_changed()
+            return
+        self._reload_if_changed()
+
+    def _reload_if_changed(self) -> None:
+        if self._loaded and not self.storage.changed_on_disk():
+            return
+        self.cache = self.storage.read()
+        instrumentation.count("snapshot.reload")
+        self._loaded = True
+        self.version += 1
+        self._base_version = self.version
+        self._table_versions.clear()
+        self._table_refs = dict(self.cache or {})
+
+    def read(self) -> Optional[Dict[str, Dict[str, Any]]]:
+        self._refresh()
+        return self.cache
+
+    def write(self, data: Dict[str, Dict[str, Any]]) -> None:
+        if self._uow_depth:
+            self._uow_dirty = True
+        else:
+            self.storage.write(data)
+        self.cache = data
+        self.version += 1
+        # TinyDB ersetzt beim Schreiben nur das dict der geänderten Tabelle
+        for name, table in data.items():
+            if self._table_refs.get(name) is not table:
+                self._table_versions[name] = self.version
+        self._table_refs = dict(data)
+
+    @contextmanager
+    def unit_of_work(self) -> Iterator[None]:
+        """
+        Unit of Work auf einem Snapshot, hält den Lock bis zum Ende (verschachtelbar):
+          - die Datei wird zu Beginn einmal geprüft, alle Lesezugriffe im Block sehen denselben Stand
+          - alle Schreibvorgänge gehen am Ende als ein Write nach unten (Durability.COMMIT: ein Schreiben auf die Platte)
+          - bei einer Exception gilt wieder der Stand vor dem Block
+        Ereignisse des Änderungsfeeds gehen erst nach dem Write hinaus, bei Rollback gar nicht.
+        """
+        # deferred() außen: veröffentlicht wird erst nach dem Freigeben von Lock und Dateisperre,
+        # ein Abonnent darf also selbst (auch aus einem anderen Thread) schreiben
+        with change_feed.deferred(), self.lock:
+            outermost = not self._uow_depth
+            if outermost:
+                # vor dem Prüfen der Datei: bis zum Write am Ende committet kein anderer Prozess
+                self.storage.acquire()
+            try:
+                if outermost:
+                    self._refresh()
+                    before = dict(self.cache or {})
+                    self._uow_active = True
+                self._uow_depth += 1
+                try:
+                    yield
+                    if outermost and self._uow_dirty:
+                        self.storage.write(self.cache)
+                        self._uow_dirty = False
+                except BaseException:
+                    if outermost and self._uow_dirty:
+                        self._rollback(before)
+                    raise
+                finally:
+                    self._uow_depth -= 1
+                    if outermost:
+                        self._uow_active = False
+            finally:
+                if outermost:
+                    self.storage.release()
+
+    def _rollback(self, before: Dict[str, Dict[str, Any]]) -> None:
+        # Tabellen-dicts werden beim Schreiben ersetzt, Dokumente nicht verändert (SnapshotTable: Copy-on-Write),
+        # die alten Referenzen sind also noch der alte Stand. In-place, weil WriteBehind dasselbe dict puffern kann.
+        current = self.cache or {}
+        changed = [name for name in set(current) | set(before) if current.get(name) is not before.get(name)]
+        if self.cache is not None:
+            self.cache.clear()
+            self.cache.update(before)
+        # neue Versionsnummer: Indizes, die den verworfenen Stand gesehen haben, bauen neu auf
+        self.version += 1
+        for name in changed:
+            self._table_versions[name] = self.version
+        self._table_refs = dict(before)
+        self._uow_dirty = False
+
+    def table_version(self, name: Optional[str] = None) -> int:
+        self._refresh()
+        if name is None:
+            return self.version
+        return max(self._table_versions.get(name, 0), self._base_version)
+
+
+class SnapshotTable(Table):
+    """
+    Table für SnapshotCache-Storages: Query-Cache und next_id werden verworfen,
+    wenn die Tabelle von außen (anderer Prozess) geändert wurde.
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self._synced_version: Optional[int] = None
+
+    def _sync(self) -> None:
+        version = self._storage.table_version(self.name)
+        if version != self._synced_version:
+            self.clear_cache()
+            self._next_id = None
+            self._synced_version = version
+
+    def search(self, cond):
+        self._sync()
+        instrumentation.count("table.search")
+        return super().search(cond)
+
+    def __iter__(self):
+        # Table.all(), list(table) und Index-Neuaufbau laufen hierüber
+        instrumentation.count("table.scan")
+        return super().__iter__()
+
+    def _get_next_id(self):
+        self._sync()
+        return super()._get_next_id()
+
+    def raw_rows(self) -> Iterator[Mapping[str, Any]]:
+        """Dokumente ohne Kopie in Document-Objekte – nur lesen, nicht verändern (Bulk-Hydration)."""
+        instrumentation.count("table.scan")
+        return iter(self._read_table().values())
+
+    def raw_table(self) -> Mapping[str, Mapping[str, Any]]:
+        """Aktueller Stand als str(doc_id) -> Dokument, ohne Kopie – nur lesen (Serializable.query)."""
+        return self._read_table()
+
+    def insert(self, document):
+        # doc_id erst im Read-Modify-Write vergeben: Table.insert zählt vor dem Lesen hoch,
+        # dazwischen kann ein anderer Prozess dieselbe doc_id belegt haben
+        if isinstance(document, Mapping) and not isinstance(document, self.document_class):
+            return self.write_many({}, [document])[0]
+        return super().insert(document)
+
+    def update(self, fields, cond=None, doc_ids=None):
+        # Updates per doc_id über write_many (Copy-on-Write, siehe dort)
+        if doc_ids is not None and not callable(fields):
+            doc_ids = list(doc_ids)
+            self.write_many({doc_id: fields for doc_id in doc_ids})
+            return doc_ids
+        return super().update(fields, cond, doc_ids)
+
+    def write_many(
+        self,
+        updates: Mapping[int, Mapping[str, Any]],
+        inserts: Sequence[Mapping[str, Any]] = (),
+    ) -> List[int]:
+        """
+        Bulk-Schreiben in einem Read-Modify-Write: `updates` (doc_id -> Felder)
+        und `inserts` (neue Dokumente). Liefert die doc_ids der neuen Dokumente.
+        """
+        doc_ids: List[int] = []
+
+        def updater(table: dict) -> None:
+            for doc_id, fields in updates.items():
+                if doc_id in table:
+                    # Copy-on-Write: der alte Stand bleibt für SnapshotCache._rollback erhalten
+                    table[doc_id] = {**table[doc_id], **fields}
+            for document in inserts:
+                doc_id = self._get_next_id()
+                table[doc_id] = dict(document)
+                doc_ids.append(doc_id)
+
+        self._update_table(updater)
+        return doc_ids
+
+    def _update_table(self, updater) -> None:
+        # als Unit of Work: ein Snapshot vom Lesen bis zum Schreiben. Lädt z. B. _get_next_id() mittendrin neu,
+        # setzt der Commit sonst auf einem älteren Stand auf als dem zuletzt gelesenen (JSONFileStorage.write).
+        with self._storage.unit_of_work():
+            # zuerst abgleichen: wurde seit dem letzten Schreiben neu geladen (fremder Commit), ist next_id veraltet
+            self._sync()
+            super()._update_table(updater)
+            # eigener Schreibvorgang: Cache ist bereits geleert, next_id bleibt gültig
+            self._synced_version = self._storage.table_version(self.name)
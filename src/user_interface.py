@@ -1,21 +1,43 @@
 ﻿# user_interface.py
 import streamlit as st
-from datetime import datetime, timezone, date
+from datetime import datetime, timedelta, timezone, date
+import instrumentation
 from users import User
 from devices import Device
-from repositories import UserRepo, DeviceRepo, ReservationRepo 
-from reservation_service import ReservationService, ReservationError
-from db import now_utc, DB_FILE
-import inspect
+from cached_reads import (
+    analytics_frames, list_devices, list_users, occupancy_matrix, page_devices, page_reservations_for_device,
+    page_users, repos, reservation_service, retention_job,
+)
+from reservation_service import DeleteMode, ReservationError
 
 
 st.set_page_config(page_title="Geräte- & Nutzerverwaltung", layout="wide")
 
-user_repo = UserRepo()
-device_repo = DeviceRepo()
+PAGE_SIZE = 25
+
+
+def page_offset(key: str, total: int, page_size: int = PAGE_SIZE) -> int:
+    """Seitenauswahl für eine Tabelle, liefert den Offset der gewählten Seite."""
+    pages = max(1, -(-total // page_size))
+    if pages == 1:
+        return 0
+    # nach Löschungen kann die gemerkte Seite nicht mehr existieren
+    if st.session_state.get(key, 1) > pages:
+        st.session_state[key] = pages
+    page_no = st.number_input(f"Seite (1–{pages}, {total} Einträge)", min_value=1, max_value=pages, step=1, key=key)
+    return (int(page_no) - 1) * page_size
+
+# einmal pro Prozess (cache_resource), die Datenbank wird erst beim ersten Lesen geöffnet
+user_repo, device_repo, res_repo = repos()
+# abgelaufene Reservierungen ins Archiv, höchstens einmal pro Tag
+retention_job(date.today())
 
 st.sidebar.title("Navigation")
-page = st.sidebar.radio("Bereich", ["Nutzerverwaltung", "Geräteverwaltung", "Reservierungen"])
+pages = ["Nutzerverwaltung", "Geräteverwaltung", "Reservierungen", "Auslastung", "Belegungskalender"]
+# versteckt: nur mit ?diag=1 in der URL oder eingeschalteter Messung (DB_INSTRUMENTATION=1)
+if st.query_params.get("diag") == "1" or instrumentation.enabled():
+    pages.append("Diagnostik")
+page = st.sidebar.radio("Bereich", pages)
 
 # Nutzerverwaltung
 if page == "Nutzerverwaltung":
@@ -39,36 +61,56 @@ if page == "Nutzerverwaltung":
             st.rerun()
 
     st.subheader("Alle Nutzer")
-    users = user_repo.list_all()
-    if not users:
+    total = user_repo.count()
+    if not total:
         st.info("Noch keine Nutzer vorhanden.")
     else:
-        for u in users:
-            cols = st.columns([4, 6, 2])
-            cols[0].write(u.id)
-            cols[1].write(u.name)
-            if cols[2].button("Löschen", key=f"del_user_{u.id}"):
-                user_repo.delete(u.id)
+        offset = page_offset("users_page", total)
+        user_page = page_users(user_repo, offset, PAGE_SIZE)
+        event = st.dataframe(
+            [{"E-Mail": u.id, "Name": u.name} for u in user_page.items],
+            hide_index=True,
+            on_select="rerun",
+            selection_mode="multi-row",
+            key=f"users_table_{offset}",
+        )
+        selected = [user_page.items[i] for i in event.selection.rows]
+        delete_modes = {
+            "Nur ohne Geräte und Reservierungen": DeleteMode.RESTRICT,
+            "Geräte und Reservierungen mitlöschen": DeleteMode.CASCADE,
+            "An anderen Nutzer übertragen": DeleteMode.REASSIGN,
+        }
+        mode = delete_modes[st.radio("Beim Löschen", list(delete_modes), horizontal=True, key="del_users_mode")]
+        reassign_to = None
+        if mode is DeleteMode.REASSIGN:
+            selected_ids = {u.id for u in selected}
+            others = [u for u in list_users(user_repo) if u.id not in selected_ids]
+            target = st.selectbox("Übernehmen durch", others, format_func=lambda u: f"{u.name} ({u.id})", key="del_users_target")
+            reassign_to = target.id if target else None
+        if st.button(f"Ausgewählte löschen ({len(selected)})", disabled=not selected, key="del_users"):
+            try:
+                reservation_service().delete_users([u.id for u in selected], mode, reassign_to)
                 st.rerun()
+            except ReservationError as e:
+                st.error(str(e))
 
 # Geräteverwaltung
 elif page == "Geräteverwaltung":
     st.header("Geräteverwaltung")
 
-    users = user_repo.list_all()
+    users = list_users(user_repo)
     if not users:
         st.warning("Lege zuerst mindestens einen Nutzer an (Verantwortliche Person).")
         st.stop()
 
-    MAX_IDS = 20
+    max_ids = device_repo.MAX_IDS
 
-    # Geräte laden + freie IDs 1..20 berechnen
-    devices = device_repo.list_all()
-    existing_ids = {int(d.id) for d in devices if d.id is not None}
-    free_ids = [i for i in range(1, MAX_IDS + 1) if i not in existing_ids]
+    # Geräte laden, nächste freie Inventarnummer vom Allokator des Repos
+    devices = list_devices(device_repo)
+    next_free_id = device_repo.next_free_id()
 
     # Auswahl: neu oder bestehend
-    device_ids = ["(neu)"] + [str(d.id) for d in sorted(devices, key=lambda x: int(x.id))]
+    device_ids = ["(neu)"] + [str(d.id) for d in devices]
     selected = st.selectbox("Gerät auswählen", device_ids)
 
     if selected == "(neu)":
@@ -97,23 +139,25 @@ elif page == "Geräteverwaltung":
     eol_date = st.date_input("End of Life", value=eol_default_date, disabled=not has_eol, key="eol_date")
 
     with st.form("device_form"):
-        # Inventarnummer: beim Anlegen nur freie IDs 1..20 auswählbar
+        # Inventarnummer: beim Anlegen ist die kleinste freie vorausgewählt
         if is_new:
-            if not free_ids:
-                st.error("Alle Inventarnummern 1–20 sind bereits vergeben.")
+            if next_free_id is None:
+                st.error(f"Alle Inventarnummern 1–{max_ids} sind bereits vergeben.")
                 st.stop()
 
-            inv = st.selectbox(
-                "Inventarnummer (ID) – frei (1–20)",
-                options=free_ids,
-                index=0,
-                help="Es werden nur freie IDs aus 1–20 angezeigt.",
+            inv = st.number_input(
+                f"Inventarnummer (ID) – frei (1–{max_ids})",
+                min_value=1,
+                max_value=max_ids,
+                step=1,
+                value=next_free_id,
+                help=f"Vorgeschlagen ist die kleinste freie Nummer aus 1–{max_ids}.",
             )
         else:
             inv = st.number_input(
                 "Inventarnummer (ID)",
                 min_value=1,
-                max_value=MAX_IDS,
+                max_value=max_ids,
                 step=1,
                 value=int(current.id),
                 disabled=True,
@@ -133,12 +177,12 @@ elif page == "Geräteverwaltung":
     if save:
         inv_int = int(inv)
 
-        if not (1 <= inv_int <= MAX_IDS):
-            st.error("Inventarnummer muss zwischen 1 und 20 liegen.")
+        if not (1 <= inv_int <= max_ids):
+            st.error(f"Inventarnummer muss zwischen 1 und {max_ids} liegen.")
             st.stop()
 
         # Doppelte ID beim Neuanlegen verhindern
-        if is_new and inv_int in existing_ids:
+        if is_new and not device_repo.is_free(inv_int):
             st.error("Inventarnummer bereits vergeben. Speichern abgebrochen.")
             st.stop()
 
@@ -165,23 +209,35 @@ elif page == "Geräteverwaltung":
         except ValueError as e:
             st.error(str(e))
 
+    if not is_new:
+        cascade = st.checkbox("Reservierungen des Geräts mitlöschen", key="del_device_cascade")
+        if st.button("Gerät löschen", key="del_device"):
+            try:
+                reservation_service().delete_devices([int(current.id)], DeleteMode.CASCADE if cascade else DeleteMode.RESTRICT)
+                st.rerun()
+            except ReservationError as e:
+                st.error(str(e))
+
 
     st.subheader("Alle Geräte")
-    devices = device_repo.list_all()
-    if not devices:
+    total = device_repo.count()
+    if not total:
         st.info("Noch keine Geräte vorhanden.")
     else:
-        for d in sorted(devices, key=lambda x: int(x.id)):
-            st.write(f"**{d.id}** – {d.name} | Verantwortlich: {d.responsible_user_id}")
+        offset = page_offset("devices_page", total)
+        device_page = page_devices(device_repo, offset, PAGE_SIZE)
+        st.dataframe(
+            [{"ID": int(d.id), "Name": d.name, "Verantwortlich": d.responsible_user_id} for d in device_page.items],
+            hide_index=True,
+        )
 
 elif page == "Reservierungen":
     st.header("Reservierungen")
 
-    res_service = ReservationService()
-    res_repo = ReservationRepo()
+    res_service = reservation_service()
 
-    users = user_repo.list_all()
-    devices = device_repo.list_all()
+    users = list_users(user_repo)
+    devices = list_devices(device_repo)
 
     if not users or not devices:
         st.info("Bitte zuerst Nutzer und Geräte anlegen.")
@@ -191,18 +247,111 @@ elif page == "Reservierungen":
     user = st.selectbox("User wählen", options=users, format_func=lambda u: f"{u.id} – {u.name}")
 
     st.subheader("Bestehende Reservierungen für dieses Gerät")
-    existing = sorted(res_repo.list_for_device(int(device.id)), key=lambda r: r.start_date)
-    if not existing:
+    # Archiv (abgelaufene Reservierungen) nur auf Wunsch laden
+    show_past = st.checkbox("Vergangene (archivierte) anzeigen", key="show_archive")
+    total = page_reservations_for_device(res_repo, int(device.id), 0, 0, show_past).total
+    if not total:
         st.write("Keine Reservierungen vorhanden.")
     else:
-        for r in existing:
-            cols = st.columns([3, 3, 3, 1])
-            cols[0].write(r.user_id)
-            cols[1].write(str(r.start_date))
-            cols[2].write(str(r.end_date))
-            if cols[3].button("X", key=f"del_res_{r.id}"):
+        offset = page_offset(f"res_page_{device.id}_{show_past}", total)
+        reservation_page = page_reservations_for_device(res_repo, int(device.id), offset, PAGE_SIZE, show_past)
+        event = st.dataframe(
+            [{"User": r.user_id, "Start": r.start_date, "Ende": r.end_date} for r in reservation_page.items],
+            hide_index=True,
+            on_select="rerun",
+            selection_mode="multi-row",
+            key=f"res_table_{device.id}_{offset}_{show_past}",
+        )
+        selected = [reservation_page.items[i] for i in event.selection.rows]
+        if st.button(f"Ausgewählte stornieren ({len(selected)})", disabled=not selected, key="del_res"):
+            for r in selected:
                 res_service.cancel(r.id)
-                st.rerun()
+            st.rerun()
+
+    series_list = res_repo.series_for_devices([int(device.id)])[int(device.id)]
+    if series_list:
+        st.subheader("Serienbuchungen für dieses Gerät")
+        event = st.dataframe(
+            [
+                {"User": s.user_id, "Erster Termin": s.start_date, "Dauer (h)": s.duration / timedelta(hours=1), "Wiederholung": s.describe()}
+                for s in series_list
+            ],
+            hide_index=True,
+            on_select="rerun",
+            selection_mode="multi-row",
+            key=f"series_table_{device.id}",
+        )
+        selected = [series_list[i] for i in event.selection.rows]
+        if st.button(f"Ausgewählte Serien stornieren ({len(selected)})", disabled=not selected, key="del_series"):
+            for s in selected:
+                res_service.cancel_series(s.id)
+            st.rerun()
+
+    with st.expander("Belegung im Zeitraum (inkl. Serientermine)"):
+        c1, c2 = st.columns(2)
+        b_start = c1.date_input("Von", key="b_start")
+        b_end = c2.date_input("Bis (einschließlich)", value=date.today() + timedelta(days=28), key="b_end")
+        try:
+            bookings = res_service.list_for_device_window(
+                int(device.id),
+                datetime.combine(b_start, datetime.min.time(), tzinfo=timezone.utc),
+                datetime.combine(b_end + timedelta(days=1), datetime.min.time(), tzinfo=timezone.utc),
+            )
+            if bookings:
+                st.dataframe(
+                    [{"User": r.user_id, "Start": r.start_date, "Ende": r.end_date, "Serie": "#" in r.id} for r in bookings],
+                    hide_index=True,
+                )
+            else:
+                st.write("Keine Buchungen im Zeitraum.")
+        except ReservationError as e:
+            st.error(str(e))
+
+    with st.expander("Verfügbarkeit suchen"):
+        tab_devices, tab_slots = st.tabs(["Freie Geräte", "Freie Zeitfenster"])
+
+        with tab_devices, st.form("search_devices"):
+            c1, c2, c3, c4 = st.columns(4)
+            q_start_d = c1.date_input("Von", key="q_start_d")
+            q_start_t = c2.time_input("Startzeit", key="q_start_t")
+            q_end_d = c3.date_input("Bis", key="q_end_d")
+            q_end_t = c4.time_input("Endzeit", key="q_end_t")
+            if st.form_submit_button("Freie Geräte suchen"):
+                q_start = datetime.combine(q_start_d, q_start_t, tzinfo=timezone.utc)
+                q_end = datetime.combine(q_end_d, q_end_t, tzinfo=timezone.utc)
+                try:
+                    available = res_service.find_available_devices(q_start, q_end)
+                    if available:
+                        st.dataframe(
+                            [{"ID": int(d.id), "Name": d.name, "Verantwortlich": d.responsible_user_id} for d in available],
+                            hide_index=True,
+                        )
+                    else:
+                        st.info("Kein Gerät ist im gewählten Zeitraum frei.")
+                except ReservationError as e:
+                    st.error(str(e))
+
+        with tab_slots, st.form("search_slots"):
+            c1, c2, c3 = st.columns(3)
+            w_start = c1.date_input("Von", key="w_start")
+            w_end = c2.date_input("Bis (einschließlich)", value=date.today() + timedelta(days=7), key="w_end")
+            min_hours = c3.number_input("Mindestdauer (Stunden)", min_value=0.0, value=1.0, step=0.5)
+            if st.form_submit_button(f"Freie Zeitfenster für Gerät {device.id} suchen"):
+                window = (
+                    datetime.combine(w_start, datetime.min.time(), tzinfo=timezone.utc),
+                    datetime.combine(w_end + timedelta(days=1), datetime.min.time(), tzinfo=timezone.utc),
+                )
+                try:
+                    slots = res_service.find_free_slots(int(device.id), window, timedelta(hours=min_hours))
+                    if slots:
+                        st.dataframe(
+                            [{"Start": s, "Ende": e, "Stunden": round((e - s) / timedelta(hours=1), 2)} for s, e in slots],
+                            hide_index=True,
+                        )
+                    else:
+                        st.info("Kein passendes freies Zeitfenster gefunden.")
+                except ReservationError as e:
+                    st.error(str(e))
 
     st.subheader("Neue Reservierung")
     with st.form("create_reservation"):
@@ -223,3 +372,193 @@ elif page == "Reservierungen":
             st.error(str(e))
         except ValueError as e:
             st.error(str(e))
+
+    st.subheader("Neue Serienbuchung")
+    limit_by_count = st.radio("Serie begrenzen durch", ["Anzahl Termine", "Enddatum"], horizontal=True, key="series_limit") == "Anzahl Termine"
+    with st.form("create_series"):
+        c1, c2, c3 = st.columns(3)
+        s_date = c1.date_input("Erster Termin", key="s_date")
+        s_start_t = c2.time_input("Startzeit", key="s_start_t")
+        s_end_t = c3.time_input("Endzeit", key="s_end_t")
+        c1, c2, c3 = st.columns(3)
+        frequencies = {"wöchentlich": "weekly", "täglich": "daily"}
+        s_frequency = c1.selectbox("Wiederholung", list(frequencies))
+        s_interval = c2.number_input("Intervall (jede n-te Woche/Tag)", min_value=1, value=1, step=1)
+        if limit_by_count:
+            s_count = c3.number_input("Anzahl Termine", min_value=1, value=15, step=1)
+        else:
+            s_until = c3.date_input("Letzter Termin spätestens am", value=date.today() + timedelta(weeks=15), key="s_until")
+        series_submitted = st.form_submit_button("Serie reservieren")
+
+    if series_submitted:
+        try:
+            series = res_service.create_series(
+                user.id,
+                int(device.id),
+                datetime.combine(s_date, s_start_t, tzinfo=timezone.utc),
+                datetime.combine(s_date, s_end_t, tzinfo=timezone.utc),
+                frequency=frequencies[s_frequency],
+                interval=int(s_interval),
+                count=int(s_count) if limit_by_count else None,
+                until=None if limit_by_count else datetime.combine(s_until, datetime.max.time(), tzinfo=timezone.utc),
+            )
+            st.success(f"Serie angelegt ({series.last_index + 1} Termine).")
+            st.rerun()
+        except ReservationError as e:
+            st.error(str(e))
+
+elif page == "Auslastung":
+    # pandas/pyarrow nur auf dieser Seite laden
+    import analytics
+
+    st.header("Auslastung")
+
+    users_df, devices_df, res_df, series_df = analytics_frames(user_repo, device_repo, res_repo)
+    if res_df.empty and series_df.empty:
+        st.info("Noch keine Reservierungen vorhanden.")
+        st.stop()
+
+    col_from, col_to = st.columns(2)
+    from_d = col_from.date_input("Von", value=date.today() - timedelta(days=365))
+    to_d = col_to.date_input("Bis (einschließlich)", value=date.today())
+    if to_d < from_d:
+        st.error("Das Enddatum liegt vor dem Startdatum.")
+        st.stop()
+
+    start = datetime.combine(from_d, datetime.min.time(), tzinfo=timezone.utc)
+    end = datetime.combine(to_d + timedelta(days=1), datetime.min.time(), tzinfo=timezone.utc)
+    # Serienbuchungen zählen mit ihren Terminen im Zeitraum
+    window = analytics.bookings_in_window(res_df, series_df, start, end)
+    report = analytics.device_utilization(window, devices_df, start, end)
+
+    c1, c2, c3 = st.columns(3)
+    c1.metric("Reservierungen", len(window), help="Einzelbuchungen und Termine von Serienbuchungen im Zeitraum")
+    c2.metric("Gebuchte Stunden", f"{report['hours'].sum():,.0f}")
+    c3.metric("Ø Auslastung", f"{report['utilization'].mean():.1%}" if len(report) else "–")
+
+    st.subheader("Pro Gerät")
+    st.dataframe(
+        report.rename(columns={
+            "device_id": "ID", "name": "Name", "hours": "Stunden", "bookings": "Reservierungen",
+            "peak": "Max. gleichzeitig", "utilization": "Auslastung",
+        }),
+        hide_index=True,
+        column_config={
+            "Stunden": st.column_config.NumberColumn(format="%.1f"),
+            "Auslastung": st.column_config.ProgressColumn(format="percent", min_value=0.0, max_value=1.0),
+        },
+    )
+
+    st.subheader("Gebuchte Stunden pro Woche")
+    weekly = analytics.booked_hours_per_week(window)
+    st.bar_chart(weekly.pivot(index="week", columns="device_id", values="hours").fillna(0.0))
+
+    st.subheader("Top-Nutzer")
+    st.dataframe(
+        analytics.top_users(window, users_df)[["user_id", "name", "hours", "bookings"]].rename(columns={
+            "user_id": "E-Mail", "name": "Name", "hours": "Stunden", "bookings": "Reservierungen",
+        }),
+        hide_index=True,
+        column_config={"Stunden": st.column_config.NumberColumn(format="%.1f")},
+    )
+
+elif page == "Belegungskalender":
+    # altair/pandas nur auf dieser Seite laden
+    import altair as alt
+    import pandas as pd
+
+    st.header("Belegungskalender")
+
+    col_by, col_from, col_to = st.columns(3)
+    by_device = col_by.radio("Zeilen", ["Geräte", "Nutzer"], horizontal=True) == "Geräte"
+    from_d = col_from.date_input("Von", value=date.today() - timedelta(days=90), key="calendar_from")
+    to_d = col_to.date_input("Bis (einschließlich)", value=date.today() + timedelta(days=30), key="calendar_to")
+    if to_d < from_d:
+        st.error("Das Enddatum liegt vor dem Startdatum.")
+        st.stop()
+
+    start = datetime.combine(from_d, datetime.min.time(), tzinfo=timezone.utc)
+    end = datetime.combine(to_d + timedelta(days=1), datetime.min.time(), tzinfo=timezone.utc)
+    matrix = occupancy_matrix(res_repo, "device_id" if by_device else "user_id", start, end)
+
+    if by_device:
+        # alle Geräte, auch ohne Buchung im Zeitraum
+        names = {int(d.id): f"{int(d.id)} – {d.name}" for d in list_devices(device_repo)}
+        matrix = matrix.reindex(sorted(names), fill_value=0.0)
+        labels = [names[device_id] for device_id in matrix.index]
+    else:
+        limit = st.slider("Nutzer mit den meisten Stunden", min_value=5, max_value=100, value=25)
+        matrix = matrix.loc[matrix.sum(axis=1).nlargest(limit).index]
+        names = {u.id: u.name for u in list_users(user_repo)}
+        labels = [f"{names.get(user_id, user_id)} ({user_id})" for user_id in matrix.index]
+
+    if matrix.empty or not matrix.to_numpy().any():
+        st.info("Keine Reservierungen im Zeitraum.")
+        st.stop()
+
+    days = matrix.columns.tz_convert(None)
+    cells = pd.DataFrame({
+        "Zeile": [label for label in labels for _ in days],
+        "Tag": list(days) * len(labels),
+        "Stunden": matrix.to_numpy().ravel(),
+    })
+    cells["Ende"] = cells["Tag"] + pd.Timedelta(days=1)
+    st.caption(f"Belegte Stunden pro Tag (UTC), {cells['Stunden'].sum():,.0f} Stunden insgesamt")
+    st.altair_chart(
+        alt.Chart(cells)
+        .mark_rect()
+        .encode(
+            x=alt.X("Tag:T", title=None, scale=alt.Scale(type="utc"), axis=alt.Axis(format="%d.%m.%y")),
+            x2="Ende:T",
+            y=alt.Y("Zeile:N", title=None, sort=labels),
+            color=alt.Color("Stunden:Q", scale=alt.Scale(scheme="blues", domain=[0, 24])),
+            tooltip=[
+                alt.Tooltip("Zeile:N"),
+                alt.Tooltip("utcyearmonthdate(Tag):T", title="Tag", format="%d.%m.%Y"),
+                alt.Tooltip("Stunden:Q", format=".1f"),
+            ],
+        )
+        .properties(height=max(120, 20 * len(labels)))
+    )
+
+elif page == "Diagnostik":
+    st.header("Diagnostik")
+
+    active = st.toggle("Messung aktiv", value=instrumentation.enabled())
+    if active != instrumentation.enabled():
+        instrumentation.enable() if active else instrumentation.disable()
+    if st.button("Zähler zurücksetzen"):
+        instrumentation.reset()
+
+    stats = instrumentation.snapshot()
+    if not stats["ops"]:
+        st.info("Noch keine Messwerte. Messung einschalten und die Anwendung benutzen.")
+        st.stop()
+
+    st.subheader("Operationen")
+    ops = sorted(stats["ops"].items(), key=lambda item: item[1]["total_ms"], reverse=True)
+    st.dataframe(
+        [
+            {
+                "Operation": name,
+                "Aufrufe": op["calls"],
+                "Σ ms": op["total_ms"],
+                "Ø ms": op["mean_ms"],
+                "p50 ms": op["p50_ms"],
+                "p95 ms": op["p95_ms"],
+                "max ms": op["max_ms"],
+                "Scans": op["counters"].get("table.scan", 0),
+                "Datei-Writes": op["counters"].get("file.write", 0),
+                "Bytes geschrieben": op["counters"].get("file.bytes_written", 0),
+            }
+            for name, op in ops
+        ],
+        hide_index=True,
+    )
+
+    st.subheader("Zähler gesamt")
+    st.dataframe([{"Zähler": k, "Wert": v} for k, v in sorted(stats["counters"].items())], hide_index=True)
+
+    st.subheader("Latenz-Histogramm")
+    selected_op = st.selectbox("Operation", [name for name, _ in ops])
+    st.bar_chart(stats["ops"][selected_op]["histogram"])
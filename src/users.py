@@ -1,12 +1,16 @@
 # src/users.py
 from __future__ import annotations
+from collections import namedtuple
 from typing import Any, Dict
-from datetime import datetime
 
 from serializable import Serializable  # <-- ohne src.
 
 class User(Serializable):
+    __slots__ = ("name",)
+
     table_name = "users"
+    fields = ("id", "name", "creation_date", "last_update")
+    Row = namedtuple("UserRow", fields)
 
     def __init__(self, id: str, name: str):
         super().__init__(id=id)
@@ -22,7 +26,8 @@ class User(Serializable):
 
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> "User":
-        obj = cls(id=data["id"], name=data["name"])
-        obj.creation_date = data.get("creation_date", datetime.now())
-        obj.last_update = data.get("last_update", datetime.now())
+        obj = cls.__new__(cls)
+        obj.id = data["id"]
+        obj.name = data["name"]
+        obj._set_timestamps(data)
         return obj
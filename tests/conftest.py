@@ -0,0 +1,60 @@
+# tests/conftest.py
+# Tests laufen gegen src/ (wie die App: Module liegen flach im Suchpfad) und nie gegen die echte Datenbank:
+# jeder Test bekommt über `repos` eine eigene Datenbankdatei (TinyDB bzw. SQLite) im tmp_path.
+import os
+import sys
+import tempfile
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+sys.path.insert(0, SRC)
+# Fallback für Module, die beim Import einen Pfad festhalten; Tests setzen ihren eigenen per Fixture
+os.environ.setdefault("DB_FILE", os.path.join(tempfile.mkdtemp(prefix="tests-"), "database.json"))
+os.environ.setdefault("DB_SQLITE_FILE", os.path.join(os.path.dirname(os.environ["DB_FILE"]), "database.sqlite3"))
+
+from datetime import datetime, timezone  # noqa: E402
+
+import pytest  # noqa: E402
+
+import db  # noqa: E402
+from devices import Device  # noqa: E402
+from users import User  # noqa: E402
+
+T0 = datetime(2031, 1, 6, 8, tzinfo=timezone.utc)  # Montag, weit nach jedem Archivstand
+
+
+@pytest.fixture
+def db_file(tmp_path, monkeypatch) -> str:
+    """Eigene database.json für den Test (get_db(), Archivpartitionen und Serializable folgen db.DB_FILE)."""
+    path = str(tmp_path / "database.json")
+    monkeypatch.setattr(db, "DB_FILE", path)
+    monkeypatch.setattr(db.DatabaseConnector, "_DatabaseConnector__instance", None)
+    return path
+
+
+def make_repos(backend: str, tmp_path) -> tuple:
+    if backend == "tinydb":
+        from repositories import create_repos
+        return create_repos("tinydb")
+    from sqlite_repositories import SqliteDeviceRepo, SqliteReservationRepo, SqliteUserRepo
+    path = str(tmp_path / "database.sqlite3")
+    return SqliteUserRepo(path), SqliteDeviceRepo(path), SqliteReservationRepo(path)
+
+
+@pytest.fixture(params=["tinydb", "sqlite"])
+def backend(request) -> str:
+    return request.param
+
+
+@pytest.fixture
+def repos(backend, db_file, tmp_path) -> tuple:
+    """(user_repo, device_repo, res_repo) auf leerer Datenbank, ein Nutzer "u@x" und die Geräte 1–3."""
+    user_repo, device_repo, res_repo = make_repos(backend, tmp_path)
+    user_repo.upsert_many([User(id="u@x", name="U"), User(id="v@x", name="V")])
+    device_repo.upsert_many([Device(id=str(i), name=f"D{i}", responsible_user_id="u@x") for i in (1, 2, 3)])
+    return user_repo, device_repo, res_repo
+
+
+@pytest.fixture
+def service(repos):
+    from reservation_service import ReservationService
+    return ReservationService(repos)
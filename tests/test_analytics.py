@@ -0,0 +1,76 @@
+import random
+from datetime import timedelta
+
+import pandas as pd
+import pytest
+
+import analytics
+from reservation_service import ReservationError
+
+from .conftest import T0
+
+H = timedelta(hours=1)
+
+
+def naive_occupancy(bookings, by, start, end, bucket):
+    """Stunden pro (Zeile, Fensterbeginn): jede Buchung gegen jedes Fenster geschnitten."""
+    hours = {}
+    lo = start
+    while lo < end:
+        hi = min(lo + bucket, end)
+        for booking in bookings:
+            overlap = min(booking.end_date, hi) - max(booking.start_date, lo)
+            if overlap > timedelta(0):
+                key = (getattr(booking, by), lo)
+                hours[key] = hours.get(key, 0.0) + overlap / H
+        lo += bucket
+    return hours
+
+
+@pytest.fixture
+def booked(service, repos):
+    _, _, res_repo = repos
+    rng = random.Random(25)
+    service.create_series("v@x", 3, T0 + 2 * H, T0 + 5 * H, frequency="daily", interval=2, count=12)
+    service.create_series("u@x", 2, T0 + 30 * H, T0 + 31 * H, frequency="weekly", until=T0 + timedelta(days=40))
+    for _ in range(120):
+        start = T0 + timedelta(minutes=15 * rng.randrange(-4 * 24 * 3, 4 * 24 * 40))
+        try:
+            service.create(rng.choice(["u@x", "v@x"]), rng.choice([1, 2, 3]), start, start + timedelta(minutes=15 * rng.randint(1, 200)))
+        except ReservationError:
+            pass
+    singles = res_repo.list_all()
+    series = res_repo.list_series()
+    frames = (analytics.reservations_table(res_repo).to_pandas(), analytics.series_table(res_repo).to_pandas())
+    return singles, series, frames
+
+
+@pytest.mark.parametrize("by", ["device_id", "user_id"])
+@pytest.mark.parametrize("bucket", [timedelta(days=1), timedelta(hours=5), timedelta(days=7)])
+def test_occupancy_matches_naive_reference(booked, by, bucket):
+    singles, series, (res, series_frame) = booked
+    rng = random.Random(f"{by}{bucket}")
+    for _ in range(8):
+        start = T0 + timedelta(minutes=30 * rng.randrange(-48, 48 * 30))
+        end = start + timedelta(minutes=30 * rng.randrange(1, 48 * 20))  # letztes Fenster meist angeschnitten
+        bookings = singles + [o for s in series for o in s.occurrences(start, end)]
+        expected = naive_occupancy(bookings, by, start, end, bucket)
+
+        got = analytics.occupancy(res, by, start, end, bucket, series=series_frame)
+        assert list(got.columns) == list(pd.date_range(start, end, freq=bucket, inclusive="left"))
+        actual = {(label, column.to_pydatetime()): value for label, row in got.iterrows() for column, value in row.items() if value}
+        assert actual.keys() == expected.keys()
+        for key, value in expected.items():
+            assert actual[key] == pytest.approx(value)
+
+
+def test_booking_ending_exactly_at_end(service, repos):
+    _, _, res_repo = repos
+    service.create("u@x", 1, T0 + 22 * H, T0 + 48 * H)
+    res = analytics.reservations_table(res_repo).to_pandas()
+    got = analytics.occupancy(res, "device_id", T0, T0 + 48 * H, timedelta(days=1))
+    assert got.loc[1].tolist() == [2.0, 24.0]
+    # ohne Serien-Frame zählen nur Einzelbuchungen, leeres Fenster ergibt eine leere Matrix
+    assert analytics.occupancy(res, "device_id", T0 + 48 * H, T0 + 72 * H).empty
+    with pytest.raises(ValueError):
+        analytics.occupancy(res, "device_id", T0, T0 + H, timedelta(0))
@@ -0,0 +1,80 @@
+import asyncio
+import json
+
+import pytest
+
+import api_server
+from async_service import AsyncReservationService
+
+
+def exchange(service, *requests: bytes) -> list[bytes]:
+    """Jede Anfrage über eine eigene Verbindung an einen lokalen Server, Antwort bis der Server schließt."""
+
+    async def run() -> list[bytes]:
+        async with AsyncReservationService(service) as api:
+            server = await asyncio.start_server(lambda r, w: api_server.handle_connection(api, r, w), "127.0.0.1", 0)
+            port = server.sockets[0].getsockname()[1]
+            answers = []
+            async with server:
+                for raw in requests:
+                    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+                    writer.write(raw)
+                    await writer.drain()
+                    answers.append(await asyncio.wait_for(reader.read(), 5))
+                    writer.close()
+            return answers
+
+    return asyncio.run(run())
+
+
+def status(answer: bytes) -> int:
+    return int(answer.split(b" ", 2)[1])
+
+
+@pytest.mark.parametrize("backend", ["tinydb"])
+def test_oversized_request_lines_are_rejected(service):
+    long_header, long_target = exchange(
+        service,
+        b"GET /users HTTP/1.1\r\nX: " + b"a" * 70000 + b"\r\n\r\n",
+        b"GET /" + b"a" * 70000 + b" HTTP/1.1\r\n\r\n",
+    )
+    assert status(long_header) == 431
+    assert status(long_target) == 400
+
+    many = b"".join(b"X-%d: 1\r\n" % i for i in range(api_server.MAX_HEADERS + 1))
+    (too_many,) = exchange(service, b"GET /users HTTP/1.1\r\n" + many + b"\r\n")
+    assert status(too_many) == 431
+
+    negative, too_large = exchange(
+        service,
+        b"POST /users HTTP/1.1\r\nContent-Length: -5\r\n\r\n",
+        b"POST /users HTTP/1.1\r\nContent-Length: %d\r\n\r\n" % (api_server.MAX_BODY + 1),
+    )
+    assert status(negative) == 400
+    assert status(too_large) == 413
+
+
+@pytest.mark.parametrize("backend", ["tinydb"])
+def test_slow_clients_are_disconnected(service, monkeypatch):
+    monkeypatch.setattr(api_server, "IDLE_TIMEOUT", 0.2)
+    headers_never_end, body_never_arrives = exchange(
+        service,
+        b"GET /users HTTP/1.1\r\nHost: x\r\n",
+        b"POST /users HTTP/1.1\r\nContent-Length: 10\r\n\r\nab",
+    )
+    assert headers_never_end == b""
+    assert body_never_arrives == b""
+
+
+def test_empty_or_reversed_windows_are_bad_requests(service):
+    body = json.dumps({"user_id": "u@x", "device_id": 1, "start": "2031-01-02T00:00", "end": "2031-01-02T00:00"}).encode()
+    reversed_query, empty_booking, ok = exchange(
+        service,
+        b"GET /available?start=2031-01-02&end=2031-01-01 HTTP/1.0\r\n\r\n",
+        b"POST /reservations HTTP/1.0\r\nContent-Length: %d\r\n\r\n" % len(body) + body,
+        b"GET /available?start=2031-01-01&end=2031-01-02 HTTP/1.0\r\n\r\n",
+    )
+    assert status(reversed_query) == 400
+    assert status(empty_booking) == 400
+    assert status(ok) == 200
+    assert [int(d["id"]) for d in json.loads(ok.split(b"\r\n\r\n", 1)[1])] == [1, 2, 3]
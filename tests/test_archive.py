@@ -0,0 +1,66 @@
+from datetime import timedelta
+
+import pytest
+
+from reservation_service import ReservationError
+
+from .conftest import T0
+
+D = timedelta(days=1)
+
+
+@pytest.fixture
+def booked(service):
+    service.create_many([("u@x", 1 + i % 2, T0 + i * 40 * D, T0 + i * 40 * D + D) for i in range(12)])
+    return service
+
+
+def test_archive_moves_past_bookings(booked, repos):
+    _, _, res_repo = repos
+    cutoff = T0 + 200 * D
+    moved = booked.archive_past(cutoff)
+    assert moved == 5
+    assert all(r.end_date > cutoff for r in res_repo.list_all())
+    assert len(res_repo.list_all(include_archive=True)) == 12
+    assert sum(p["count"] for p in res_repo.archived_partitions()) == 5
+    assert res_repo.archived_until() == T0 + 160 * D + D
+    assert booked.archive_past(cutoff) == 0
+
+    full = res_repo.list_for_device(1, include_archive=True)
+    assert [r.start_date for r in full] == sorted(r.start_date for r in full)
+    with pytest.raises(ReservationError, match="archiviert"):
+        booked.create("u@x", 3, T0 + 100 * D, T0 + 100 * D + D)
+
+
+def test_cancel_and_reassign_reach_the_archive(booked, repos):
+    _, _, res_repo = repos
+    booked.archive_past(T0 + 200 * D)
+    archived = [r for r in res_repo.list_all(include_archive=True) if r.end_date <= T0 + 200 * D]
+    booked.cancel(archived[0].id)
+    assert archived[0].id not in {r.id for r in res_repo.list_all(include_archive=True)}
+    assert res_repo.reassign_user(["u@x"], "v@x") == 11
+    assert {r.user_id for r in res_repo.list_all(include_archive=True)} == {"v@x"}
+
+
+@pytest.mark.parametrize("backend", ["tinydb"])  # SQLite verschiebt in einer Transaktion
+def test_interrupted_archive_run_is_repaired(booked, repos):
+    _, _, res_repo = repos
+    cutoff = T0 + 200 * D
+    delete_many = res_repo.delete_many
+
+    def crash(ids):
+        raise RuntimeError("Abbruch nach dem Kopieren")
+
+    res_repo.delete_many = crash
+    with pytest.raises(RuntimeError):
+        res_repo.archive_before(cutoff)
+    res_repo.delete_many = delete_many
+    # Partitionen geschrieben, Haupttabelle unverändert
+    assert len(res_repo.list_all()) == 12
+    assert sum(p["count"] for p in res_repo.archived_partitions()) == 5
+
+    assert res_repo.archive_before(cutoff) == 5
+    assert len(res_repo.list_all()) == 7
+    history = res_repo.list_all(include_archive=True)
+    assert len(history) == len({r.id for r in history}) == 12
+    assert sum(p["count"] for p in res_repo.archived_partitions()) == 5
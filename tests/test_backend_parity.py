@@ -0,0 +1,80 @@
+# Gleiches Szenario auf TinyDB und SQLite: alle beobachtbaren Ergebnisse müssen übereinstimmen.
+from datetime import timedelta
+
+from .conftest import T0, make_repos
+from devices import Device
+from reservation_service import DeleteMode, ReservationError, ReservationService
+from users import User
+
+H = timedelta(hours=1)
+
+
+def key(r):
+    return (r.user_id, r.device_id, r.start_date, r.end_date)
+
+
+def scenario(repos) -> dict:
+    user_repo, device_repo, res_repo = repos
+    service = ReservationService(repos)
+    out: dict = {}
+
+    user_repo.upsert_many([User(id=f"u{i}@x", name=f"U{i}") for i in range(4)])
+    device_repo.upsert_many([Device(id=str(i), name=f"D{i}", responsible_user_id="u0@x") for i in (1, 2, 4)])
+    new = Device(id=None, name="neu", responsible_user_id="u1@x")
+    device_repo.create(new)
+    out["allocated"] = new.id
+    out["free_ids"] = device_repo.next_free_id()
+
+    results = service.create_many([
+        ("u0@x", 1, T0, T0 + 2 * H),
+        ("u1@x", 1, T0 + H, T0 + 3 * H),        # Konflikt im Import
+        ("u1@x", 2, T0, T0 + 5 * H),
+        ("nobody@x", 2, T0 + 6 * H, T0 + 7 * H),  # unbekannter Nutzer
+        ("u2@x", 4, T0 + 2 * H, T0 + H),          # Ende vor Start
+        ("u2@x", 4, T0, T0 + 30 * 24 * H),        # lange Buchung
+    ])
+    out["bulk"] = [(r.index, r.ok) for r in results]
+    try:
+        service.create("u3@x", 4, T0 + 10 * 24 * H, T0 + 10 * 24 * H + H)
+    except ReservationError:
+        out["long_blocks"] = True
+    service.create_series("u3@x", 2, T0 + 24 * H, T0 + 25 * H, frequency="daily", count=5)
+    try:
+        service.create_series("u3@x", 2, T0 + 48 * H, T0 + 49 * H, frequency="weekly", count=2)
+    except ReservationError:
+        out["series_conflict"] = True
+
+    out["window"] = [key(r) for r in service.list_for_device_window(2, T0, T0 + 4 * 24 * H)]
+    out["available"] = [d.id for d in service.find_available_devices(T0 + 4 * H, T0 + 5 * H)]
+    out["free_slots"] = service.find_free_slots(1, (T0 - H, T0 + 4 * H), min_duration=H)
+    out["by_user"] = sorted(key(r) for r in res_repo.list_for_user("u1@x"))
+    out["busy"] = res_repo.busy_intervals([1, 2, 4], T0, T0 + 3 * H)
+    page = res_repo.list_page_for_device(1, 0, 10)
+    out["page"] = ([key(r) for r in page.items], page.total)
+
+    deleted = service.delete_users(["u1@x"], DeleteMode.REASSIGN, "u2@x")
+    out["reassign"] = (deleted.users, deleted.reassigned_devices, deleted.reassigned_reservations)
+    deleted = service.delete_devices([4], DeleteMode.CASCADE)
+    out["cascade"] = (deleted.devices, deleted.reservations)
+
+    out["archived"] = res_repo.archive_before(T0 + 3 * H)
+    out["horizon"] = res_repo.archived_until()
+    out["current"] = sorted(key(r) for r in res_repo.list_all())
+    out["history"] = sorted(key(r) for r in res_repo.list_all(include_archive=True))
+    out["partitions"] = [(p["id"], p["count"]) for p in res_repo.archived_partitions()]
+    out["series"] = sorted((s.user_id, s.device_id, s.start_date, s.count) for s in res_repo.list_series())
+    out["users"] = sorted(u.id for u in user_repo.list_all())
+    out["devices"] = sorted((int(d.id), d.responsible_user_id) for d in device_repo.list_all())
+    return out
+
+
+def test_tinydb_and_sqlite_agree(db_file, tmp_path):
+    tinydb = scenario(make_repos("tinydb", tmp_path))
+    sqlite = scenario(make_repos("sqlite", tmp_path))
+    assert tinydb.keys() == sqlite.keys()
+    for name in tinydb:
+        assert tinydb[name] == sqlite[name], name
+    # Plausibilität, damit "beide gleich falsch" auffällt
+    assert tinydb["bulk"] == [(0, True), (1, False), (2, True), (3, False), (4, False), (5, True)]
+    assert tinydb["long_blocks"] and tinydb["series_conflict"]
+    assert tinydb["archived"] == 1 and len(tinydb["history"]) == len(tinydb["current"]) + 1
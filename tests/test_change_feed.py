@@ -0,0 +1,124 @@
+import threading
+
+import pytest
+
+import change_feed
+from users import User
+
+
+@pytest.fixture
+def collect():
+    seen: list = []
+    unsubscribers = []
+
+    def subscribe(tables=None):
+        unsubscribers.append(change_feed.subscribe(seen.append, tables))
+        return seen
+
+    yield subscribe
+    for unsubscribe in unsubscribers:
+        unsubscribe()
+
+
+def test_versions_increase_and_since_returns_the_tail():
+    start = change_feed.current_version()
+    change_feed.publish("t", change_feed.INSERT, [{"id": 1}, {"id": 2}])
+    change_feed.publish_deleted("t", [1])
+    changes = change_feed.since(start)
+    assert [(c.version - start, c.op, c.key) for c in changes] == [
+        (1, change_feed.INSERT, 1), (2, change_feed.INSERT, 2), (3, change_feed.DELETE, 1)
+    ]
+    assert changes[-1].row is None
+    assert change_feed.since(change_feed.current_version()) == []
+    assert change_feed.since(start, tables=["other"]) == []
+
+
+def test_since_reports_a_gap_once_history_is_exceeded():
+    start = change_feed.current_version()
+    change_feed.publish("t", change_feed.INSERT, [{"id": i} for i in range(change_feed.HISTORY + 1)])
+    assert change_feed.since(start) is None
+
+
+def test_subscribers_filter_by_table(collect):
+    seen = collect(tables=["users"])
+    change_feed.publish("devices", change_feed.INSERT, [{"id": 1}])
+    change_feed.publish("users", change_feed.UPDATE, [{"id": "a"}])
+    assert [(c.table, c.key) for c in seen] == [("users", "a")]
+
+
+def test_deferred_publishes_at_the_end_or_not_at_all(collect):
+    seen = collect()
+    with change_feed.deferred():
+        change_feed.publish("t", change_feed.INSERT, [{"id": 1}])
+        with change_feed.deferred():
+            change_feed.publish("t", change_feed.INSERT, [{"id": 2}])
+        assert seen == []
+    assert [c.key for c in seen] == [1, 2]
+    with pytest.raises(ValueError):
+        with change_feed.deferred():
+            change_feed.publish("t", change_feed.INSERT, [{"id": 3}])
+            raise ValueError
+    assert [c.key for c in seen] == [1, 2]
+
+
+def test_failing_subscriber_does_not_stop_others(collect, capsys):
+    unsubscribe = change_feed.subscribe(lambda change: 1 / 0)
+    try:
+        seen = collect()
+        change_feed.publish("t", change_feed.INSERT, [{"id": 1}])
+    finally:
+        unsubscribe()
+    assert [c.key for c in seen] == [1]
+    assert "ZeroDivisionError" in capsys.readouterr().err
+
+
+def test_subscriber_may_wait_for_another_publishing_thread(collect):
+    # Callbacks laufen ohne den Lock des Feeds: ein Abonnent, der auf einen anderen Thread wartet,
+    # der selbst veröffentlicht, blockiert nicht
+    seen = collect()
+    finished = []
+
+    def waits_for_other_thread(change):
+        if change.table == "first":
+            other = threading.Thread(target=change_feed.publish, args=("second", change_feed.INSERT, [{"id": 2}]))
+            other.start()
+            other.join(5)
+            finished.append(not other.is_alive())
+
+    unsubscribe = change_feed.subscribe(waits_for_other_thread)
+    try:
+        change_feed.publish("first", change_feed.INSERT, [{"id": 1}])
+    finally:
+        unsubscribe()
+    assert finished == [True]
+    assert sorted(c.table for c in seen) == ["first", "second"]
+
+
+def test_repository_writes_emit_events(repos, collect):
+    user_repo, _, _ = repos
+    seen = collect(tables=["users"])
+    user_repo.upsert(User(id="w@x", name="W"))
+    user_repo.delete_many(["w@x"])
+    assert [(c.op, c.key) for c in seen] == [(change_feed.INSERT, "w@x"), (change_feed.DELETE, "w@x")]
+
+
+def test_subscriber_may_hand_a_write_to_another_thread(repos):
+    # veröffentlicht wird nach dem Freigeben von Storage-Lock bzw. Transaktion: der Schreibvorgang
+    # eines anderen Threads, auf den der Abonnent wartet, läuft durch
+    user_repo, _, _ = repos
+    finished = []
+
+    def writes_in_other_thread(change):
+        if change.key == "w@x":
+            other = threading.Thread(target=user_repo.upsert, args=(User(id="w2@x", name="W2"),))
+            other.start()
+            other.join(5)
+            finished.append(not other.is_alive())
+
+    unsubscribe = change_feed.subscribe(writes_in_other_thread, ["users"])
+    try:
+        user_repo.upsert(User(id="w@x", name="W"))
+    finally:
+        unsubscribe()
+    assert finished == [True]
+    assert user_repo.get("w2@x") is not None
@@ -0,0 +1,74 @@
+import threading
+from datetime import timedelta
+
+from reservation_service import ReservationError
+
+from .conftest import T0
+
+H = timedelta(hours=1)
+
+
+def run_threads(count, target):
+    barrier = threading.Barrier(count)
+    errors: list = []
+
+    def worker(k):
+        barrier.wait()
+        try:
+            target(k)
+        except Exception as e:  # noqa: BLE001 – im Test sammeln, nicht im Thread verlieren
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(k,)) for k in range(count)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(30)
+    return errors
+
+
+def test_same_slot_is_booked_once(service, repos):
+    _, _, res_repo = repos
+    errors = run_threads(8, lambda k: service.create("u@x", 1, T0 + k * timedelta(minutes=10), T0 + H))
+    assert len(res_repo.list_for_device(1)) == 1
+    assert len(errors) == 7 and all(isinstance(e, ReservationError) for e in errors)
+
+
+def test_bookings_never_overlap_under_contention(service, repos):
+    _, _, res_repo = repos
+
+    def book(k):
+        for i in range(10):
+            try:
+                service.create("u@x", 1 + i % 2, T0 + (i + k % 3) * H, T0 + (i + k % 3 + 2) * H)
+            except ReservationError:
+                pass
+
+    assert run_threads(6, book) == []
+    for device_id in (1, 2):
+        booked = sorted((r.start_date, r.end_date) for r in res_repo.list_for_device(device_id))
+        assert booked
+        assert all(prev_end <= start for (_, prev_end), (start, _) in zip(booked, booked[1:]))
+
+
+def test_bulk_and_series_contend_with_single_bookings(service, repos):
+    _, _, res_repo = repos
+
+    def book(k):
+        if k == 0:
+            service.create_many([("u@x", 3, T0 + i * 24 * H, T0 + i * 24 * H + H) for i in range(5)])
+        elif k == 1:
+            try:
+                service.create_series("u@x", 3, T0 + 2 * 24 * H, T0 + 2 * 24 * H + H, frequency="daily", count=2)
+            except ReservationError:
+                pass
+        else:
+            try:
+                service.create("v@x", 3, T0 + 3 * 24 * H, T0 + 3 * 24 * H + H)
+            except ReservationError:
+                pass
+
+    assert run_threads(3, book) == []
+    busy = service.list_for_device_window(3, T0, T0 + 10 * 24 * H)
+    spans = sorted((r.start_date, r.end_date) for r in busy)
+    assert all(prev_end <= start for (_, prev_end), (start, _) in zip(spans, spans[1:]))
@@ -0,0 +1,79 @@
+from datetime import timedelta
+
+import pytest
+
+from reservation_service import DeleteMode, ReservationError
+from users import User
+
+from .conftest import T0
+
+D = timedelta(days=1)
+
+
+@pytest.fixture
+def linked(service, repos):
+    """v@x bucht Gerät 1 (eine Buchung archiviert) und hat eine Serie auf Gerät 2; u@x bucht Gerät 3."""
+    user_repo, _, _ = repos
+    user_repo.upsert(User(id="w@x", name="W"))
+    service.create("v@x", 1, T0, T0 + D)
+    service.create("v@x", 1, T0 + 100 * D, T0 + 101 * D)
+    service.create("u@x", 3, T0 + 100 * D, T0 + 101 * D)
+    service.create("u@x", 3, T0 + 2 * D, T0 + 3 * D)
+    service.create_series("v@x", 2, T0 + 10 * D, T0 + 10 * D + timedelta(hours=2), frequency="weekly", count=4)
+    assert service.archive_past(T0 + 50 * D) == 2
+    return service
+
+
+def bookings(res_repo) -> list:
+    return sorted((r.user_id, int(r.device_id)) for r in res_repo.list_all(include_archive=True))
+
+
+def test_restrict_refuses_users_with_devices_or_bookings(linked, repos):
+    user_repo, device_repo, res_repo = repos
+    before = bookings(res_repo)
+    with pytest.raises(ReservationError, match="Reservierung"):
+        linked.delete_users(["v@x"])
+    with pytest.raises(ReservationError, match="Gerät"):
+        linked.delete_users(["u@x"], DeleteMode.RESTRICT)
+    assert {u.id for u in user_repo.list_all()} == {"u@x", "v@x", "w@x"}
+    assert bookings(res_repo) == before
+    assert len(res_repo.list_series()) == 1
+
+    assert linked.delete_users(["w@x"]).users == 1
+    assert user_repo.get("w@x") is None
+
+
+def test_cascade_removes_bookings_series_and_archive_of_users(linked, repos):
+    user_repo, device_repo, res_repo = repos
+    result = linked.delete_users(["v@x"], DeleteMode.CASCADE)
+    assert (result.users, result.devices, result.reservations) == (1, 0, 3)
+    assert bookings(res_repo) == [("u@x", 3), ("u@x", 3)]
+    assert res_repo.list_series() == []
+    assert user_repo.get("v@x") is None
+
+    # Geräte des Nutzers mitsamt allen Buchungen darauf, auch fremden und archivierten
+    result = linked.delete_users(["u@x"], "cascade")
+    assert (result.users, result.devices, result.reservations) == (1, 3, 2)
+    assert bookings(res_repo) == []
+    assert device_repo.list_all() == []
+
+
+def test_restrict_refuses_devices_with_bookings_or_series(linked, repos):
+    _, device_repo, res_repo = repos
+    for device_id in (1, 2):
+        with pytest.raises(ReservationError, match="Reservierung"):
+            linked.delete_devices([device_id])
+    assert len(device_repo.list_all()) == 3
+    with pytest.raises(ReservationError):
+        linked.delete_devices([1], DeleteMode.REASSIGN)
+
+
+def test_cascade_removes_bookings_series_and_archive_of_devices(linked, repos):
+    _, device_repo, res_repo = repos
+    result = linked.delete_devices([1, 2], DeleteMode.CASCADE)
+    assert (result.devices, result.reservations) == (2, 3)
+    assert bookings(res_repo) == [("u@x", 3), ("u@x", 3)]
+    assert res_repo.list_series() == []
+    assert [int(d.id) for d in device_repo.list_all()] == [3]
+    assert linked.delete_devices([3], DeleteMode.CASCADE).reservations == 2
+    assert res_repo.list_all(include_archive=True) == []
@@ -0,0 +1,95 @@
+import random
+
+import pytest
+
+from devices import Device
+from indexes import IdAllocator
+
+
+def test_lowest_free_id_with_reuse():
+    allocator = IdAllocator(5)
+    allocator.rebuild([], version=1)
+    for expected in (1, 2, 3):
+        assert allocator.next_free() == expected
+        allocator.allocate(expected)
+    allocator.release(2)
+    allocator.release(1)
+    assert allocator.next_free() == 1
+    allocator.allocate(1)
+    assert allocator.next_free() == 2
+    assert allocator.free_ids() == [2, 4, 5]
+    assert allocator.free_ids(limit=2) == [2, 4]
+
+
+def test_full_range_and_validity():
+    allocator = IdAllocator(3)
+    allocator.rebuild([1, 2, 3], version=1)
+    assert allocator.next_free() is None and allocator.free_ids() == []
+    assert not allocator.is_free(0) and not allocator.is_free(4) and not allocator.is_free(2)
+    allocator.release(3)
+    assert allocator.next_free() == 3 and allocator.is_free(3)
+
+
+def test_rebuild_discards_released_state():
+    allocator = IdAllocator(10)
+    allocator.rebuild([1, 2, 3], version=1)
+    allocator.next_free()
+    allocator.release(2)
+    allocator.rebuild([1, 2, 3, 4], version=2)
+    assert allocator.next_free() == 5
+    assert allocator.used() == {1, 2, 3, 4} and allocator.version == 2
+
+
+def test_random_operations_match_naive_set():
+    rng = random.Random(13)
+    allocator = IdAllocator(50)
+    allocator.rebuild(rng.sample(range(1, 51), 20), version=1)
+    used = allocator.used()
+    for _ in range(2000):
+        if used and rng.random() < 0.45:
+            device_id = rng.choice(sorted(used))
+            used.discard(device_id)
+            allocator.release(device_id)
+        else:
+            expected = min(set(range(1, 51)) - used, default=None)
+            assert allocator.next_free() == expected
+            if expected is not None:
+                used.add(expected)
+                allocator.allocate(expected)
+        assert allocator.free_ids(5) == sorted(set(range(1, 51)) - used)[:5]
+
+
+def test_device_repo_assigns_and_reuses_ids(repos):
+    _, device_repo, _ = repos  # Geräte 1–3 vorhanden
+    device = Device(id=None, name="neu", responsible_user_id="u@x")
+    device_repo.create(device)
+    assert int(device.id) == 4
+    device_repo.delete_many([2])
+    assert device_repo.next_free_id() == 2
+    again = Device(id=None, name="wieder", responsible_user_id="u@x")
+    device_repo.create(again)
+    assert int(again.id) == 2
+    with pytest.raises(ValueError):
+        device_repo.create(Device(id="3", name="doppelt", responsible_user_id="u@x"))
+
+
+def test_device_repo_rebuilds_after_write_outside_repo(backend, repos):
+    _, device_repo, _ = repos
+    assert device_repo.next_free_id() == 4
+    # an Repo und Allokator vorbei schreiben (wie ein anderer Prozess)
+    if backend == "tinydb":
+        device_repo.table.insert(Device(id="4", name="fremd", responsible_user_id="u@x").to_dict())
+    else:
+        with device_repo.conn:
+            device_repo.conn.execute(
+                "INSERT INTO devices (id, name, responsible_user_id, is_active) VALUES (4, 'fremd', 'u@x', 1)"
+            )
+    assert device_repo.next_free_id() == 5
+    assert not device_repo.is_free(4)
+
+
+def test_device_repo_full_range(repos, monkeypatch):
+    _, device_repo, _ = repos
+    monkeypatch.setattr(type(device_repo), "MAX_IDS", 3)
+    with pytest.raises(ValueError):
+        device_repo.create(Device(id=None, name="voll", responsible_user_id="u@x"))
@@ -0,0 +1,84 @@
+from contextlib import contextmanager
+
+import pytest
+
+import instrumentation
+from repositories import UserRepo
+
+
+@pytest.fixture
+def measuring():
+    was_enabled = instrumentation.enabled()
+    instrumentation.reset()
+    instrumentation.enable()
+    yield
+    instrumentation.reset()
+    if not was_enabled:
+        instrumentation.disable()
+
+
+def test_timed_counts_calls_and_nested_counters(measuring):
+    @instrumentation.timed("inner")
+    def inner():
+        instrumentation.count("rows", 3)
+
+    @instrumentation.timed("outer")
+    def outer():
+        inner()
+        instrumentation.count("scans")
+
+    outer()
+    outer()
+    stats = instrumentation.snapshot()
+    assert stats["ops"]["outer"]["calls"] == 2 and stats["ops"]["inner"]["calls"] == 2
+    # inklusiv: die äußere Operation sieht auch die Zähler der inneren
+    assert stats["ops"]["outer"]["counters"] == {"rows": 6, "scans": 2}
+    assert stats["ops"]["inner"]["counters"] == {"rows": 6}
+    assert stats["counters"] == {"rows": 6, "scans": 2}
+
+
+def test_disabled_records_nothing(measuring):
+    instrumentation.disable()
+    instrumentation.timed("off")(lambda: instrumentation.count("x"))()
+    assert instrumentation.snapshot()["ops"] == {} and instrumentation.snapshot()["counters"] == {}
+
+
+def test_instrument_methods_skips_untimed_and_special_members(measuring):
+    @instrumentation.instrument_methods(prefix="Repo")
+    class Repo:
+        def get(self):
+            return "get"
+
+        def _private(self):
+            return "private"
+
+        @staticmethod
+        def helper():
+            return "helper"
+
+        @contextmanager
+        def unit_of_work(self):
+            yield "uow"
+
+        def version(self):
+            return 1
+
+    repo = Repo()
+    assert repo.get() == "get" and repo._private() == "private" and Repo.helper() == "helper"
+    with repo.unit_of_work() as value:
+        assert value == "uow"
+    assert repo.version() == 1
+    assert set(instrumentation.snapshot()["ops"]) == {"Repo.get"}
+    assert hasattr(vars(Repo)["get"], "__wrapped__")
+    assert not hasattr(vars(Repo)["version"], "__wrapped__")
+
+
+def test_repositories_leave_unit_of_work_and_version_untimed(measuring, db_file):
+    # gemessen würde bei unit_of_work nur das Erzeugen des Kontextmanagers, nicht der Block
+    for name in instrumentation.UNTIMED:
+        assert not hasattr(vars(UserRepo)[name], "__wrapped__")
+    repo = UserRepo()
+    with repo.unit_of_work():
+        repo.get("nobody@x")
+    repo.version()
+    assert set(instrumentation.snapshot()["ops"]) == {"UserRepo.get"}
@@ -0,0 +1,85 @@
+from datetime import datetime, timedelta, timezone
+from itertools import product
+
+from indexes import IntervalIndex
+from reservations import Reservation
+
+T = datetime(2031, 1, 1, tzinfo=timezone.utc)
+
+
+def row(rid, device_id, start_h, end_h):
+    return {"id": rid, "device_id": device_id, "start_date": T + timedelta(hours=start_h), "end_date": T + timedelta(hours=end_h)}
+
+
+def naive(rows, device_id, start, end):
+    return sorted(
+        (r["id"] for r in rows if r["device_id"] == device_id and r["start_date"] < end and r["end_date"] > start)
+    )
+
+
+def overlapping(index, device_id, start_h, end_h):
+    return sorted(r["id"] for r in index.overlapping(device_id, T + timedelta(hours=start_h), T + timedelta(hours=end_h)))
+
+
+def test_overlap_matches_naive_scan():
+    rows = [row(f"r{i}", 1 + i % 2, 3 * i, 3 * i + 1 + i % 4) for i in range(30)]
+    index = IntervalIndex()
+    index.rebuild(rows, version=1)
+    for device_id, start_h, length in product((1, 2, 3), range(-2, 95, 3), (1, 2, 7)):
+        start, end = T + timedelta(hours=start_h), T + timedelta(hours=start_h + length)
+        assert overlapping(index, device_id, start_h, start_h + length) == naive(rows, device_id, start, end)
+
+
+def test_touching_intervals_do_not_overlap():
+    index = IntervalIndex()
+    index.rebuild([row("a", 1, 2, 4)], version=1)
+    assert overlapping(index, 1, 0, 2) == []
+    assert overlapping(index, 1, 4, 6) == []
+    assert overlapping(index, 1, 3, 5) == ["a"]
+
+
+def test_long_booking_found_through_max_duration_window():
+    # beginnt weit vor der Abfrage: nur über das Fenster (start - längste Dauer) auffindbar
+    index = IntervalIndex()
+    index.rebuild([row("long", 1, 0, 1000), row("short", 1, 500, 501)], version=1)
+    assert overlapping(index, 1, 900, 901) == ["long"]
+    index.add(row("longer", 1, -5000, 2000))
+    assert overlapping(index, 1, 1500, 1501) == ["longer"]
+
+
+def test_remove_keeps_window_and_add_keeps_order():
+    index = IntervalIndex()
+    index.rebuild([row("long", 1, 0, 100)], version=1)
+    index.remove("long")
+    index.add(row("b", 1, 50, 51))
+    index.add(row("a", 1, 10, 11))
+    assert overlapping(index, 1, 0, 100) == ["a", "b"]
+    assert [r["id"] for r in index.for_device(1)] == ["a", "b"]
+    index.remove("missing")  # unbekannte id: nichts zu tun
+
+
+def test_device_version_changes_with_writes_and_rebuild():
+    index = IntervalIndex()
+    index.rebuild([row("a", 1, 0, 1)], version=1)
+    v1, v2 = index.device_version(1), index.device_version(2)
+    index.add(row("b", 1, 2, 3))
+    assert index.device_version(1) != v1 and index.device_version(2) == v2
+    v1 = index.device_version(1)
+    index.remove("b")
+    assert index.device_version(1) != v1
+    v2 = index.device_version(2)
+    index.rebuild([], version=2)
+    assert index.device_version(2) != v2
+
+
+def test_repo_overlap_queries(repos):
+    _, _, res_repo = repos
+    res_repo.create_many([
+        Reservation(user_id="u@x", device_id=1, start_date=T, end_date=T + timedelta(days=30)),
+        Reservation(user_id="u@x", device_id=1, start_date=T + timedelta(days=40), end_date=T + timedelta(days=41)),
+    ])
+    hit = res_repo.find_first_overlap(1, T + timedelta(days=20), T + timedelta(days=21))
+    assert hit is not None and hit.end_date == T + timedelta(days=30)
+    assert res_repo.find_first_overlap(1, T + timedelta(days=30), T + timedelta(days=40)) is None
+    assert res_repo.find_first_overlap(2, T, T + timedelta(days=50)) is None
+    assert len(res_repo.find_overlaps(1, T, T + timedelta(days=50))) == 2
@@ -0,0 +1,53 @@
+from datetime import timedelta
+
+import pytest
+
+from devices import Device
+from recurring_reservations import RecurringReservation
+from reservations import Reservation
+from users import User
+
+from .conftest import T0
+
+MODELS = [
+    User(id="u@x", name="U"),
+    Device(id="7", name="D7", responsible_user_id="u@x", is_active=False, end_of_life=T0),
+    Reservation(user_id="u@x", device_id=7, start_date=T0, end_date=T0 + timedelta(hours=1)),
+    RecurringReservation(
+        user_id="u@x", device_id=7, start_date=T0, end_date=T0 + timedelta(hours=1), frequency="daily", count=3
+    ),
+]
+
+
+@pytest.mark.parametrize("model", MODELS, ids=lambda m: type(m).__name__)
+def test_from_dict_round_trip(model):
+    data = model.to_dict()
+    copy = type(model).from_dict(data)
+    assert copy.to_dict() == data
+
+
+@pytest.mark.parametrize("model", MODELS, ids=lambda m: type(m).__name__)
+def test_models_are_slotted(model):
+    assert not hasattr(model, "__dict__")
+    with pytest.raises(AttributeError):
+        model.unknown = 1
+
+
+@pytest.mark.parametrize("model", MODELS[:3], ids=lambda m: type(m).__name__)
+def test_rows_match_fields(model):
+    cls = type(model)
+    (row,) = cls.rows_from_dicts([model.to_dict()])
+    assert row._fields == cls.fields
+    assert row == tuple(model.to_dict().get(name) for name in cls.fields)
+
+
+def test_from_dict_keeps_stored_timestamps():
+    user = User.from_dict({"id": "a@x", "name": "A", "creation_date": T0, "last_update": T0 + timedelta(days=1)})
+    assert user.creation_date == T0 and user.last_update == T0 + timedelta(days=1)
+
+
+def test_repo_rows_and_objects_agree(repos):
+    user_repo, device_repo, _ = repos
+    assert [row.id for row in user_repo.list_all(as_rows=True)] == [u.id for u in user_repo.list_all()]
+    rows = device_repo.list_all(as_rows=True)
+    assert sorted((int(r.id), r.name) for r in rows) == sorted((int(d.id), d.name) for d in device_repo.list_all())
@@ -0,0 +1,106 @@
+import operator
+import random
+from datetime import timedelta
+
+import pytest
+
+from devices import Device
+from reservations import Reservation
+from users import User
+
+from .conftest import T0
+
+H = timedelta(hours=1)
+OPS = {"": operator.eq, "__ne": operator.ne, "__lt": operator.lt, "__lte": operator.le, "__gt": operator.gt, "__gte": operator.ge}
+
+
+@pytest.fixture
+def stored(db_file):
+    rng = random.Random(22)
+    items = []
+    for i in range(120):
+        start = T0 + rng.randrange(0, 200) * H
+        r = Reservation(user_id=f"u{i % 4}@x", device_id=1 + i % 5, start_date=start, end_date=start + rng.randint(1, 5) * H)
+        r.store_data()
+        items.append(r)
+    return items
+
+
+def ids(results):
+    return [r.id for r in results]
+
+
+@pytest.mark.parametrize("suffix", OPS)
+def test_comparisons_match_python(stored, suffix):
+    pivot = stored[17].start_date
+    expected = {r.id for r in stored if OPS[suffix](r.start_date, pivot)}
+    assert set(ids(Reservation.query(**{"start_date" + suffix: pivot}))) == expected
+
+
+def test_conditions_are_combined(stored):
+    low, high = T0 + 50 * H, T0 + 120 * H
+    got = Reservation.query(device_id__in=[2, 4], start_date__gte=low, start_date__lt=high, user_id__ne="u1@x")
+    expected = {
+        r.id for r in stored
+        if r.device_id in (2, 4) and low <= r.start_date < high and r.user_id != "u1@x"
+    }
+    assert set(ids(got)) == expected
+
+
+@pytest.mark.parametrize("descending", [False, True])
+def test_order_by_and_limit(stored, descending):
+    expected = sorted(stored, key=lambda r: (r.start_date, r.id), reverse=descending)
+    got = list(Reservation.query(order_by="start_date", descending=descending, limit=10, device_id=3))
+    want = [r for r in expected if r.device_id == 3][:10]
+    assert [r.start_date for r in got] == [r.start_date for r in want]
+    # Bereich auf dem Sortierattribut (Binärsuche)
+    ranged = list(Reservation.query(order_by="start_date", start_date__gt=T0 + 100 * H, start_date__lte=T0 + 110 * H))
+    assert [r.start_date for r in ranged] == sorted(
+        r.start_date for r in stored if T0 + 100 * H < r.start_date <= T0 + 110 * H
+    )
+
+
+def test_id_lookup_and_limit_zero(stored):
+    wanted = [stored[3].id, stored[40].id, "missing"]
+    assert set(ids(Reservation.query(id__in=wanted))) == set(wanted[:2])
+    assert list(Reservation.query(limit=0)) == []
+    assert ids(Reservation.query(id=stored[5].id)) == [stored[5].id]
+
+
+def test_query_is_lazy_but_validates_immediately(stored):
+    with pytest.raises(ValueError):
+        Reservation.query(colour="red")
+    with pytest.raises(ValueError):
+        Reservation.query(start_date__between=T0)
+    with pytest.raises(ValueError):
+        Reservation.query(order_by="colour")
+    with pytest.raises(ValueError):
+        Reservation.query(limit=-1)
+    results = Reservation.query(device_id=1)
+    Reservation(user_id="late@x", device_id=1, start_date=T0 - H, end_date=T0).store_data()
+    assert "late@x" in {r.user_id for r in results}
+
+
+def test_missing_values_are_outside_every_range(db_file):
+    Device(id="1", name="a", responsible_user_id="u@x", end_of_life=None).store_data()
+    Device(id="2", name="b", responsible_user_id="u@x", end_of_life=T0).store_data()
+    assert [d.name for d in Device.query(end_of_life__lt=T0 + H)] == ["b"]
+    assert [d.name for d in Device.query(order_by="end_of_life")] == ["b", "a"]
+
+
+def test_find_by_attribute(stored):
+    first = Reservation.find_by_attribute("user_id", "u2@x")
+    assert first is not None and first.user_id == "u2@x"
+    assert Reservation.find_by_attribute("user_id", "nobody@x") is None
+    # unbekanntes Attribut: kein Treffer wie vor der Query-API, kein ValueError
+    assert Reservation.find_by_attribute("colour", "red") is None
+
+
+def test_store_and_delete_update_the_index(db_file):
+    user = User(id="a@x", name="A")
+    user.store_data()
+    user.name = "B"
+    user.store_data()
+    assert [u.name for u in User.query(id="a@x")] == ["B"]
+    user.delete()
+    assert User.find_by_attribute("id", "a@x") is None
@@ -0,0 +1,113 @@
+import random
+from datetime import timedelta
+
+import pytest
+
+import analytics
+from recurring_reservations import RecurringReservation
+from reservation_service import ReservationError
+
+from .conftest import T0
+
+H = timedelta(hours=1)
+D = timedelta(days=1)
+
+
+def series(start, hours=1, **kwargs):
+    return RecurringReservation(user_id="u@x", device_id=1, start_date=start, end_date=start + hours * H, **kwargs)
+
+
+def test_occurrences_follow_count_and_until():
+    weekly = series(T0, frequency="weekly", interval=2, count=3)
+    assert [o.start_date for o in weekly.occurrences()] == [T0, T0 + 14 * D, T0 + 28 * D]
+    daily = series(T0, frequency="daily", until=T0 + 3 * D)
+    assert [o.start_date for o in daily.occurrences()] == [T0 + k * D for k in range(4)]
+    assert [o.start_date for o in daily.occurrences(T0 + D + H, T0 + 3 * D)] == [T0 + 2 * D]
+
+
+def test_series_conflicts_match_naive_check(service, repos):
+    _, _, res_repo = repos
+    rng = random.Random(18)
+    singles = []
+    for _ in range(40):
+        start = T0 + timedelta(hours=rng.randrange(0, 24 * 60))
+        try:
+            singles.append(service.create("u@x", 1, start, start + timedelta(hours=rng.randint(1, 30))))
+        except ReservationError:
+            pass
+    long_one = service.create("u@x", 1, T0 - 30 * D, T0 + H)  # reicht in den ersten Termin
+    singles.append(long_one)
+
+    for _ in range(20):
+        candidate = series(
+            T0 + timedelta(hours=rng.randrange(0, 24 * 7)),
+            hours=rng.randint(1, 5),
+            frequency=rng.choice(["daily", "weekly"]),
+            interval=rng.randint(1, 3),
+            count=rng.randint(1, 15),
+        )
+        expected = [
+            o.start_date for o in candidate.occurrences()
+            if any(r.start_date < o.end_date and r.end_date > o.start_date for r in singles)
+        ]
+        found = service.series_conflicts(candidate)
+        assert [o.start_date for o, _ in found] == expected
+        for occurrence, blocker in found:
+            assert blocker.start_date < occurrence.end_date and blocker.end_date > occurrence.start_date
+    assert res_repo.list_series() == []
+
+
+def test_create_series_refuses_conflicts_and_blocks_later_bookings(service, repos):
+    _, _, res_repo = repos
+    service.create("u@x", 1, T0 + 2 * D, T0 + 2 * D + H)
+    with pytest.raises(ReservationError, match="Termin"):
+        service.create_series("u@x", 1, T0, T0 + H, frequency="daily", count=5)
+    assert res_repo.list_series() == []
+
+    created = service.create_series("u@x", 1, T0 + 3 * D, T0 + 3 * D + H, frequency="daily", count=3)
+    assert [s.id for s in res_repo.series_for_devices([1])[1]] == [created.id]
+    with pytest.raises(ReservationError, match="Überschneidung"):
+        service.create("v@x", 1, T0 + 4 * D, T0 + 4 * D + 2 * H)
+    with pytest.raises(ReservationError):
+        service.create_series("v@x", 1, T0 + 5 * D - H, T0 + 5 * D + H, frequency="weekly", count=2)
+    service.create("v@x", 1, T0 + 6 * D, T0 + 6 * D + H)  # nach dem letzten Termin frei
+    window = service.list_for_device_window(1, T0, T0 + 10 * D)
+    assert [r.start_date for r in window] == [T0 + 2 * D, T0 + 3 * D, T0 + 4 * D, T0 + 5 * D, T0 + 6 * D]
+
+
+def test_create_series_validates_input(service):
+    with pytest.raises(ReservationError):
+        service.create_series("u@x", 1, T0, T0 + H, frequency="monthly", count=2)
+    with pytest.raises(ReservationError):
+        service.create_series("nobody@x", 1, T0, T0 + H, count=2)
+
+
+def test_series_changes_repo_version(service, repos):
+    _, _, res_repo = repos
+    before = res_repo.version()
+    created = service.create_series("u@x", 2, T0, T0 + H, count=2)
+    assert res_repo.version() != before
+    before = res_repo.version()
+    service.cancel_series(created.id)
+    assert res_repo.version() != before
+
+
+def test_expand_series_matches_occurrences(service, repos):
+    _, _, res_repo = repos
+    rng = random.Random(180)
+    for device_id in (1, 2, 3):
+        for k in range(4):
+            start = T0 + timedelta(days=40 * k, hours=rng.randrange(0, 24))
+            kwargs = {"count": rng.randint(1, 20)} if k % 2 else {"until": start + timedelta(days=rng.randint(0, 35))}
+            service.create_series(
+                "u@x", device_id, start, start + timedelta(hours=rng.randint(1, 30)),
+                frequency=rng.choice(["daily", "weekly"]), interval=rng.randint(1, 3), **kwargs,
+            )
+    frame = analytics.series_table(res_repo).to_pandas()
+    stored = res_repo.list_series()
+    for _ in range(30):
+        start = T0 + timedelta(hours=rng.randrange(-48, 24 * 200))
+        end = start + timedelta(hours=rng.randrange(1, 24 * 60))
+        expected = sorted((o.id, o.start_date, o.end_date) for s in stored for o in s.occurrences(start, end))
+        got = analytics.expand_series(frame, start, end)
+        assert sorted(zip(got["id"], got["start_date"], got["end_date"])) == expected
@@ -0,0 +1,199 @@
+import fcntl
+import multiprocessing
+import os
+import time
+from datetime import timedelta
+
+import pytest
+
+import db
+from storage import ConflictError, Durability, JSONFileStorage
+
+from .conftest import T0
+
+
+def second_handle(path: str, durability: Durability = Durability.COMMIT):
+    """Eigene Storage-Kette auf dieselbe Datei, wie in einem anderen Prozess (eigener Snapshot, eigene Sperre)."""
+    return db.SharedTinyDB(path, storage=db._storage_chain(durability))
+
+
+def lock_is_free(path: str) -> bool:
+    fd = os.open(path + ".lock", os.O_RDWR)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return False
+    else:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        return True
+    finally:
+        os.close(fd)
+
+
+def test_buffered_changes_do_not_hold_the_lock(tmp_path):
+    path = str(tmp_path / "wb.json")
+    handle = db.open_db(path, Durability.FLUSH)
+    handle.table("items").insert({"id": "a"})
+    assert handle.storage.pending == 1
+    assert lock_is_free(path)
+    handle.storage.flush()
+    assert lock_is_free(path)
+
+
+def test_writer_waits_for_foreign_buffer(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "WRITE_BEHIND_MAX_DELAY", 0.2)
+    path = str(tmp_path / "wb.json")
+    mine, theirs = db.open_db(path, Durability.FLUSH), second_handle(path)
+    mine.table("items").insert({"id": "a"})
+    assert mine.storage.pending == 1
+
+    # Unit of Work der anderen Kette wartet auf den Flush des Puffers, statt ihn zu überschreiben
+    theirs.table("items").insert({"id": "b"})
+    assert mine.storage.pending == 0
+    assert sorted(d["id"] for d in theirs.table("items").all()) == ["a", "b"]
+    assert sorted(d["id"] for d in mine.table("items").all()) == ["a", "b"]
+
+
+def test_flush_after_foreign_commit_conflicts(tmp_path):
+    path = str(tmp_path / "wb.json")
+    mine = db.open_db(path, Durability.FLUSH)
+    mine.table("items").insert({"id": "a"})
+    # fremder Puffer, der auf einem älteren Stand aufsetzt (Schreiben ohne Unit of Work), kommt zuerst hinaus
+    theirs = JSONFileStorage(path)
+    theirs.set_buffered(True)
+    theirs.write({"items": {"1": {"id": "theirs"}}})
+    theirs.set_buffered(False)
+
+    with pytest.raises(ConflictError):
+        mine.storage.flush()
+    assert mine.storage.pending == 0
+    assert [d["id"] for d in mine.table("items").all()] == ["theirs"]
+
+
+def _read_then_write(path: str, queue) -> None:
+    handle = db.open_db(path, Durability.COMMIT)
+    started = time.monotonic()
+    ids = [d["id"] for d in handle.table("items").all()]
+    queue.put((ids, time.monotonic() - started))
+    handle.table("items").insert({"id": "child"})
+    queue.put(sorted(d["id"] for d in handle.table("items").all()))
+
+
+def test_other_process_reads_during_buffer_window(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "WRITE_BEHIND_MAX_DELAY", 60.0)
+    path = str(tmp_path / "wb.json")
+    handle = db.open_db(path, Durability.FLUSH)
+    handle.table("items").insert({"id": "committed"})
+    handle.storage.flush()
+    handle.table("items").insert({"id": "buffered"})
+
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=_read_then_write, args=(path, queue))
+    process.start()
+    try:
+        # Puffer wäre noch 60 s offen: Öffnen und Lesen laufen trotzdem sofort durch
+        ids, elapsed = queue.get(timeout=30)
+        assert ids == ["committed"]
+        assert elapsed < 5
+        assert handle.storage.pending == 1
+        # Schreiben wartet auf den Flush und setzt danach auf dem gepufferten Stand auf
+        time.sleep(0.3)
+        handle.storage.flush()
+        assert queue.get(timeout=30) == ["buffered", "child", "committed"]
+    finally:
+        process.join(timeout=30)
+    assert process.exitcode == 0
+
+
+def test_unit_of_work_holds_the_lock(tmp_path):
+    path = str(tmp_path / "uow.json")
+    handle = db.open_db(path, Durability.COMMIT)
+    with handle.storage.unit_of_work():
+        assert not lock_is_free(path)
+        handle.table("items").insert({"id": "a"})
+    assert lock_is_free(path)
+
+    with pytest.raises(KeyError):
+        with handle.storage.unit_of_work():
+            handle.table("items").insert({"id": "b"})
+            raise KeyError("b")
+    assert lock_is_free(path)
+    assert [d["id"] for d in handle.table("items").all()] == ["a"]
+
+
+def test_foreign_commit_is_visible_on_next_read(tmp_path):
+    path = str(tmp_path / "shared.json")
+    first, second = second_handle(path), second_handle(path)
+    first.table("items").insert({"id": "a"})
+    assert [d["id"] for d in second.table("items").all()] == ["a"]
+
+    second.table("items").insert({"id": "b"})
+    # doc_id im Read-Modify-Write vergeben: kein Überschreiben des fremden Dokuments
+    first.table("items").insert({"id": "c"})
+    assert sorted(d["id"] for d in second.table("items").all()) == ["a", "b", "c"]
+
+
+def test_write_without_lock_after_foreign_commit_conflicts(tmp_path):
+    path = str(tmp_path / "raw.json")
+    mine, theirs = JSONFileStorage(path), JSONFileStorage(path)
+    assert mine.read() is None
+    theirs.write({"items": {"1": {"id": "theirs"}}})
+
+    assert mine.changed_on_disk()
+    with pytest.raises(ConflictError):
+        mine.write({"items": {"1": {"id": "mine"}}})
+    assert mine.read() == {"items": {"1": {"id": "theirs"}}}
+    mine.write({"items": {"1": {"id": "mine"}}})
+    assert theirs.read() == {"items": {"1": {"id": "mine"}}}
+
+
+def _book_in_process(path: str, durability: str, worker: int, queue) -> None:
+    # läuft per spawn in einem eigenen Prozess: eigene Handles, eigener Snapshot, gemeinsame Datei
+    from devices import Device
+    from repositories import create_repos
+    from reservation_service import ReservationError, ReservationService
+
+    db.DB_FILE = path
+    db.DURABILITY = Durability(durability)
+    repos = create_repos("tinydb")
+    service = ReservationService(repos)
+    booked = 0
+    for hour in range(8):
+        try:
+            service.create("u@x", 1, T0 + timedelta(hours=hour), T0 + timedelta(hours=hour + 1))
+            booked += 1
+        except ReservationError:
+            pass
+    device_ids = []
+    for _ in range(2):
+        device = Device(id=None, name=f"W{worker}", responsible_user_id="u@x")
+        repos[1].create(device)
+        device_ids.append(int(device.id))
+    db.flush()
+    queue.put((booked, device_ids))
+
+
+@pytest.mark.parametrize("backend", ["tinydb"])
+@pytest.mark.parametrize("durability", [d.value for d in Durability])
+def test_processes_never_double_book(repos, db_file, durability):
+    db.flush()
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    workers = [context.Process(target=_book_in_process, args=(db_file, durability, k, queue)) for k in range(4)]
+    for process in workers:
+        process.start()
+    results = [queue.get(timeout=120) for _ in workers]
+    for process in workers:
+        process.join(timeout=30)
+        assert process.exitcode == 0
+
+    assert sum(booked for booked, _ in results) == 8
+    device_ids = [i for _, ids in results for i in ids]
+    assert len(set(device_ids)) == len(device_ids) == 8
+    assert not {1, 2, 3} & set(device_ids)
+
+    from repositories import create_repos
+    _, device_repo, res_repo = create_repos("tinydb")
+    assert len(res_repo.list_all()) == 8
+    assert len(device_repo.list_all()) == 11
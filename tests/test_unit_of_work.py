@@ -0,0 +1,183 @@
+import threading
+from datetime import timedelta
+
+import pytest
+
+import change_feed
+from indexes import interval_index, table_index
+from reservation_service import ReservationError
+from reservations import Reservation
+from users import User
+
+from .conftest import T0
+
+H = timedelta(hours=1)
+
+
+class Boom(Exception):
+    pass
+
+
+def booking(device_id, start_h, end_h, user_id="u@x"):
+    return Reservation(user_id=user_id, device_id=device_id, start_date=T0 + start_h * H, end_date=T0 + end_h * H)
+
+
+def test_rollback_restores_data_and_drops_feed_events(repos):
+    user_repo, device_repo, res_repo = repos
+    kept = booking(1, 0, 1)
+    res_repo.create(kept)
+    seen = []
+    unsubscribe = change_feed.subscribe(seen.append)
+    try:
+        with pytest.raises(Boom):
+            with res_repo.unit_of_work():
+                res_repo.create(booking(2, 0, 1))
+                res_repo.delete_many([kept.id])
+                user_repo.upsert(User(id="w@x", name="W"))
+                device_repo.delete_many([3])
+                raise Boom
+    finally:
+        unsubscribe()
+    assert seen == []
+    assert [r.id for r in res_repo.list_all()] == [kept.id]
+    assert user_repo.get("w@x") is None and device_repo.get(3) is not None
+    assert res_repo.find_first_overlap(2, T0, T0 + H) is None
+    assert res_repo.find_first_overlap(1, T0, T0 + H).id == kept.id
+
+
+def test_events_are_published_after_commit(repos):
+    user_repo, _, res_repo = repos
+    seen = []
+    unsubscribe = change_feed.subscribe(lambda change: seen.append((change.table, change.op)))
+    try:
+        with res_repo.unit_of_work():
+            res_repo.create(booking(1, 0, 1))
+            user_repo.upsert(User(id="w@x", name="W"))
+            assert seen == []
+    finally:
+        unsubscribe()
+    assert ("reservations", change_feed.INSERT) in seen and ("users", change_feed.INSERT) in seen
+
+
+@pytest.mark.parametrize("backend", ["tinydb"])  # Indizes im Prozess gibt es nur beim TinyDB-Backend
+def test_rollback_resets_tinydb_indexes(repos):
+    user_repo, _, res_repo = repos
+    res_repo.create(booking(1, 0, 1))
+    with pytest.raises(Boom):
+        with res_repo.unit_of_work():
+            res_repo.create(booking(1, 2, 3))
+            user_repo.upsert(User(id="w@x", name="W"))
+            assert len(interval_index(res_repo.table).for_device(1)) == 2
+            raise Boom
+    # Versionsstand nach dem Rollback passt nicht mehr: beide Indizes bauen aus den Daten neu auf
+    assert len(interval_index(res_repo.table).for_device(1)) == 1
+    assert table_index(user_repo.table).get("w@x") is None
+    assert res_repo.find_first_overlap(1, T0 + 2 * H, T0 + 3 * H) is None
+
+
+def test_nested_units_commit_once(repos):
+    _, _, res_repo = repos
+    with res_repo.unit_of_work():
+        with res_repo.unit_of_work():
+            res_repo.create(booking(1, 0, 1))
+        res_repo.create(booking(1, 1, 2))
+    assert len(res_repo.list_for_device(1)) == 2
+    with pytest.raises(Boom):
+        with res_repo.unit_of_work():
+            res_repo.create(booking(1, 5, 6))
+            with res_repo.unit_of_work():
+                res_repo.create(booking(1, 7, 8))
+            raise Boom
+    assert len(res_repo.list_for_device(1)) == 2
+
+
+def test_failed_check_writes_nothing(service, repos):
+    _, _, res_repo = repos
+    version = res_repo.version()
+    with pytest.raises(ReservationError):
+        service.create("nobody@x", 1, T0, T0 + H)
+    results = service.create_many([("nobody@x", 1, T0, T0 + H)])
+    assert not results[0].ok
+    assert res_repo.list_all() == [] and res_repo.version() == version
+
+
+def test_check_runs_again_when_device_changed_meanwhile(service, repos):
+    _, _, res_repo = repos
+    original = res_repo.find_first_overlap
+    calls = []
+
+    def first_overlap(device_id, start, end):
+        result = original(device_id, start, end)
+        if not calls:
+            # zwischen Prüfung und Unit of Work bucht jemand ohne Geräte-Lock (z. B. ein anderer Prozess)
+            res_repo.create(booking(device_id, 0, 1, user_id="v@x"))
+        calls.append(result)
+        return result
+
+    res_repo.find_first_overlap = first_overlap
+    with pytest.raises(ReservationError, match="Überschneidung"):
+        service.create("u@x", 1, T0, T0 + 2 * H)
+    assert len(calls) == 2
+    assert [r.user_id for r in res_repo.list_for_device(1)] == ["v@x"]
+
+
+def test_check_is_not_repeated_without_changes(service, repos):
+    _, _, res_repo = repos
+    original = res_repo.find_first_overlap
+    calls = []
+    res_repo.find_first_overlap = lambda *args: calls.append(args) or original(*args)
+    service.create("u@x", 1, T0, T0 + H)
+    assert len(calls) == 1
+
+
+def test_checks_on_other_devices_run_in_parallel(service, repos):
+    _, _, res_repo = repos
+    original = res_repo.find_first_overlap
+    entered, release = threading.Event(), threading.Event()
+
+    def slow(device_id, start, end):
+        if device_id == 1:
+            entered.set()
+            release.wait(10)
+        return original(device_id, start, end)
+
+    res_repo.find_first_overlap = slow
+    worker = threading.Thread(target=service.create, args=("u@x", 1, T0, T0 + H))
+    worker.start()
+    try:
+        assert entered.wait(10)
+        # hielte die Prüfung auf Gerät 1 die globale Unit of Work, hinge dieser Aufruf bis release
+        service.create("u@x", 2, T0, T0 + H)
+        assert len(res_repo.list_for_device(2)) == 1
+    finally:
+        release.set()
+        worker.join(10)
+    assert len(res_repo.list_for_device(1)) == 1
+
+
+@pytest.mark.parametrize("backend", ["tinydb"])
+def test_other_threads_never_read_an_open_unit_of_work(repos):
+    user_repo, _, _ = repos
+    inside, release = threading.Event(), threading.Event()
+    seen = []
+
+    def rolled_back():
+        with pytest.raises(Boom):
+            with user_repo.unit_of_work():
+                user_repo.upsert(User(id="w@x", name="W"))
+                inside.set()
+                release.wait(5)
+                raise Boom()
+
+    writer = threading.Thread(target=rolled_back)
+    writer.start()
+    assert inside.wait(5)
+    reader = threading.Thread(target=lambda: seen.append({u.id for u in user_repo.list_all()}))
+    reader.start()
+    reader.join(0.2)
+    # der Leser wartet auf das Ende der Unit of Work
+    assert reader.is_alive()
+    release.set()
+    writer.join(5)
+    reader.join(5)
+    assert seen == [{"u@x", "v@x"}]
@@ -0,0 +1,105 @@
+import json
+import time
+
+import db
+from storage import Durability
+
+
+def on_disk(path: str) -> dict:
+    with open(path) as handle:
+        text = handle.read()
+    return json.loads(text) if text else {}
+
+
+def test_changes_are_buffered_until_flush(tmp_path):
+    path = str(tmp_path / "wb.json")
+    handle = db.open_db(path, Durability.FLUSH)
+    table = handle.table("items")
+    table.insert({"id": "a"})
+    table.insert({"id": "b"})
+    assert handle.storage.pending == 2
+    assert "items" not in on_disk(path)
+    # gepufferter Stand ist für Lesezugriffe im Prozess sichtbar
+    assert {d["id"] for d in table.all()} == {"a", "b"}
+
+    handle.storage.flush()
+    assert handle.storage.pending == 0
+    assert {d["id"] for d in on_disk(path)["items"].values()} == {"a", "b"}
+
+
+def test_commit_durability_writes_through(tmp_path):
+    path = str(tmp_path / "commit.json")
+    handle = db.open_db(path, Durability.COMMIT)
+    handle.table("items").insert({"id": "a"})
+    assert handle.storage.pending == 0
+    assert [d["id"] for d in on_disk(path)["items"].values()] == ["a"]
+
+
+def test_max_pending_and_timer_flush(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "WRITE_BEHIND_MAX_PENDING", 3)
+    monkeypatch.setattr(db, "WRITE_BEHIND_MAX_DELAY", 0.05)
+    path = str(tmp_path / "group.json")
+    table = db.open_db(path, Durability.NONE).table("items")
+    for i in range(3):
+        table.insert({"id": i})
+    assert len(on_disk(path)["items"]) == 3
+
+    table.insert({"id": 3})
+    assert len(on_disk(path)["items"]) == 3
+    deadline = time.monotonic() + 5
+    while len(on_disk(path)["items"]) < 4 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert len(on_disk(path)["items"]) == 4
+
+
+def test_unit_of_work_is_one_write(tmp_path):
+    path = str(tmp_path / "uow.json")
+    handle = db.open_db(path, Durability.FLUSH)
+    with handle.storage.unit_of_work():
+        for i in range(10):
+            handle.table("items").insert({"id": i})
+        handle.table("other").insert({"id": "x"})
+    assert handle.storage.pending == 1
+    handle.storage.flush()
+    assert len(on_disk(path)["items"]) == 10 and len(on_disk(path)["other"]) == 1
+
+
+def test_handles_are_pooled_per_path(tmp_path, monkeypatch):
+    path = str(tmp_path / "pooled.json")
+    handle = db.open_db(path)
+    assert db.open_db(path) is handle
+    monkeypatch.chdir(tmp_path)
+    assert db.open_db("pooled.json") is handle
+    assert db.open_db(str(tmp_path / "other.json")) is not handle
+
+
+def test_get_db_follows_db_file(db_file, tmp_path, monkeypatch):
+    first = db.get_db()
+    assert first is db.open_db(db_file) and db.get_db() is first
+
+    moved = str(tmp_path / "moved" / "database.json")
+    (tmp_path / "moved").mkdir()
+    monkeypatch.setattr(db, "DB_FILE", moved)
+    second = db.get_db()
+    assert second is not first
+    second.table("items").insert({"id": "m"})
+    db.flush()
+    assert "items" in on_disk(moved) and "items" not in on_disk(db_file)
+
+
+def test_flush_makes_buffered_writes_visible_to_new_handles(tmp_path):
+    path = str(tmp_path / "flush.json")
+    first = db.open_db(path, Durability.FLUSH)
+    second = db.open_db(str(tmp_path / "second.json"), Durability.FLUSH)
+    first.table("items").insert({"id": "a"})
+    second.table("items").insert({"id": "b"})
+
+    def fresh(name: str) -> list:
+        # eigene Kette wie in einem neu gestarteten Prozess, nicht das gepoolte Handle
+        handle = db.SharedTinyDB(str(tmp_path / name), storage=db._storage_chain(Durability.COMMIT))
+        return [d["id"] for d in handle.table("items").all()]
+
+    assert fresh("flush.json") == [] and fresh("second.json") == []
+    db.flush()
+    assert fresh("flush.json") == ["a"] and fresh("second.json") == ["b"]
+    assert first.storage.pending == second.storage.pending == 0